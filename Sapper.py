@@ -1,321 +1,481 @@
 import numpy as np
-import random as rd
 from tabulate import tabulate
 import base64
+import io
+import os
+from collections import defaultdict
+from SapperBoard import SapperBoard, SapperChunkedBoard, BitMask
+from SapperProbability import SapperProbability
+from SapperSampler import SapperSampler
+from SapperPatterns import SapperPatterns
+from SapperJournal import SapperJournal
+from SapperRender import SapperRender
+from SapperStrategy import SapperStrategy
+import SapperProfile
 
 """
-Класс Sapper отвечает за генерацию и сохранения поля в виде np.array()
-Ограничения: размер поля не больше 20 и не меньше 2. И 
-кол-во бомб не меньше 2 и меньше квадрата размера поля.
+Класс Sapper отвечает за генерацию и сохранения поля в виде SapperBoard
+Ограничения: размер поля не меньше 2. И
+кол-во бомб не меньше 2 и меньше кол-ва клеток поля.
+Большие поля строятся по плиткам при первом обращении к ним (SapperChunkedBoard)
 """
 
 
 class Sapper:
+    # Память под обычное поле: до DENSE_CELL_BYTES байт на клетку в пике (генерация и открытие области нулей
+    # на все поле - маски окна и индексы открытых клеток). Поля больше CHUNKED_CELLS клеток (больше DENSE_BYTES
+    # памяти) по умолчанию строятся по плиткам, у которых заливка медленнее, но память зависит от открытой части
+    DENSE_BYTES = 1 << 30
+    DENSE_CELL_BYTES = 40
+    CHUNKED_CELLS = DENSE_BYTES // DENSE_CELL_BYTES
+
     """
-    side - размер поля side x side
+    height, width - размер поля height x width
     bombs - кол-во бомб
+    seed - зерно генератора случайных чисел (None - случайное)
+    tile - сторона плитки поля SapperChunkedBoard (None - плитки только у полей больше CHUNKED_CELLS клеток)
     По умолчанию генерируем поле размером 5x5 с 5-ью бомбами
     """
 
-    def __init__(self, height=5, width=5, bombs=5):
-        if height < 2 or height > 20:
-            raise ValueError(f"Not correct height: {height}. Height should be > 2 and side <= 20!")
-        if width < 2 or width > 20:
-            raise ValueError(f"Not correct width: {width}. Width should be > 2 and side <= 20!")
-        if bombs < 2 and bombs < height * width:
-            raise ValueError(f"Not correct bombs: {bombs}. Bombs should be >= 2!")
+    def __init__(self, height=5, width=5, bombs=5, seed=None, tile=None):
+        Sapper._check_params(height, width, bombs)
 
         self._height = height
         self._width = width
         self._bombs = bombs
-        self._field = np.array([])
+        self._tile = tile
+        self._board = self._new_board()
+        # Генератор случайных чисел для расстановки бомб (seed - для воспроизводимости)
+        self._rng = np.random.default_rng(seed)
+
+    # Проверяем размер поля и кол-во бомб
+    @staticmethod
+    def _check_params(height, width, bombs):
+        if height < 2:
+            raise ValueError(f"Not correct height: {height}. Height should be >= 2!")
+        if width < 2:
+            raise ValueError(f"Not correct width: {width}. Width should be >= 2!")
+        if bombs < 2 or bombs >= height * width:
+            raise ValueError(f"Not correct bombs: {bombs}. Bombs should be >= 2 and < height * width!")
 
     """
     Генерируем игровое поле
-    Возможные значения:
-    B - на этой клетки бомба
-    F - на эту клетку поставлен флажок
-    Какое-то число [0; 8] - кол-во бомб на соседних клетках
+    В self._board.counts для каждой клетки записывается
+    кол-во бомб на соседних клетках [0; 8] или SapperBoard.BOMB - на этой клетки бомба.
+    Открытые клетки и флажки уже сделанных ходов сохраняются
     
     На клетке (i; j) не должно быть бомбы
     """
 
+    @SapperProfile.phase("generate")
     def _generate_field(self, i, j):
-        f = [["0" for _ in range(self._width)] for _ in range(self._height)]
+        # Поле из плиток строится по частям при обращении, задаем только его зерно
+        if isinstance(self._board, SapperChunkedBoard):
+            self._board.generate(int(self._rng.integers(1 << 63)), i, j)
+            return
 
-        # Генерируем координаты бомб
-        for _ in range(self._bombs):
-            x = rd.randint(0, self._height - 1)
-            y = rd.randint(0, self._width - 1)
+        cells = self._height * self._width
 
-            # Если на этом месте уже есть бомба, то генерирует еще раз
-            # Или на этом месте не должно быть бомбы
-            while f[x][y] != "0" or (x == i and y == j):
-                x = rd.randint(0, self._height - 1)
-                y = rd.randint(0, self._width - 1)
-            f[x][y] = "B"
+        # Выбираем позиции бомб за один раз без повторений среди всех клеток, кроме (i; j):
+        # индексы >= safe сдвигаем на 1, чтобы пропустить безопасную клетку
+        safe = i * self._width + j
+        positions = self._rng.choice(cells - 1, self._bombs, replace=False)
+        positions[positions >= safe] += 1
 
-        self._field = np.array(f)
+        bombs = np.zeros(cells, dtype=bool)
+        bombs[positions] = True
+        bombs = bombs.reshape(self._height, self._width)
+
+        if self._board.height != self._height or self._board.width != self._width:
+            self._board = SapperBoard(self._height, self._width)
         # Проставляем числа рядом с бомбами
-        for i, array in enumerate(self._field):
-            for j, elem in enumerate(array):
-                if self._field[i][j] != "B":
-                    self._field[i][j] = self.__count_bombs(i, j)
-
-    # Ищем кол-во бомб в клетках около self.__field[i][j]
-    def __count_bombs(self, i: int, j: int):
-        start_i = i - 1 if i != 0 else 0
-        start_j = j - 1 if j != 0 else 0
-        finish_i = i + 1 if i != self._height - 1 else i
-        finish_j = j + 1 if j != self._width - 1 else j
-        count = 0
-
-        for cur_i in range(start_i, finish_i + 1):
-            for cur_j in range(start_j, finish_j + 1):
-                if self._field[cur_i][cur_j] == "B":
-                    count += 1
-
-        return str(count)
+        self._board.set_bombs(bombs)
+
+    # Пустое поле текущего размера: обычное или из плиток
+    def _new_board(self):
+        tile = self._tile
+        if tile is None and self._height * self._width > Sapper.CHUNKED_CELLS:
+            tile = SapperChunkedBoard.TILE
+        if tile is None:
+            return SapperBoard(self._height, self._width)
+        return SapperChunkedBoard(self._height, self._width, self._bombs, tile)
 
     def __str__(self):
-        return tabulate(self._field)
+        return tabulate(self._board.answer())
 
 
 """
-Класс SapperUserSolver насоедуется от Sapper и позволяет:
-1. Начать новую игру
-2. Сохранить ее в виде текстового файла (при указании имя файла расширение указывать не нужно.
-3. Загружать файл с игрой и продолжать играть
+Класс SapperEngine наследуется от Sapper и ведет одну игру без ввода и вывода в консоль:
+новая игра, открытие клетки, флаг, открытие квадрата вокруг числа, состояние, сохранение и загрузка.
+Ходы возвращают словарь с результатом:
+status - PLAYING, WON или LOST,
+revealed - индексы x * width + y открытых ходом клеток (np.ndarray), values - числа в них,
+у флага - flagged: стоит ли теперь флаг
 """
 
 
-class SapperUserSolver(Sapper):
-    __USER_FUNCTIONALITY = "1. Для сохранения игры введите: Save НАЗВАНИЕ_ФАЙЛА\n" \
-                           "2. Для загрузки игры введите: Upload НАЗВАНИЕ_ФАЙЛА. " \
-                           "Для загрузки игры сначала необходимо завершить " \
-                           "предыдущюю игру, т.е. сохранить ее.\n" \
-                           "3. Чтобы начать новую игру, введите: Start game\n" \
-                           "4. Чтобы запустить решателя сапера, введите: Start solver"
+class SapperEngine(Sapper):
+    PLAYING = "playing"
+    WON = "won"
+    LOST = "lost"
+    # Коды ходов для apply и их имена
+    OPEN = 0
+    FLAG = 1
+    UNFLAG = 2
+    CHORD = 3
+    MOVES = ("open", "flag", "unflag", "chord")
+
+    """
+    height, width, bombs, seed, tile - как у Sapper
+    journal - журнал ходов SapperJournal (None - ходы не записываются)
+    corpus - корпус полей без угадывания SapperCorpus: поле для первого хода берется из него (None - случайное поле)
+    openings - кэш статистики первого хода SapperOpenings для best_opening (None - лучший ход неизвестен)
+    """
+
+    def __init__(self, height=5, width=5, bombs=5, seed=None, journal=None, tile=None, corpus=None, openings=None):
+        super().__init__(height, width, bombs, seed, tile)
+        self._corpus = corpus
+        self._openings = openings
+        # Битовая маска нулей, область вокруг которых уже открыта
+        self._zeros = self._board.new_mask()
+        # Кол-во открытых клеток
+        self._count_move = 0
+        self._status = SapperEngine.PLAYING
+        self._journal = journal
+
+    # Новая игра на поле height x width с bombs бомбами, поле генерируется при первом открытии
+    def new_game(self, height, width, bombs):
+        Sapper._check_params(height, width, bombs)
+        if self._journal is not None:
+            self._journal.close()
 
-    def __init__(self):
-        super().__init__(5, 5, 5)
-        self._current_field = [["X" for _ in range(self._width)] for _ in range(self._height)]
-        self._zeros = []
+        self._height = height
+        self._width = width
+        self._bombs = bombs
+        self._board = self._new_board()
+        self._zeros = self._board.new_mask()
         self._count_move = 0
+        self._status = SapperEngine.PLAYING
+        return self.state()
+
+    # Поле без угадывания из корпуса, если он задан (у полей из плиток корпуса нет)
+    def _generate_field(self, i, j):
+        if self._corpus is None or isinstance(self._board, SapperChunkedBoard):
+            super()._generate_field(i, j)
+            return
+
+        self._board.set_bombs(self._corpus.board(self._height, self._width, self._bombs, i, j, self._rng))
 
     """
-    Процесс игры
-    Если self.__count_move - количество ходов, 0, т.е. это начала игры,то мы задаем текущее поля X
-    И после первого хода генерируем поле, чтобы на клетке, на которую нажал пользователь не было бомбы
+    Лучший первый ход (x, y) для текущих размеров поля и кол-ва бомб по кэшу openings
+    criterion - критерий SapperOpenings.CRITERIA ("zero" - чаще всего нуль, "revealed" - больше открытых клеток)
+    Возвращаем None, если кэша нет или в нем нет такой конфигурации
     """
 
-    def __play(self):
-        print(f"Поле {self._height}x{self._width}\nКоличество бомб: {self._bombs}")
-        if self._count_move == 0:
-            self._current_field = [["X" for _ in range(self._width)] for _ in range(self._height)]
-
-        # is_win - выиграл/проиграл
-        # is_end - закончилась ли игра
-        is_win = True
-        is_end = False
+    def best_opening(self, criterion="zero"):
+        if self._openings is None:
+            return None
+        return self._openings.best(self._height, self._width, self._bombs, criterion)
 
-        while True:
-            # После каждого хода печатаем поле
-            self._print_user_field()
+    # Открываем клетку (x, y). Первое открытие генерирует поле, чтобы на этой клетке не было бомбы
+    @SapperProfile.phase("open")
+    def open(self, x, y):
+        self._check_move(x, y)
+        return self.__result(self.__open(x, y))
 
-            # Если пользователь открыл все поля без бомб, то он выиграл
-            if self._count_move == self._width * self._height - self._bombs:
-                is_end = True
-                is_win = True
-                break
+    # Ставим или убираем флаг на клетке (x, y), на открытую клетку флаг не ставится
+    @SapperProfile.phase("flag")
+    def flag(self, x, y):
+        self._check_move(x, y)
+        self.__flag(x, y)
+        return {"status": self._status, "flagged": self._board.is_flagged(x, y)}
 
-            query = input().split(" ")
-            if not query[0].isdigit():
-                if len(query) != 2:
-                    print("Некорректный ввод!")
-                    continue
-                action = query[0]
-                name = query[1]
+    """
+    Открываем все закрытые клетки без флагов вокруг открытого числа (x, y),
+    если флагов вокруг него столько же, сколько бомб. Если флаг стоит не там, то открывается бомба - проигрыш
+    """
 
-                # Сохраняем игру
-                if action == "Save" and len(name) != 0:
-                    self.__save_game(name)
-                    break
+    @SapperProfile.phase("chord")
+    def chord(self, x, y):
+        self._check_move(x, y)
+        return self.__result(self.__chord(x, y))
 
-                elif action == "Start" or action == "Upload":
-                    print("Сначала сохраните игру!")
-                else:
-                    print("Некорректный ввод!")
+    """
+    Делаем пачку ходов moves за один вызов: массив (k, 3) или список троек (ход, x, y),
+    ход - OPEN, FLAG, UNFLAG или CHORD. Ходы после проигрыша не делаются
+    Возвращаем словарь: status, applied - кол-во сделанных ходов и изменения видимого поля
+    в виде массивов rows, cols, values (число открытой клетки, SapperBoard.FLAG или SapperBoard.CLOSED),
+    по одной записи на клетку - ее значение после всех ходов
+    """
 
-            elif len(query) != 3:
-                print("Некорректный ввод!")
+    @SapperProfile.phase("apply")
+    def apply(self, moves):
+        moves = np.asarray(moves, dtype=np.int64).reshape(-1, 3)
+        ops, xs, ys = moves[:, 0], moves[:, 1], moves[:, 2]
+        if self._status != SapperEngine.PLAYING and moves.shape[0]:
+            raise ValueError(f"Not correct status: {self._status}. Status should be {SapperEngine.PLAYING}!")
+        if ((ops < SapperEngine.OPEN) | (ops > SapperEngine.CHORD)).any():
+            raise ValueError(f"Not correct moves: {np.unique(ops).tolist()}. "
+                             f"Moves should be from {SapperEngine.OPEN} to {SapperEngine.CHORD}!")
+        outside = (xs < 0) | (xs >= self._height) | (ys < 0) | (ys >= self._width)
+        if outside.any():
+            x, y = moves[np.argmax(outside), 1:].tolist()
+            raise ValueError(f"Not correct cell: ({x}, {y}). Cell should be inside "
+                             f"{self._height}x{self._width} field!")
+
+        # Подряд идущие флаги ставятся и убираются разом, открытия делаются по одному
+        opens = np.flatnonzero((ops == SapperEngine.OPEN) | (ops == SapperEngine.CHORD))
+        revealed = []
+        marked = []
+        index = 0
+        while index < moves.shape[0] and self._status != SapperEngine.LOST:
+            op, x, y = moves[index].tolist()
+            if op == SapperEngine.OPEN:
+                revealed.append(self.__open(x, y))
+            elif op == SapperEngine.CHORD:
+                revealed.append(self.__chord(x, y))
+            else:
+                end = np.searchsorted(opens, index)
+                end = int(opens[end]) if end < opens.size else moves.shape[0]
+                marked.append(self.__mark(moves[index:end]))
+                index = end
                 continue
+            index += 1
+        applied = index
+
+        self.__update_status()
+        # Изменения по клеткам: открытые - их числа, флаги - FLAG или CLOSED по итоговому состоянию
+        revealed = np.concatenate(revealed) if revealed else np.zeros(0, dtype=np.int64)
+        # Клетки с флагом, открытые позже в той же пачке, остаются только в revealed
+        marked = np.unique(np.concatenate(marked)) if len(marked) > 1 \
+            else marked[0] if marked else np.zeros(0, dtype=np.int64)
+        marked = marked[~self._board.revealed.take(marked)]
+        flags = np.where(self._board.flags.take(marked), SapperBoard.FLAG, SapperBoard.CLOSED)
+        cells = np.concatenate([revealed, marked])
+        values = np.concatenate([self._board.values(revealed), flags]).astype(np.int8)
+        rows, cols = np.divmod(cells, self._width)
+        SapperProfile.count("moves_applied", applied)
+        return {"status": self._status, "applied": applied, "rows": rows, "cols": cols, "values": values}
+
+    # Открываем клетку (x, y) без проверок, возвращаем индексы открытых клеток
+    def __open(self, x, y):
+        if self._board.is_revealed(x, y):
+            return np.zeros(0, dtype=np.int64)
 
-            else:
-                x = int(query[0]) - 1
-                y = int(query[1]) - 1
-                action = query[2]
+        if self._count_move == 0:
+            self._generate_field(x, y)
+        if self._board.is_bomb(x, y):
+            self._status = SapperEngine.LOST
+            return np.zeros(0, dtype=np.int64)
 
-                # Генерируем поле после первого хода
-                if self._count_move == 0:
-                    self._generate_field(x, y)
+        revealed = self.__reveal(x, y)
+        self._journal_move(SapperJournal.OPEN, x, y, revealed)
+        return revealed
 
-                if self._current_field[x][y] != "X" and action == "Open" and self._current_field[x][y] != "F":
-                    print("Вы уже открывали это поле!")
-                    continue
+    # Ставим или убираем флаг на клетке (x, y) без проверок
+    def __flag(self, x, y):
+        if not self._board.is_revealed(x, y):
+            self._board.toggle_flag(x, y)
+            self._journal_move(SapperJournal.FLAG, x, y)
 
-                # Устанавливаем флаг на клетку
-                if action == "Flag":
-                    self.__set_flag(x, y)
-                    continue
+    """
+    Ходы FLAG и UNFLAG из массива moves (k, 3) разом, по каждой клетке действует ее последний ход
+    Возвращаем индексы клеток, на которых флаг изменился
+    """
 
-                # Открываем клетку
-                elif action == "Open":
-                    if self._open(x, y):
-                        self._count_move += 1
-                        continue
-                    # Проигрыш, открыта бомба
-                    is_win = False
-                    is_end = True
-                    break
-                else:
-                    print("Некорректный ввод!")
+    def __mark(self, moves):
+        board = self._board
+        cells = moves[::-1, 1] * self._width + moves[::-1, 2]
+        cells, last = np.unique(cells, return_index=True)
+        value = moves[::-1][last, 0] == SapperEngine.FLAG
+        changed = ~board.revealed.take(cells) & (board.flags.take(cells) != value)
+        cells, value = cells[changed], value[changed]
+
+        # С журналом флаги меняются по одному вместе с записями, чтобы журнал не отставал от поля
+        if self._journal is not None:
+            for cell in cells.tolist():
+                self.__flag(*divmod(cell, self._width))
+        else:
+            board.flags.put(cells[value], True)
+            board.flags.put(cells[~value], False)
+        return cells
+
+    # Открываем квадрат вокруг числа (x, y) без проверок, возвращаем индексы открытых клеток
+    def __chord(self, x, y):
+        board = self._board
+        if not board.is_revealed(x, y):
+            return np.zeros(0, dtype=np.int64)
+
+        closed = []
+        flags = 0
+        for di, dj in board.neighbours.shifts(x, y):
+            if board.is_flagged(x + di, y + dj):
+                flags += 1
+            elif not board.is_revealed(x + di, y + dj):
+                closed.append((x + di, y + dj))
+
+        if flags != board.count(x, y) or len(closed) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if any(board.is_bomb(i, j) for i, j in closed):
+            self._status = SapperEngine.LOST
+            return np.zeros(0, dtype=np.int64)
+
+        # Клетка могла открыться вместе с нулями соседней клетки
+        revealed = np.concatenate([self.__reveal(i, j) for i, j in closed if not board.is_revealed(i, j)])
+        self._journal_move(SapperJournal.CHORD, x, y, revealed)
+        return revealed
 
-            self._count_move += 1
+    """
+    Состояние игры: размер поля, кол-во бомб, открытых клеток и флагов, статус и поле, которое видит игрок.
+    У поля из плиток field - только прямоугольник с открытыми клетками, origin - его левый верхний угол
+    """
 
-        if is_end:
-            if is_win:
-                print("ПОБЕДА!")
-            else:
-                print("Поражение!\nПравильная комбинация:")
-                print(tabulate(self._field))
+    def state(self):
+        top, bottom, left, right = self._board.explored()
+        return {"height": self._height, "width": self._width, "bombs": self._bombs,
+                "opened": self._count_move, "flags": self._board.flags.count(),
+                "status": self._status, "origin": (top, left),
+                "field": self._board.visible_codes(top, bottom, left, right)}
 
-        print("\n\n")
-        self.start_play()
+    """
+    Сохраняем игру в файл НАЗВАНИЕ.sap в двоичном формате (SapperBoard.write):
+    заголовок с размером поля, кол-вом бомб и ходов, затем упакованные плоскости поля
+    """
 
-    # Устанавливаем флаг на клетку (x, y)
-    def __set_flag(self, x, y):
-        # На эту клетку нельзя установить флаг, т.к. она открыта
-        if self._current_field[x][y] != "X" and self._current_field[x][y] != "F":
-            return
-        # Если нет флага - устанавливаем
-        if self._current_field[x][y] != "F":
-            self._current_field[x][y] = "F"
-        # Убираем флаг
+    @SapperProfile.phase("save")
+    def save(self, name):
+        with open(name + ".sap", "wb") as file:
+            self._board.write(file, self._bombs, self._count_move, self._zeros)
+
+    # Загружаем игру из файла НАЗВАНИЕ.sap, а если его нет - из старого текстового НАЗВАНИЕ.txt
+    def load(self, name):
+        return self.load_file(name + ".sap" if os.path.exists(name + ".sap") else name + ".txt")
+
+    # Загружаем игру именно из файла path: .sap - двоичный формат, иначе - старый текстовый
+    @SapperProfile.phase("load")
+    def load_file(self, path):
+        if self._journal is not None:
+            self._journal.close()
+
+        if path.endswith(".sap"):
+            self.__set_game(*SapperBoard.read(path))
         else:
-            self._current_field[x][y] = "X"
+            self.__set_game(*self.__upload_text(path))
+        return self.state()
+
+    # Игра в двоичном формате сохранения (bytes), как в файле НАЗВАНИЕ.sap
+    def dump(self):
+        buffer = io.BytesIO()
+        self._board.write(buffer, self._bombs, self._count_move, self._zeros)
+        return buffer.getvalue()
+
+    # Загружаем игру из bytes в двоичном формате сохранения
+    @SapperProfile.phase("load")
+    def restore(self, data):
+        if self._journal is not None:
+            self._journal.close()
+
+        self.__set_game(*SapperBoard.from_buffer(data))
+        return self.state()
+
+    # Продолжаем игру из журнала НАЗВАНИЕ: последний снимок и ходы после него, журнал ведется дальше
+    def resume(self, name):
+        board, bombs, count_move, zeros, sequence = SapperJournal.resume(name)
+        self.__set_game(board, bombs, count_move, zeros)
+
+        if self._journal is None:
+            self._journal = SapperJournal(name)
+        self._start_journal(sequence)
+        return self.state()
 
-    # Открываем клетку (x, y)
-    def _open(self, x, y):
-        if self._field[x][y] == "B":
-            return False
-        self._current_field[x][y] = self._field[x][y]
+    """
+    Ставим загруженную игру: поле board, кол-во бомб и открытых клеток, маска нулей zeros
+    В сохранении и журнале не бывает открытой бомбы, поэтому статус прошлой игры сбрасываем:
+    загруженная игра идет или выиграна
+    """
+
+    def __set_game(self, board, bombs, count_move, zeros):
+        self._board = board
+        self._bombs = bombs
+        self._count_move = count_move
+        self._zeros = zeros
+        self._height = board.height
+        self._width = board.width
+        self._status = SapperEngine.PLAYING
+        self.__update_status()
+
+    # Проверяем, что игра идет и клетка (x, y) на поле
+    def _check_move(self, x, y):
+        if self._status != SapperEngine.PLAYING:
+            raise ValueError(f"Not correct status: {self._status}. Status should be {SapperEngine.PLAYING}!")
+        if not (0 <= x < self._height and 0 <= y < self._width):
+            raise ValueError(f"Not correct cell: ({x}, {y}). Cell should be inside "
+                             f"{self._height}x{self._width} field!")
+
+    # Открываем клетку (x, y) без бомбы, возвращаем индексы открытых клеток
+    def __reveal(self, x, y):
+        # Если рядом нет бомб, то открываем новые клетки с 0-ем
+        if self._board.reveal(x, y) == 0:
+            revealed = np.append(self._board.flood_fill(x, y, self._zeros), x * self._width + y)
+        else:
+            revealed = np.array([x * self._width + y])
 
-        # Если рядом нет бомб, то открываем новые клетки
-        if self._current_field[x][y] == "0":
-            self.__open_new_items(x, y)
+        self._count_move += revealed.size
+        SapperProfile.count("cells_revealed", revealed.size)
+        return revealed
 
-        return True
+    # Результат хода, открывшего клетки revealed
+    def __result(self, revealed):
+        self.__update_status()
+        return {"status": self._status, "revealed": revealed, "values": self._board.values(revealed)}
+
+    # Если открыты все клетки без бомб, то игра выиграна
+    def __update_status(self):
+        if self._status != SapperEngine.LOST:
+            is_won = self._count_move == self._width * self._height - self._bombs
+            self._status = SapperEngine.WON if is_won else SapperEngine.PLAYING
+
+    """
+    Записываем ход op в клетку (x, y) в журнал, если он ведется; cells - индексы открытых клеток
+    Журнал начинается снимком после первого открытия, когда поле уже создано
+    """
+
+    def _journal_move(self, op, x, y, cells=()):
+        if self._journal is None:
+            return
+        if self._journal.is_started():
+            self._journal.append(op, x, y, cells)
+        elif op != SapperJournal.FLAG:
+            self._start_journal()
 
-    # Открываем новые клетки с 0-ем
-    def __open_new_items(self, i, j):
-        # Берем квадрат 3x3 с центром в (i; j)
-        start_i = i - 1 if i != 0 else 0
-        start_j = j - 1 if j != 0 else 0
-        finish_i = i + 1 if i != self._height - 1 else i
-        finish_j = j + 1 if j != self._width - 1 else j
-
-        for cur_i in range(start_i, finish_i + 1):
-            for cur_j in range(start_j, finish_j + 1):
-                # Клетка открыта
-                if self._current_field[cur_i][cur_j] == "X":
-                    self._count_move += 1
-                self._current_field[cur_i][cur_j] = self._field[cur_i][cur_j]
-                coord = (cur_i, cur_j)
-
-                # Проверяем, что такой координаты не было
-                if self._current_field[cur_i][cur_j] == "0" and coord not in self._zeros:
-                    self._zeros.append(coord)
-                    self.__open_new_items(cur_i, cur_j)
-
-    """
-    Сохраняем игру в файл
+    # Начинаем журнал со снимка текущей игры, sequence - кол-во уже учтенных записей
+    def _start_journal(self, sequence=0):
+        self._journal.start(lambda: (self._board, self._bombs, self._count_move, self._zeros), sequence)
+
+    """
+    Загружаем игру из текстового файла старого формата (до двоичного), чтобы перенести старые сохранения:
     РАЗМЕР_ПОЛЯ КОЛИЧЕСТВО_БОМБ КОЛИЧЕСТВО_ХОДОВ
     Закодированное текущее поле
     Закодированное поле с ответами
     Точки с нулями
+    При следующем сохранении игра запишется в двоичном формате
+    Возвращаем (поле, кол-во бомб, кол-во открытых клеток, маска нулей)
     """
 
-    def __save_game(self, name):
-        cur_field, field = self.__encoding()
-        with open(name + ".txt", "w+", encoding="utf-8") as file:
-            file.write(str(self._height) + " ")
-            file.write(str(self._width) + " ")
-            file.write(str(self._bombs) + " ")
-            file.write(str(self._count_move) + "\n")
-            file.write(str(cur_field) + "\n")
-            file.write(str(field) + "\n")
-            zeros_str = ""
-            for elem in self._zeros:
-                zeros_str += str(elem[0]) + ";" + str(elem[1]) + " "
-            file.write(zeros_str)
-
-        self._current_field = []
-        self._zeros = []
-        self._count_move = 0
-        self._field = []
-        self._width, self._height, self_bombs = 5, 5, 5
-
-    # Начало игры
-    def start_play(self):
-        print(self.__USER_FUNCTIONALITY)
-        query = input()
-        splt = query.split(" ")
-
-        if query == "Start game":
-            self._set_playing_params()
-            self.__play()
-        elif len(splt) == 2 and splt[0] == "Upload" and len(splt[1]) != 0:
-            self.__upload_play(splt[1])
-        elif query == "Start solver":
-            SapperSolver().start_solver()
-        else:
-            print("Некорректный ввод!")
-
-    # Запуск игры
-    def _set_playing_params(self):
-        h = int(input("Высота поля: "))
-        w = int(input("Ширина поля: "))
-        y = int(input("Количество бомб: "))
-        while h < 2 or h > 20 or y < 2 or y >= h * w or w < 2 or w > 20:
-            print("Некорректный ввод!")
-            print("Ограничения: размер поля не больше 20 и не меньше 2. "
-                  "И кол-во бомб не меньше 2 и меньше квадрата размера поля.")
-            h = int(input("Высота поля: "))
-            w = int(input("Ширина поля: "))
-            y = int(input("Количество бомб: "))
-        self._height = h
-        self._width = w
-        self._bombs = y
-        self._count_move = 0
-
-    # Загружаем игру из файла
-    def __upload_play(self, name):
+    def __upload_text(self, path):
         # Отчищаем параметры
         encoding_cur_field = 0
         encoding_field = 0
-        self._zeros.clear()
-        self._field = []
-        self._current_field = []
+        zeros = []
 
         # Построчно заполняем self
-        for ind, line in enumerate(SapperUserSolver.__reader(name + ".txt")):
+        for ind, line in enumerate(SapperEngine.__reader(path)):
             if ind == 0:
                 s = line.split()
-                self._height = int(s[0])
-                self._width = int(s[1])
-                self._bombs = int(s[2])
-                self._count_move = int(s[3])
+                height = int(s[0])
+                width = int(s[1])
+                bombs = int(s[2])
+                count_move = int(s[3])
             elif ind == 1:
                 encoding_cur_field = line[1:]
             elif ind == 2:
@@ -324,44 +484,19 @@ class SapperUserSolver(Sapper):
                 for coord in line.split():
                     x = int(coord.split(";")[0])
                     y = int(coord.split(";")[1])
-                    self._zeros.append((x, y))
+                    zeros.append((x, y))
 
         # Дешифруем поля, получаем строки
-        current_field, field = SapperUserSolver \
+        current_field, field = SapperEngine \
             .__decoding(encoding_cur_field.encode("utf-8"), encoding_field.encode("utf-8"))
 
-        # Перевод поля из строки в поле (np.array)
-        self._current_field = SapperUserSolver.__str_to_field(current_field)
-        self._field = SapperUserSolver.__str_to_field(field)
-
-        self.__play()
-
-    # Кодируем игровые поля
-    def __encoding(self):
-        # Переводим поля в строки
-        current_field_str = SapperUserSolver.__field_to_str(self._current_field)
-        field_str = SapperUserSolver.__field_to_str(self._field)
-
-        # Кодируем поля
-        # Возращаем байты
-        return base64.b64encode(current_field_str.encode("utf-8")), base64.b64encode(field_str.encode("utf-8"))
-
-    def _get_square_on_field(self, i, j, is_main_field=True):
-        start_i = i - 1 if i != 0 else 0
-        start_j = j - 1 if j != 0 else 0
-        finish_i = i + 1 if i != self._height - 1 else i
-        finish_j = j + 1 if j != self._width - 1 else j
-        square = []
-        iterable = self._field if is_main_field else self._current_field
-
-        for cur_i in range(start_i, finish_i + 1):
-            temp = []
-            for cur_j in range(start_j, finish_j + 1):
-                temp.append(iterable[cur_i][cur_j])
-
-            square.append(np.array(temp))
-
-        return np.array(square)
+        # Перевод поля из строки в поле (np.array), а затем в SapperBoard
+        board = SapperBoard.from_strings(SapperEngine.__str_to_field(current_field),
+                                         SapperEngine.__str_to_field(field))
+        mask = BitMask(height, width)
+        for x, y in zeros:
+            mask.set(x, y)
+        return board, bombs, count_move, mask
 
     # Декодируем поля из файла
     @staticmethod
@@ -369,15 +504,6 @@ class SapperUserSolver(Sapper):
         # Возращаем стороки
         return base64.b64decode(current_field).decode("utf-8"), base64.b64decode(field).decode("utf-8")
 
-    # Перевод поля в строку
-    @staticmethod
-    def __field_to_str(filed):
-        field_str = ""
-        for x in filed:
-            field_str += " ".join(x)
-            field_str += "\n"
-        return field_str
-
     # Перевод строки в поле
     @staticmethod
     def __str_to_field(str_field):
@@ -400,249 +526,577 @@ class SapperUserSolver(Sapper):
         for line in open(filename):
             yield line
 
-    # Вывод текущего состояния поля
-    def _print_user_field(self):
-        print(tabulate(self._current_field))
+
+"""
+Класс SapperUserSolver - консольная игра поверх SapperEngine, позволяет:
+1. Начать новую игру
+2. Сохранить ее в виде двоичного файла .sap (при указании имя файла расширение указывать не нужно).
+3. Загружать файл с игрой и продолжать играть (читаются и старые текстовые сохранения .txt)
+4. Вести журнал ходов (SapperJournal) и продолжать игру из него после сбоя
+Ходы вводятся как: СТРОКА СТОЛБЕЦ Open/Flag/Chord
+"""
+
+
+class SapperUserSolver(SapperEngine):
+    __USER_FUNCTIONALITY = "1. Для сохранения игры введите: Save НАЗВАНИЕ_ФАЙЛА\n" \
+                           "2. Для загрузки игры введите: Upload НАЗВАНИЕ_ФАЙЛА. " \
+                           "Для загрузки игры сначала необходимо завершить " \
+                           "предыдущюю игру, т.е. сохранить ее.\n" \
+                           "3. Чтобы начать новую игру, введите: Start game\n" \
+                           "4. Чтобы запустить решателя сапера, введите: Start solver\n" \
+                           "5. Чтобы продолжить игру из журнала после сбоя, введите: Resume НАЗВАНИЕ_ЖУРНАЛА\n" \
+                           "6. Чтобы увидеть список сохранений каталога, введите: Saves\n" \
+                           "7. Чтобы выйти, введите: Exit"
+
+    """
+    seed - зерно генератора поля
+    journal - журнал ходов SapperJournal (None - ходы не записываются)
+    render - вывод поля SapperRender (None - по умолчанию для терминала)
+    tile - сторона плитки поля, как у Sapper
+    catalog - каталог сохранений SapperCatalog (None - игры сохраняются файлами НАЗВАНИЕ.sap)
+    """
+
+    def __init__(self, seed=None, journal=None, render=None, tile=None, catalog=None):
+        super().__init__(5, 5, 5, seed, journal, tile)
+        self._render = SapperRender() if render is None else render
+        self._catalog = catalog
+
+    # Меню: после каждой игры возвращаемся сюда, пока пользователь не выйдет
+    def start_play(self):
+        while True:
+            print(self.__USER_FUNCTIONALITY)
+            query = input()
+            splt = query.split(" ")
+
+            if query == "Start game":
+                self._set_playing_params()
+                self.__play()
+            elif len(splt) == 2 and splt[0] == "Upload" and len(splt[1]) != 0:
+                # Игры нет в каталоге - пробуем файл сохранения (например, сохраненный до каталога)
+                if self._catalog is not None and splt[1] in self._catalog:
+                    self._catalog.load(splt[1], self)
+                elif not os.path.exists(splt[1] + ".sap") and not os.path.exists(splt[1] + ".txt"):
+                    print("Сохранение не найдено!" if self._catalog is not None else "Файл не найден!")
+                    continue
+                else:
+                    self.load(splt[1])
+                self.__play()
+            elif query == "Start solver":
+                SapperSolver().start_solver()
+            elif len(splt) == 2 and splt[0] == "Resume" and len(splt[1]) != 0:
+                if not os.path.exists(splt[1] + ".sap"):
+                    print("Журнал не найден!")
+                    continue
+                self.resume(splt[1])
+                self.__play()
+            elif query == "Saves":
+                if self._catalog is None:
+                    print("Каталог сохранений не задан!")
+                    continue
+                print(tabulate([[game["name"], f"{game['height']}x{game['width']}", game["bombs"], game["opened"]]
+                                for game in self._catalog.list(limit=50)],
+                               headers=["Название", "Поле", "Бомбы", "Открыто"]))
+            elif query == "Exit":
+                return
+            else:
+                print("Некорректный ввод!")
+
+    # Процесс игры: ходы вводятся, пока игра не закончится или не будет сохранена
+    def __play(self):
+        # focus - клетка последнего хода, окно вывода поля сдвигается к ней
+        focus = None
+        self._render.reset(f"Количество бомб: {self._bombs}")
+
+        while self._status == SapperEngine.PLAYING:
+            # После каждого хода печатаем поле
+            self._print_user_field(focus)
+
+            query = input().split(" ")
+            if not query[0].isdigit():
+                if len(query) != 2:
+                    self._render.message("Некорректный ввод!")
+                    continue
+                action = query[0]
+                name = query[1]
+
+                # Сохраняем игру
+                if action == "Save" and len(name) != 0:
+                    if self._catalog is not None:
+                        self._catalog.save(self, name)
+                    else:
+                        self.save(name)
+                    break
+
+                elif action == "Start" or action == "Upload":
+                    self._render.message("Сначала сохраните игру!")
+                else:
+                    self._render.message("Некорректный ввод!")
+
+            elif len(query) != 3 or not query[1].isdigit():
+                self._render.message("Некорректный ввод!")
+
+            else:
+                x = int(query[0]) - 1
+                y = int(query[1]) - 1
+                action = query[2]
+                if not (0 <= x < self._height and 0 <= y < self._width):
+                    self._render.message("Некорректный ввод!")
+                    continue
+                focus = (x, y)
+
+                if self._board.is_revealed(x, y) and action == "Open":
+                    self._render.message("Вы уже открывали это поле!")
+                elif action == "Open":
+                    self.open(x, y)
+                elif action == "Flag":
+                    self.flag(x, y)
+                elif action == "Chord":
+                    self.chord(x, y)
+                else:
+                    self._render.message("Некорректный ввод!")
+
+        if self._journal is not None:
+            self._journal.close()
+
+        if self._status == SapperEngine.WON:
+            self._print_user_field(focus)
+            print("ПОБЕДА!")
+        elif self._status == SapperEngine.LOST:
+            print("Поражение!\nПравильная комбинация:")
+            print(tabulate(self._board.answer()))
+
+        print("\n\n")
+
+    # Запуск игры
+    def _set_playing_params(self):
+        h = int(input("Высота поля: "))
+        w = int(input("Ширина поля: "))
+        y = int(input("Количество бомб: "))
+        while h < 2 or y < 2 or y >= h * w or w < 2:
+            print("Некорректный ввод!")
+            print("Ограничения: размер поля не меньше 2. "
+                  "И кол-во бомб не меньше 2 и меньше кол-ва клеток поля.")
+            h = int(input("Высота поля: "))
+            w = int(input("Ширина поля: "))
+            y = int(input("Количество бомб: "))
+        self.new_game(h, w, y)
+
+    # Вывод текущего состояния поля: печатаются только изменившиеся клетки, focus - клетка последнего хода
+    def _print_user_field(self, focus=None):
+        self._render.draw(self._board, focus)
 
 
 """
 Класс SapperSolver наследует SapperUserSolver и решает Сапера.
 С консоли можно ввести размеры поля и кол-во бомб.
-Алгоритм решает поля 5x5 с 5-ью бомбами
+Решатель считает точные вероятности бомб (SapperProbability): открывает клетки без бомб,
+ставит флаги на клетки, где бомба точно есть, а если таких нет - открывает клетку с наименьшей вероятностью бомбы
 """
 
 
 class SapperSolver(SapperUserSolver):
-    def __init__(self):
-        SapperUserSolver.__init__(self)
+    # На полях меньше стольких клеток компоненты границы всегда перебираются в текущем процессе
+    PARALLEL_BOARD_CELLS = 10000
+    # Чем выбран ход: простые выводы по числам, кэш участков или стратегия; и их имена
+    DEDUCE = 0
+    PATTERNS = 1
+    STRATEGY = 2
+    SOURCES = ("deduce", "patterns", "strategy")
+
+    """
+    seed - зерно генератора поля и первого хода
+    verbose - печатать ли ходы решателя и поле (False - решатель работает без вывода)
+    journal - журнал ходов SapperJournal (None - ходы не записываются)
+    patterns - кэш выводов по участкам поля SapperPatterns (None - общий кэш процесса)
+    tile - сторона плитки поля, как у Sapper
+    workers - кол-во процессов для перебора независимых компонент границы (1 - в текущем процессе)
+    strategy - стратегия SapperStrategy или ее имя (по умолчанию "probability")
+    openings - кэш статистики первого хода SapperOpenings: первый ход - лучшая клетка из него
+    (None или нет конфигурации в кэше - случайная клетка)
+    """
 
-        # Стратегическое поле, на котором будут определяться бомбы
-        # -2 - закрытая клетка; -1 - бомба (флаг); 0 - клетка, около которой нет закрытых бомб
-        # -3 - клетка, рядом с которой открыты все клетки; n - число бомб рядом
-        self.__strategic_field = []
+    def __init__(self, seed=None, verbose=True, journal=None, patterns=None, tile=None, workers=1,
+                 strategy="probability", openings=None):
+        if workers < 1:
+            raise ValueError(f"Not correct workers: {workers}. Workers should be >= 1!")
+        self._strategy = SapperStrategy.create(strategy)
+        SapperUserSolver.__init__(self, seed, journal, None if verbose else SapperRender(mode="silent"), tile)
+        self._openings = openings
+        self._verbose = verbose
+        self.__count_steps = 0
+        self.__count_flags = 0
+
+        # Состояние решателя между ходами (индексы клеток - x * width + y):
+        # __unknown[k] - кол-во закрытых соседей без флагов у клетки k, __flagged[k] - кол-во флагов рядом с ней
+        # (у поля из плиток - словари только по затронутым клеткам)
+        # __frontier - открытые числа, рядом с которыми есть закрытые клетки
+        # __dirty - открытые числа, рядом с которыми что-то изменилось с прошлого хода
+        # __pattern_dirty - такие же числа, еще не проверенные по кэшу участков
+        # __cache - перебранные компоненты границы (SapperProbability)
+        self.__unknown = bytearray()
+        self.__flagged = bytearray()
+        self.__frontier = set()
+        self.__dirty = set()
+        self.__pattern_dirty = set()
+        self.__cache = {}
+        self.__patterns = SapperPatterns.shared() if patterns is None else patterns
+        # Оценка выборкой компонент, слишком больших для перебора (None - такие компоненты не оцениваются)
+        # Выборка берет числа из своего дочернего генератора и ограничена кол-вом расстановок, а не временем,
+        # поэтому поле и ходы решателя зависят только от seed
+        self._sampler = SapperSampler(rng=self._rng.spawn(1)[0])
+        self.__workers = workers
 
     # Запуск решателя
     def start_solver(self):
-        # Генерируем поля и делаем первый ход
         if self._count_move == 0:
             self._set_playing_params()
 
-            x = rd.randint(0, self._height - 1)
-            y = rd.randint(0, self._width - 1)
+        if self.solve():
+            print("ПОБЕДА!")
+        else:
+            print("Поражение!\nПравильная комбинация:")
+            print(tabulate(self._board.answer()))
 
-            self._current_field = [["X" for _ in range(self._width)] for _ in range(self._height)]
-            self.__strategic_field = [[-2 for _ in range(self._width)] for _ in range(self._height)]
-            self._generate_field(x, y)
-            self.__open(x, y)
-            print(f"Решатель открывает клетку ({x + 1},"
-                  f" {y + 1})")
+    """
+    Решаем поле height x width с bombs бомбами без ввода с консоли
+    Поле и первый ход задаются генератором self._rng, т.е. seed из конструктора
+    Возвращаем (победа или нет, кол-во ходов решателя)
+    """
+
+    def play(self, height, width, bombs):
+        self.new_game(height, width, bombs)
+
+        return self.solve(), self.__count_steps
+
+    """
+    Решаем текущее поле
+    Если ходов еще не было, то генерируем поле и открываем случайную клетку
+    Возвращаем True, если решатель победил
+    """
+
+    def solve(self):
+        self.__count_steps = 0
+        try:
+            return self.__solve()
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+
+    def __solve(self):
+
+        # Генерируем поля и делаем первый ход
+        if self._count_move == 0:
+            x, y = self._strategy.first_move(self)
 
-            print(tabulate(self._field))
+            self.new_game(self._height, self._width, self._bombs)
+            self.__track_board()
+            self.__open(x, y)
+            self.__count_steps += 1
+            self.__say(f"Решатель открывает клетку ({x + 1},"
+                       f" {y + 1})")
+        else:
+            self.__track_board()
 
-        is_win = True
+        self._render.reset()
         while True:
             self._print_user_field()
 
+            if self._status == SapperEngine.LOST:
+                return False
+
             # Если решатель открыл все клетки без бомб, то он победил
             if self._count_move == self._height * self._width - self._bombs:
-                is_win = True
-                break
-
-            # Выбираем клетку
-            min_probability_coord, bombs_coord = self.__choose_cell()
-
-            # Если есть координаты бомб, то ставим флаги на эти клетки
-            if bombs_coord is not None:
-                self.__set_flags(bombs_coord)
+                return True
 
-            # Иначе, открываем клетку
-            elif min_probability_coord is not None:
-                print(f"Решатель открывает клетку ({min_probability_coord[0] + 1},"
-                      f" {min_probability_coord[1] + 1})")
+            self.__count_steps += 1
+            self._strategy.before_step(self)
 
-                if not self.__open(min_probability_coord[0], min_probability_coord[1]):
-                    is_win = False
-                    break
+            # Сначала простые выводы по числам, рядом с которыми что-то изменилось
+            if self.__deduce():
+                self._strategy.after_decision(self, SapperSolver.DEDUCE)
+                continue
 
-            # Ход был уже сделан
-            else:
+            # Затем выводы по знакомым участкам поля (1-2-1, стенки и т.п.) из кэша
+            if self.__deduce_patterns():
+                self._strategy.after_decision(self, SapperSolver.PATTERNS)
                 continue
 
-        if is_win:
-            print("ПОБЕДА!")
-        else:
-            print("Поражение!\nПравильная комбинация:")
-            print(tabulate(self._field))
+            # Выбираем клетки стратегией (по умолчанию - по вероятностям)
+            open_coords, bombs_coord = self.__choose_cell()
+            self._strategy.after_decision(self, SapperSolver.STRATEGY)
 
-    # Выбираем клетку, которую открыть или поставить флаг
-    def __choose_cell(self):
-        count_options = [[0 for _ in range(self._width)] for _ in range(self._height)]
-        sum_options = [[100 for _ in range(self._width)] for _ in range(self._height)]
-        bombs_coord = []
+            # Ставим флаги на клетки, где точно есть бомбы
+            self.__set_flags(bombs_coord)
 
-        for i, array in enumerate(self.__strategic_field):
-            for j, cell in enumerate(array):
-                # Если клетка закрыта, то вычисляем вероятность не попасть в бомбу
-                if cell == -2:
-                    # Кол-во открытых чисел рядом с закрытой
-                    for x, y in self.__get_coords(i, j):
-                        if self._current_field[x][y] != "X" and self._current_field[x][y] != "F":
-                            count_options[i][j] += 1
-
-                # Если клетка закрыта или на ней стоит флаг или она открыта со всех сторон
-                if cell < 0:
+            # Открываем клетки без бомб или клетку с наименьшей вероятностью бомбы
+            for x, y in open_coords:
+                # Клетка могла открыться вместе с нулями
+                if self._board.is_revealed(x, y):
                     continue
 
-                # Если клетка 0, то проверяем, все ли клетки около нее открыты
-                if cell == 0 and self.__open_square(i, j):
-                    return None, None
+                self.__say(f"Решатель открывает клетку ({x + 1}, {y + 1})")
+                if not self.__open(x, y):
+                    return False
 
-                count_x = 0
-                temp_bombs_coord = []
-                strategic_cell = self.__strategic_field[i][j]
+    # Печатаем ход решателя, если он не запущен без вывода
+    def __say(self, message):
+        if self._verbose:
+            self._render.message(message)
 
-                for x, y in self.__get_coords(i, j):
-                    if self.__strategic_field[x][y] == -2:
-                        # Проверяем, возможные бомбы
-                        count_x += 1
-                        temp_bombs_coord.append((x, y))
-
-                        # Добвляем к закрытой клетке
-                        if sum_options[x][y] == 100:
-                            sum_options[x][y] = 0
-
-                        sum_options[x][y] += strategic_cell
+    # Строим состояние решателя по всему текущему полю, один раз за игру
+    def __track_board(self):
+        if isinstance(self._board, SapperChunkedBoard):
+            self.__track_chunked_board()
+            return
 
-                if count_x == strategic_cell and len(temp_bombs_coord) != 0:
-                    for cur_x, cur_y in temp_bombs_coord:
-                        bombs_coord.append(tuple([cur_x, cur_y]))
+        revealed = self._board.revealed.to_array()
+        flags = self._board.flags.to_array()
+        closed = ~revealed & ~flags
+
+        unknown = (SapperBoard.count_bombs(closed) - closed).reshape(-1)
+        self.__unknown = bytearray(unknown.tobytes())
+        self.__flagged = bytearray((SapperBoard.count_bombs(flags) - flags).tobytes())
+        self.__frontier = set(np.flatnonzero(revealed.reshape(-1) & (unknown > 0)).tolist())
+        self.__dirty = set(self.__frontier)
+        self.__pattern_dirty = set()
+        self.__count_flags = int(flags.sum())
+        self.__cache = {}
+
+    # То же для поля из плиток: счетчики в словарях, открытые клетки и флаги учитываются по одной
+    def __track_chunked_board(self):
+        board = self._board
+        self.__unknown = _ClosedNeighbours(board)
+        self.__flagged = defaultdict(int)
+        self.__frontier = set()
+        self.__pattern_dirty = set()
+        self.__count_flags = board.flags.count()
+        self.__cache = {}
+
+        for cell in board.revealed.cells().tolist():
+            self.__touch_cell(cell)
+        for cell in board.flags.cells().tolist():
+            self.__touch_cell(cell, True)
+        self.__dirty = set(self.__frontier)
 
-        if len(bombs_coord) != 0:
-            return None, bombs_coord
+    """
+    Клетки cells (массив индексов) перестали быть закрытыми: открылись или на них поставлен флаг
+    Уменьшаем кол-во закрытых соседей около них и обновляем границу и измененные числа
+    """
 
-        min_p = 100
-        coord = ()
+    def __touch(self, cells, is_flag=False):
+        # Несколько клеток (и все клетки поля из плиток) обновляем по одной без numpy
+        if cells.size < 16 or not isinstance(self.__unknown, bytearray):
+            for cell in cells.tolist():
+                self.__touch_cell(cell, is_flag)
+            return
 
-        for i in range(self._height):
-            for j in range(self._width):
-                if count_options[i][j] != 0 and sum_options[i][j] != 0 \
-                        and self.__strategic_field[i][j] != -1 and self.__strategic_field[i][j] == -2:
-                    x = sum_options[i][j] / count_options[i][j]
+        height, width = self._height, self._width
+        x, y = np.divmod(cells, width)
+        near = []
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                if di != 0 or dj != 0:
+                    near_x = x + di
+                    near_y = y + dj
+                    inside = (near_x >= 0) & (near_x < height) & (near_y >= 0) & (near_y < width)
+                    near.append(near_x[inside] * width + near_y[inside])
+        near = np.concatenate(near)
+
+        unknown = np.frombuffer(self.__unknown, dtype=np.uint8)
+        # Для больших открытий дешевле посчитать изменения сразу по всему полю
+        if near.size > unknown.size // 16:
+            unknown -= np.bincount(near, minlength=unknown.size).astype(np.uint8)
+        else:
+            np.subtract.at(unknown, near, 1)
+        if is_flag:
+            np.add.at(np.frombuffer(self.__flagged, dtype=np.uint8), near, 1)
+
+        changed = np.unique(np.concatenate([cells, near]))
+        changed = changed[self._board.revealed.take(changed)]
+        active = unknown[changed] > 0
+        self.__frontier.difference_update(changed[~active].tolist())
+        self.__frontier.update(changed[active].tolist())
+        self.__dirty.update(changed[active].tolist())
+
+    # То же для одной клетки cell
+    def __touch_cell(self, cell, is_flag=False):
+        board = self._board
+        x, y = divmod(cell, self._width)
+
+        for shift in board.neighbours.flat_shifts(x, y):
+            near = cell + shift
+            if shift != 0:
+                self.__unknown[near] -= 1
+                if is_flag:
+                    self.__flagged[near] += 1
+
+            if board.revealed[divmod(near, self._width)]:
+                if self.__unknown[near] > 0:
+                    self.__frontier.add(near)
+                    self.__dirty.add(near)
                 else:
-                    continue
+                    self.__frontier.discard(near)
 
-                if min_p > x:
-                    min_p = x
-                    coord = (i, j)
+    """
+    Простые выводы по числам из __dirty: если все бомбы числа отмечены флагами, то открываем его квадрат,
+    если закрытых клеток рядом столько же, сколько не отмеченных бомб - ставим на них флаги
+    Возвращаем True, если был сделан ход
+    """
 
-        return coord, None
+    @SapperProfile.phase("deduce")
+    def __deduce(self):
+        board = self._board
+        width = self._width
+        squares = []
+        bombs_coord = []
+        dirty = self.__dirty
+        self.__dirty = set()
+        self.__pattern_dirty |= dirty
 
-    # Ставим флаги на координаты в coord_bombs
-    def __set_flags(self, coord_bombs):
-        for x, y in coord_bombs:
-            if self.__strategic_field[x][y] == -1:
+        for cell in dirty:
+            unknown = self.__unknown[cell]
+            if unknown == 0:
                 continue
-            self.__strategic_field[x][y] = -1
-            self._current_field[x][y] = "F"
 
-            # Вычитаем из всех соседних клеток 1
-            for i, j in self.__get_coords(x, y):
-                if self.__strategic_field[i][j] > 0:
-                    self.__strategic_field[i][j] -= 1
+            x, y = divmod(cell, width)
+            needed = board.count(x, y) - self.__flagged[cell]
+            if needed == 0:
+                squares.append((x, y))
+            elif needed == unknown:
+                for di, dj in board.neighbours.shifts(x, y):
+                    if board.is_closed(x + di, y + dj):
+                        bombs_coord.append((x + di, y + dj))
+
+        self.__set_flags(bombs_coord)
+        for x, y in squares:
+            # После неверного флага открытие квадрата может закончить игру
+            if self._status != SapperEngine.PLAYING:
+                break
+            self.__open_square(x, y)
 
-            print(f"Решатель ставит флаг на клетку ({x + 1}, {y + 1})")
+        return len(squares) != 0 or len(bombs_coord) != 0
 
-    # Отнимаем 1 у всех соседник клеток с (x, y)
-    def __minus_bomb(self, x, y):
-        for cur_x, cur_y in self.__get_coords(x, y):
-            if self.__strategic_field[cur_x][cur_y] == -1 and self.__strategic_field[x][y] > 0:
-                self.__strategic_field[x][y] -= 1
+    """
+    Выводы по окнам вокруг чисел из __pattern_dirty (SapperPatterns): ставим флаги и открываем клетки,
+    которые определяются числами рядом без перебора всей границы
+    Возвращаем True, если был сделан ход
+    """
 
-    # Открываем все ближайшие клетки, если они закрыты
-    def __open_square(self, x, y):
-        is_open = False
-        self.__strategic_field[x][y] = -3
+    def __deduce_patterns(self):
+        numbers = self.__pattern_dirty & self.__frontier
+        self.__pattern_dirty = set()
+        if not numbers:
+            return False
 
-        for i, j in self.__get_coords(x, y):
-            # Если клетка закрыта, то открываем
-            if self._current_field[i][j] == "X":
-                self._current_field[i][j] = self._field[i][j]
-                self.__strategic_field[i][j] = int(self._field[i][j])
-                self._count_move += 1
-                is_open = True
+        safe, mines = self.__patterns.deduce(self._board, numbers)
+        self.__set_flags([divmod(cell, self._width) for cell in sorted(mines)])
+        for cell in sorted(safe):
+            x, y = divmod(cell, self._width)
+            # Клетка могла открыться вместе с нулями
+            if not self._board.is_closed(x, y):
+                continue
+            if self._status != SapperEngine.PLAYING:
+                break
 
-                print(f"Решатель открывает клетку ({i + 1}, {j + 1})")
-                self.__minus_bomb(x, y)
+            self.__say(f"Решатель открывает клетку ({x + 1}, {y + 1})")
+            if not self.__open(x, y):
+                return True
 
-                if self._current_field[i][j] == "0":
-                    self.__open_new_items(i, j)
+        return len(safe) != 0 or len(mines) != 0
 
-        return is_open
+    # Ход стратегии, когда простые выводы не сработали: (клетки без бомб, клетки с бомбами)
+    @SapperProfile.phase("choose_cell")
+    def __choose_cell(self):
+        return self._strategy.next_action(self)
 
-    # Метод возвращает координаты ближайших клеток
-    def __get_coords(self, i, j):
-        coords = []
+    """
+    Вероятности бомб на границе для стратегии (SapperProbability.solve с кэшем компонент решателя)
+    Возвращаем (cells, probabilities, free, free_probability, exact): как у SapperProbability.solve,
+    exact - маска клеток cells с точными вероятностями (SapperProbability.exact)
+    """
 
-        # Координаты по j
-        coords_j = [j + x for x in (-1, 1, 0)]
+    def _probabilities(self):
+        closed = self._height * self._width - self._count_move - self.__count_flags
+        # Пул процессов нужен только на больших полях, где много крупных компонент
+        pool = None
+        if self.__workers > 1 and self._height * self._width >= SapperSolver.PARALLEL_BOARD_CELLS:
+            pool = SapperProbability.pool(self.__workers)
+
+        probability = SapperProbability(self._board, self._bombs, cache=self.__cache, sampler=self._sampler,
+                                        pool=pool)
+        return (*probability.solve(self.__frontier, closed, self.__count_flags), probability.exact)
+
+    # Открытые числа, рядом с которыми есть закрытые клетки (индексы x * width + y, не изменять)
+    def _frontier(self):
+        return self.__frontier
+
+    # Кол-во флагов рядом с клеткой cell
+    def _flags_near(self, cell):
+        return self.__flagged[cell]
+
+    # Закрытые клетки без флагов, которых нет в cells (не рядом с открытыми числами);
+    # у поля из плиток - только в плитках, где уже есть открытые клетки и флаги
+    def _free_cells(self, cells):
+        closed = self._board.closed_cells()
+        return closed[~np.isin(closed, cells)]
+
+    # Случайная закрытая клетка не из cells: сначала пробуем угадать, иначе выбираем из всех
+    def _random_free_cell(self, cells):
+        frontier = set(cells.tolist())
+        for _ in range(64):
+            cell = int(self._rng.integers(self._height * self._width))
+            if cell not in frontier and self._board.is_closed(*divmod(cell, self._width)):
+                return cell
+
+        free = self._free_cells(cells)
+        return free[self._rng.integers(free.size)]
 
-        # Координаты по i
-        coords_i = [i + x for x in (-1, 1, 0)]
+    # Ставим флаги на координаты в coord_bombs
+    @SapperProfile.phase("set_flags")
+    def __set_flags(self, coord_bombs):
+        # Одна клетка может попасть в список от нескольких чисел
+        coords = [(x, y) for x, y in dict.fromkeys(coord_bombs) if not self._board.is_flagged(x, y)]
+        if not coords or self._status != SapperEngine.PLAYING:
+            return
 
-        # Вовращаем координаты, если они лежат на поле
-        for new_i in range(3):
-            if 0 <= coords_i[new_i] <= self._height - 1:
-                for new_j in range(3):
-                    coord = [coords_i[new_i]]
-                    if 0 <= coords_j[new_j] <= self._width - 1:
-                        coord.append(coords_j[new_j])
+        result = self.apply([(SapperEngine.FLAG, x, y) for x, y in coords])
+        flagged = result["rows"] * self._width + result["cols"]
+        self.__count_flags += flagged.size
+        self.__touch(flagged, True)
+        for x, y in coords:
+            self.__say(f"Решатель ставит флаг на клетку ({x + 1}, {y + 1})")
 
-                    if len(coord) == 2:
-                        coords.append(tuple(coord))
+    # Открываем все закрытые клетки около (x, y), бомбы около нее уже отмечены флагами
+    def __open_square(self, x, y):
+        is_closed = False
+        for di, dj in self._board.neighbours.shifts(x, y):
+            if self._board.is_closed(x + di, y + dj):
+                self.__say(f"Решатель открывает клетку ({x + di + 1}, {y + dj + 1})")
+                is_closed = True
+
+        # Клетки могли открыться вместе с нулями
+        if not is_closed:
+            return False
 
-        return coords
+        revealed = self.chord(x, y)["revealed"]
+        self.__touch(revealed)
+        return revealed.size != 0
 
     # Открываем клетку (x, y)
     def __open(self, x, y):
-        if self._field[x][y] == "B":
+        result = self.open(x, y)
+        if result["status"] == SapperEngine.LOST:
             return False
 
-        self._current_field[x][y] = self._field[x][y]
-        self.__strategic_field[x][y] = int(self._field[x][y])
-        self._count_move += 1
+        self.__touch(result["revealed"])
+        return True
 
-        # Если рядом нет бомб, то открываем новые клетки
-        if self._current_field[x][y] == "0":
-            self.__open_new_items(x, y)
-        else:
-            self.__minus_bomb(x, y)
 
-        return True
+# Кол-во закрытых соседей клеток поля из плиток: у еще не затронутой клетки закрыты все соседи
+class _ClosedNeighbours(dict):
+    def __init__(self, board):
+        super().__init__()
+        self._board = board
 
-    # Открываем новые клетки с 0-ем
-    def __open_new_items(self, i, j):
-        # Берем квадрат с центром в (i; j)
-        start_i = i - 1 if i != 0 else 0
-        start_j = j - 1 if j != 0 else 0
-        finish_i = i + 1 if i != self._height - 1 else i
-        finish_j = j + 1 if j != self._width - 1 else j
-
-        for cur_i in range(start_i, finish_i + 1):
-            for cur_j in range(start_j, finish_j + 1):
-                # Клетка открыта
-                if self._current_field[cur_i][cur_j] == "X":
-                    self._count_move += 1
-
-                self._current_field[cur_i][cur_j] = self._field[cur_i][cur_j]
-                coord = (cur_i, cur_j)
-
-                if self.__strategic_field[cur_i][cur_j] == -2:
-                    self.__strategic_field[cur_i][cur_j] = int(self._field[cur_i][cur_j])
-
-                if self.__strategic_field[cur_i][cur_j] == -1:
-                    self.__strategic_field[i][j] -= 1
-
-                    # Проверяем, что такой координаты не было
-                if self._current_field[cur_i][cur_j] == "0" and coord not in self._zeros:
-                    self._zeros.append(coord)
-                    self.__open_new_items(cur_i, cur_j)
+    def __missing__(self, cell):
+        return len(self._board.neighbours.flat_shifts(*divmod(cell, self._board.width))) - 1
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Sapper import SapperSolver
+from SapperOpenings import SapperOpenings
+from SapperPatterns import SapperPatterns
+
+"""
+Модуль SapperBatch запускает решатель на множестве полей без ввода и вывода в консоль.
+Каждая игра задается зерном seed, поэтому результаты воспроизводимы.
+Игры раздаются пачками по процессам (ProcessPoolExecutor).
+Кэш выводов по участкам поля (SapperPatterns) общий для игр процесса и может храниться в файле между запусками.
+"""
+
+# Файлы кэша участков, уже загруженные в общий кэш этого процесса
+_loaded_patterns = set()
+
+
+"""
+Играем игры с зернами seeds
+patterns - файл кэша участков: загружается в общий кэш процесса один раз
+openings - папка кэша статистики первого хода (SapperOpenings): первый ход - лучшая клетка из нее
+Возвращаем (кол-во игр, побед, ходов решателя, попаданий в кэш участков, промахов, новые выводы кэша)
+"""
+
+
+def play_games(height, width, bombs, seeds, patterns=None, openings=None):
+    cache = SapperPatterns.shared()
+    if patterns is not None and patterns not in _loaded_patterns:
+        _loaded_patterns.add(patterns)
+        if os.path.exists(patterns):
+            cache.load(patterns)
+
+    openings = None if openings is None else SapperOpenings(openings)
+    before = cache.stats()
+    games, wins, steps = 0, 0, 0
+
+    for seed in seeds:
+        is_win, count_steps = SapperSolver(seed, verbose=False, openings=openings).play(height, width, bombs)
+        games += 1
+        wins += is_win
+        steps += count_steps
+
+    after = cache.stats()
+    return games, wins, steps, after["hits"] - before["hits"], after["misses"] - before["misses"], cache.take_new()
+
+
+"""
+Выполняем function(*task) для каждой задачи из tasks в пуле процессов - общий для пакетных запусков
+workers - кол-во процессов (None - по числу ядер, 1 - в текущем процессе), проверяется сразу при вызове
+Возвращаем генератор результатов в порядке задач: они отдаются по мере готовности
+"""
+
+
+def map_tasks(function, tasks, workers=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"Not correct workers: {workers}. Workers should be >= 1!")
+    return _map_tasks(function, list(tasks), workers)
+
+
+def _map_tasks(function, tasks, workers):
+    if workers == 1 or not tasks:
+        for task in tasks:
+            yield function(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(function, *zip(*tasks))
+
+
+"""
+Играем по одной игре на каждое зерно из seeds на поле height x width с bombs бомбами
+workers - кол-во процессов (None - по числу ядер, 1 - в текущем процессе)
+chunk - кол-во игр, которое процесс получает за раз
+patterns - файл кэша участков: загружается перед играми, найденные выводы дописываются в него после
+openings - папка кэша статистики первого хода, как у play_games
+Возвращаем словарь со статистикой: доля побед, ходов на игру, игр в секунду, попадания в кэш участков
+"""
+
+
+def run_batch(height, width, bombs, seeds=range(1000), workers=None, chunk=100, patterns=None, openings=None):
+    if chunk < 1:
+        raise ValueError(f"Not correct chunk: {chunk}. Chunk should be >= 1!")
+
+    seeds = list(seeds)
+    start = time.perf_counter()
+    results = list(map_tasks(play_games, [(height, width, bombs, seeds[i:i + chunk], patterns, openings)
+                                          for i in range(0, len(seeds), chunk)], workers))
+
+    seconds = time.perf_counter() - start
+    games = sum(result[0] for result in results)
+    wins = sum(result[1] for result in results)
+    steps = sum(result[2] for result in results)
+    hits = sum(result[3] for result in results)
+    misses = sum(result[4] for result in results)
+
+    # Выводы, найденные процессами, собираем в кэш этого процесса и сохраняем
+    if patterns is not None:
+        cache = SapperPatterns.shared()
+        if patterns not in _loaded_patterns and os.path.exists(patterns):
+            cache.load(patterns)
+        _loaded_patterns.add(patterns)
+        for result in results:
+            cache.update(result[5])
+        cache.save(patterns)
+
+    return {
+        "height": height,
+        "width": width,
+        "bombs": bombs,
+        "games": games,
+        "wins": wins,
+        "win_rate": wins / games if games else 0.0,
+        "moves_per_game": steps / games if games else 0.0,
+        "games_per_second": games / seconds if seconds else 0.0,
+        "seconds": seconds,
+        "pattern_hits": hits,
+        "pattern_misses": misses,
+        "pattern_hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетный запуск решателя сапера без консольного вывода")
+    parser.add_argument("height", type=int)
+    parser.add_argument("width", type=int)
+    parser.add_argument("bombs", type=int)
+    parser.add_argument("--games", type=int, default=1000, help="кол-во игр")
+    parser.add_argument("--first-seed", type=int, default=0, help="зерно первой игры")
+    parser.add_argument("--workers", type=int, default=None, help="кол-во процессов")
+    parser.add_argument("--chunk", type=int, default=100, help="игр на одну задачу процесса")
+    parser.add_argument("--patterns", default=None, help="файл кэша выводов по участкам поля")
+    parser.add_argument("--openings", default=None, help="папка кэша статистики первого хода")
+    args = parser.parse_args()
+
+    print(json.dumps(run_batch(args.height, args.width, args.bombs,
+                               range(args.first_seed, args.first_seed + args.games),
+                               args.workers, args.chunk, args.patterns, args.openings), indent=2))
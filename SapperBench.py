@@ -0,0 +1,249 @@
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from Sapper import SapperEngine, SapperSolver
+from SapperBoard import SapperBoard
+from SapperProbability import SapperProbability
+
+"""
+Модуль SapperBench - воспроизводимые замеры горячих мест сапера одной командой:
+генерация поля, подсчет чисел, заливка нулей, один шаг решателя (вероятности по границе),
+полная игра решателя и сохранение с загрузкой. Каждое место замеряется на нескольких размерах поля
+и плотностях бомб, все поля строятся из зерна seed.
+Результаты выводятся таблицей и могут записываться в JSON. Если задан файл прошлых результатов (baseline),
+медиана каждого замера сравнивается с ним, и при замедлении больше порога команда завершается с кодом 1.
+Базовый быстрый прогон лежит в bench_baseline.json (--quick --save-baseline bench_baseline.json):
+python SapperBench.py --quick --baseline bench_baseline.json
+"""
+
+# Размеры полей и плотности бомб; QUICK_SIZES - для быстрого прогона
+SIZES = ((16, 30), (128, 128), (512, 512))
+QUICK_SIZES = ((16, 30), (64, 64))
+DENSITIES = (0.12, 0.2)
+# Полная игра решателя замеряется только на полях не больше стольких клеток
+GAME_CELLS = 128 * 128
+
+
+"""
+Замеры: функция (height, width, bombs, seed) -> (setup, run)
+setup() готовит состояние (не входит во время), run(state) - замеряемое действие
+"""
+
+
+def _bench_generate(height, width, bombs, seed):
+    engine = SapperEngine(height, width, bombs, seed)
+
+    def run(_):
+        engine._generate_field(height // 2, width // 2)
+
+    return lambda: None, run
+
+
+def _bench_count(height, width, bombs, seed):
+    bombs_mask = _played(height, width, bombs, seed).counts == SapperBoard.BOMB
+
+    def run(_):
+        SapperBoard.count_bombs(bombs_mask)
+
+    return lambda: None, run
+
+
+def _bench_flood_fill(height, width, bombs, seed):
+    board = _played(height, width, bombs, seed)
+    # Заливаем с нуля, ближайшего к центру поля
+    zeros = np.argwhere(board.counts == 0)
+    x, y = zeros[np.abs(zeros - (height // 2, width // 2)).sum(axis=1).argmin()].tolist()
+
+    def setup():
+        state = board.copy()
+        state.reveal(x, y)
+        return state, state.new_mask()
+
+    def run(state):
+        state[0].flood_fill(x, y, state[1])
+
+    return setup, run
+
+
+def _bench_solver_step(height, width, bombs, seed):
+    board = _opened(height, width, bombs, seed)._board
+
+    def run(_):
+        SapperProbability(board, bombs).solve()
+
+    return lambda: None, run
+
+
+def _bench_game(height, width, bombs, seed):
+    def run(_):
+        SapperSolver(seed, verbose=False).play(height, width, bombs)
+
+    return lambda: None, run
+
+
+def _bench_save_load(height, width, bombs, seed):
+    engine = _opened(height, width, bombs, seed)
+    directory = tempfile.mkdtemp(prefix="sapper_bench_")
+    atexit.register(shutil.rmtree, directory, True)
+    name = os.path.join(directory, "game")
+
+    def run(_):
+        engine.save(name)
+        engine.load(name)
+
+    return lambda: None, run
+
+
+BENCHMARKS = {
+    "generate": _bench_generate,
+    "count": _bench_count,
+    "flood_fill": _bench_flood_fill,
+    "solver_step": _bench_solver_step,
+    "game": _bench_game,
+    "save_load": _bench_save_load,
+}
+
+
+# Поле с расставленными бомбами, ни одна клетка не открыта
+def _played(height, width, bombs, seed):
+    engine = SapperEngine(height, width, bombs, seed)
+    engine._generate_field(height // 2, width // 2)
+    return engine._board
+
+
+# Игра после первого хода в центр поля
+def _opened(height, width, bombs, seed):
+    engine = SapperEngine(height, width, bombs, seed)
+    engine.open(height // 2, width // 2)
+    return engine
+
+
+"""
+Замеряем одно место name на поле height x width с плотностью бомб density
+repeat - кол-во замеров (перед ними один прогрев)
+Возвращаем словарь: параметры замера, медиана, минимум и среднее время в секундах
+"""
+
+
+def measure(name, height, width, density, repeat=5, seed=0):
+    if repeat < 1:
+        raise ValueError(f"Not correct repeat: {repeat}. Repeat should be >= 1!")
+    if name not in BENCHMARKS:
+        raise ValueError(f"Not correct benchmark: {name}. Benchmark should be one of {', '.join(BENCHMARKS)}!")
+
+    bombs = max(2, int(height * width * density))
+    setup, run = BENCHMARKS[name](height, width, bombs, seed)
+    run(setup())
+
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+
+    return {"path": name, "height": height, "width": width, "bombs": bombs, "density": density, "repeat": repeat,
+            "median": float(np.median(times)), "min": min(times), "mean": float(np.mean(times))}
+
+
+# Ключ замера в результатах и в baseline
+def key(result):
+    return f"{result['path']}/{result['height']}x{result['width']}/{result['density']}"
+
+
+"""
+Замеряем места names (None - все) на полях sizes с плотностями densities
+Возвращаем словарь "ключ замера": результат measure
+"""
+
+
+def run_suite(names=None, sizes=SIZES, densities=DENSITIES, repeat=5, seed=0):
+    results = {}
+    for name in BENCHMARKS if names is None else names:
+        for height, width in sizes:
+            if name == "game" and height * width > GAME_CELLS:
+                continue
+            for density in densities:
+                result = measure(name, height, width, density, repeat, seed)
+                results[key(result)] = result
+    return results
+
+
+"""
+Сравниваем медианы results с baseline (словари как у run_suite)
+threshold - допустимое замедление (0.25 - на 25%), min_delta - замедление меньше стольких секунд
+не считается регрессией (шум коротких замеров)
+Дописываем в results поля ratio и regressed, возвращаем список ключей с регрессией
+"""
+
+
+def compare(results, baseline, threshold=0.25, min_delta=0.0005):
+    if threshold < 0:
+        raise ValueError(f"Not correct threshold: {threshold}. Threshold should be >= 0!")
+
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        result["ratio"] = result["median"] / old["median"] if old["median"] else float("inf")
+        result["regressed"] = (result["ratio"] > 1 + threshold
+                               and result["median"] - old["median"] > min_delta)
+        if result["regressed"]:
+            regressions.append(name)
+    return regressions
+
+
+# Таблица результатов: время в миллисекундах, отношение к baseline, если оно есть
+def table(results):
+    rows = []
+    for name, result in results.items():
+        ratio = result.get("ratio")
+        rows.append([result["path"], f"{result['height']}x{result['width']}", result["bombs"],
+                     f"{result['median'] * 1e3:.3f}", f"{result['min'] * 1e3:.3f}",
+                     "" if ratio is None else f"{ratio:.2f}" + (" !" if result["regressed"] else "")])
+    return tabulate(rows, headers=["path", "size", "bombs", "median ms", "min ms", "vs baseline"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры горячих мест сапера")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None, help="замеряемые места")
+    parser.add_argument("--quick", action="store_true", help="только небольшие поля")
+    parser.add_argument("--repeat", type=int, default=5, help="кол-во замеров каждого места")
+    parser.add_argument("--seed", type=int, default=0, help="зерно полей")
+    parser.add_argument("--json", default=None, help="файл для результатов в JSON")
+    parser.add_argument("--baseline", default=None, help="файл прошлых результатов для сравнения")
+    parser.add_argument("--save-baseline", default=None, help="записать результаты как новый baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление (0.25 - 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.0005, help="замедление в секундах, меньше которого "
+                                                                        "регрессии нет")
+    args = parser.parse_args()
+
+    suite = run_suite(args.only, QUICK_SIZES if args.quick else SIZES, DENSITIES, args.repeat, args.seed)
+    failed = []
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            failed = compare(suite, json.load(file)["results"], args.threshold, args.min_delta)
+
+    print(table(suite))
+    report = {"seed": args.seed, "repeat": args.repeat, "threshold": args.threshold, "results": suite,
+              "regressions": failed}
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if failed:
+        print(f"Регрессии: {', '.join(failed)}")
+        sys.exit(1)
@@ -0,0 +1,931 @@
+import copy
+import numpy as np
+import struct
+from functools import lru_cache
+import SapperProfile
+
+"""
+Модуль SapperBoard хранит компактное состояние поля, общее для Sapper, SapperUserSolver и SapperSolver:
+counts - int8 сетка кол-ва бомб рядом с клеткой (BOMB на месте бомбы),
+bombs - битовая маска бомб, revealed и flags - битовые маски открытых клеток и флажков.
+Поле 4000x4000 занимает около 24 Мб вместо сотен Мб строковых массивов.
+SapperChunkedBoard - поле с тем же интерфейсом, которое строится по плиткам при первом обращении к ним,
+для полей, которые не помещаются в память целиком.
+
+Двоичный формат сохранения (версия 1, little-endian):
+заголовок SAVE_HEADER - b"SAPR", версия, 0, высота, ширина, кол-во бомб, кол-во ходов,
+кол-во записей журнала ходов, учтенных в файле (SapperJournal, 0 для обычных сохранений) - 32 байта,
+затем плоскости: counts (height * width байт), маски bombs, revealed, flags и zeros (по height * ((width + 7) // 8) байт)
+
+Поле из плиток SapperChunkedBoard сохраняется в версии 2: тот же заголовок (кол-во бомб в нем не больше 2^32 - 1),
+затем CHUNKED_HEADER - кол-во бомб, зерно, безопасная клетка первого хода (-1, -1, если ходов не было),
+размер плитки и кол-во записанных плиток, затем для каждой плитки с открытыми клетками, флагами или нулями -
+ее номер строки и столбца (2 x uint32) и маски revealed, flags и zeros (по tile * tile // 8 байт).
+Бомбы и числа не сохраняются: они заново строятся по зерну
+"""
+
+
+SAVE_MAGIC = b"SAPR"
+SAVE_VERSION = 1
+CHUNKED_VERSION = 2
+SAVE_HEADER = struct.Struct("<4sHHIIIQI")
+CHUNKED_HEADER = struct.Struct("<QQqqII")
+TILE_HEADER = struct.Struct("<II")
+
+
+class BitMask:
+    """
+    Битовая маска height x width, каждая строка упакована в (width + 7) // 8 байт.
+    Байты лежат в bytearray, поэтому отдельные биты проверяются без обращения к numpy,
+    а bits - numpy-представление тех же байт для векторных операций
+    """
+
+    def __init__(self, height, width, data=None):
+        self._height = height
+        self._width = width
+        self._stride = (width + 7) // 8
+        self._buf = bytearray(height * self._stride) if data is None else bytearray(data)
+        if len(self._buf) != height * self._stride:
+            raise ValueError(f"Not correct mask size: {len(self._buf)}. Size should be {height * self._stride}!")
+        self.bits = np.frombuffer(self._buf, dtype=np.uint8).reshape(height, self._stride)
+        SapperProfile.count("allocated_bytes", len(self._buf))
+
+    # Проверяем бит клетки (x, y), так же работает и (x, y) in mask
+    def __getitem__(self, coord):
+        x, y = coord
+        return self._buf[x * self._stride + (y >> 3)] >> (7 - (y & 7)) & 1 == 1
+
+    def __contains__(self, coord):
+        return self[coord]
+
+    def set(self, x, y):
+        self._buf[x * self._stride + (y >> 3)] |= 0x80 >> (y & 7)
+
+    def clear(self, x, y):
+        self._buf[x * self._stride + (y >> 3)] &= ~(0x80 >> (y & 7)) & 0xFF
+
+    # Клетки строк [top; bottom) и столбцов [first; last) в виде массива bool, first кратно 8
+    def window(self, top, bottom, first, last):
+        bits = np.unpackbits(self.bits[top:bottom, first >> 3:((last - 1) >> 3) + 1], axis=1)
+        return bits[:, :last - first].view(bool)
+
+    # Устанавливаем (value=True) или сбрасываем биты клеток, отмеченных в array,
+    # левый верхний угол array - клетка (top, first), first кратно 8
+    def update_window(self, top, first, array, value=True):
+        height, width = array.shape
+        packed = np.packbits(array, axis=1)
+        window = self.bits[top:top + height, first >> 3:(first >> 3) + packed.shape[1]]
+        if value:
+            window |= packed
+        else:
+            window &= ~packed
+
+    # Биты клеток с индексами x * width + y из массива cells в виде массива bool
+    def take(self, cells):
+        x, y = np.divmod(cells, self._width)
+        return (self.bits[x, y >> 3] >> (7 - (y & 7)) & 1).astype(bool)
+
+    # Устанавливаем (value=True) или сбрасываем биты клеток с индексами x * width + y из массива cells
+    def put(self, cells, value=True):
+        x, y = np.divmod(np.asarray(cells, dtype=np.int64), self._width)
+        index = x * self._stride + (y >> 3)
+        bit = (0x80 >> (y & 7)).astype(np.uint8)
+        flat = self.bits.reshape(-1)
+        if value:
+            np.bitwise_or.at(flat, index, bit)
+        else:
+            np.bitwise_and.at(flat, index, ~bit)
+
+    # Распакованная маска height x width
+    def to_array(self):
+        return np.unpackbits(self.bits, axis=1, count=self._width).view(bool)
+
+    # Упаковываем массив bool height x width в маску
+    @staticmethod
+    def from_array(array):
+        height, width = array.shape
+        return BitMask(height, width, np.packbits(array, axis=1).tobytes())
+
+    # Кол-во установленных битов
+    def count(self):
+        return int(np.unpackbits(self.bits).sum(dtype=np.int64))
+
+    def tobytes(self):
+        return bytes(self._buf)
+
+    def copy(self):
+        return BitMask(self._height, self._width, self._buf)
+
+    @property
+    def nbytes(self):
+        return len(self._buf)
+
+
+class NeighbourTable:
+    """
+    Таблица соседей для полей height x width, строится один раз на каждый размер (NeighbourTable.of).
+    Набор соседей клетки зависит только от того, у каких краев поля она лежит, т.е. клетки делятся на 9 классов.
+    Для каждого класса заранее построен кортеж сдвигов (di, dj) квадрата 3x3 вокруг клетки (вместе с ней),
+    поэтому перебор соседей не создает новых списков. Таблица не зависит от размера поля по памяти
+    """
+
+    # Сдвиги квадрата 3x3 в порядке перебора
+    __SHIFTS = tuple((di, dj) for di in (-1, 1, 0) for dj in (-1, 1, 0))
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.__last_row = height - 1
+        self.__last_col = width - 1
+
+        # Класс строки/столбца: 0 - первая, 1 - последняя, 2 - внутри (поле не меньше 2x2)
+        shifts = []
+        for row_class in range(3):
+            for col_class in range(3):
+                shifts.append(tuple((di, dj) for di, dj in NeighbourTable.__SHIFTS
+                                    if not (row_class == 0 and di == -1 or row_class == 1 and di == 1 or
+                                            col_class == 0 and dj == -1 or col_class == 1 and dj == 1)))
+        self.__shifts = tuple(shifts)
+        self.__flat_shifts = tuple(tuple(di * width + dj for di, dj in square) for square in shifts)
+
+    # Таблица для полей height x width, одна на каждый размер
+    @classmethod
+    @lru_cache(maxsize=64)
+    def of(cls, height, width):
+        return cls(height, width)
+
+    # Номер класса клетки (i; j)
+    def __class(self, i, j):
+        row_class = 0 if i == 0 else 1 if i == self.__last_row else 2
+        return row_class * 3 + (0 if j == 0 else 1 if j == self.__last_col else 2)
+
+    # Сдвиги (di, dj) до клеток квадрата 3x3 с центром в (i; j), лежащих на поле
+    def shifts(self, i, j):
+        return self.__shifts[self.__class(i, j)]
+
+    # То же, но сдвиги плоского индекса i * width + j
+    def flat_shifts(self, i, j):
+        return self.__flat_shifts[self.__class(i, j)]
+
+
+class SapperBoard:
+    # Значение сетки counts на месте бомбы
+    BOMB = 9
+    # Коды клеток, которые видит игрок: закрытая клетка и флаг
+    CLOSED = -2
+    FLAG = -1
+    # Строковые значения клеток по кол-ву бомб рядом для вывода, 9 - бомба
+    CELLS = np.array(["0", "1", "2", "3", "4", "5", "6", "7", "8", "B"])
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self._counts = bytearray(height * width)
+        self.counts = np.frombuffer(self._counts, dtype=np.int8).reshape(height, width)
+        self.bombs = BitMask(height, width)
+        self.revealed = BitMask(height, width)
+        self.flags = BitMask(height, width)
+        self.neighbours = NeighbourTable.of(height, width)
+        SapperProfile.count("boards_allocated")
+        SapperProfile.count("allocated_bytes", height * width)
+
+    # Расставляем бомбы по маске (массив bool) и пересчитываем числа рядом с ними
+    def set_bombs(self, bombs):
+        counts = SapperBoard.count_bombs(bombs)
+        counts[bombs] = SapperBoard.BOMB
+        self.counts[:] = counts
+        self.bombs = BitMask.from_array(bombs)
+
+    # Кол-во бомб в квадрате 3x3 около каждой клетки сразу:
+    # маска бомб дополняется нулями по краям, затем суммируются 3 сдвига по строкам и 3 сдвига по столбцам.
+    # Маска может быть пачкой полей (..., height, width)
+    @staticmethod
+    @SapperProfile.phase("count_bombs")
+    def count_bombs(bombs):
+        *batch, height, width = bombs.shape
+        padded = np.zeros((*batch, height + 2, width + 2), dtype=np.int8)
+        padded[..., 1:-1, 1:-1] = bombs
+
+        rows = padded[..., :-2, :] + padded[..., 1:-1, :]
+        rows += padded[..., 2:, :]
+        counts = rows[..., :-2] + rows[..., 1:-1]
+        counts += rows[..., 2:]
+        return counts
+
+    # Кол-во бомб рядом с клеткой (x, y), BOMB - если в клетке бомба
+    def count(self, x, y):
+        return self._counts[x * self.width + y]
+
+    # Числа клеток с индексами x * width + y из массива cells
+    def values(self, cells):
+        return self.counts.reshape(-1)[cells]
+
+    # Пустая битовая маска размером с поле
+    def new_mask(self):
+        return BitMask(self.height, self.width)
+
+    # Прямоугольник, в котором есть открытые клетки и флаги: (top, bottom, left, right) - все поле
+    def explored(self):
+        return 0, self.height, 0, self.width
+
+    # Индексы x * width + y закрытых клеток без флагов
+    def closed_cells(self):
+        return np.flatnonzero(~self.revealed.to_array().reshape(-1) & ~self.flags.to_array().reshape(-1))
+
+    def is_bomb(self, x, y):
+        return self.bombs[x, y]
+
+    def is_revealed(self, x, y):
+        return self.revealed[x, y]
+
+    def is_flagged(self, x, y):
+        return self.flags[x, y]
+
+    # Клетка закрыта и на ней нет флага
+    def is_closed(self, x, y):
+        return not self.revealed[x, y] and not self.flags[x, y]
+
+    # Открываем клетку (x, y) (флаг с нее снимается) и возвращаем ее число
+    def reveal(self, x, y):
+        self.flags.clear(x, y)
+        self.revealed.set(x, y)
+        return self._counts[x * self.width + y]
+
+    # Ставим или убираем флаг на клетке (x, y)
+    def toggle_flag(self, x, y):
+        if self.flags[x, y]:
+            self.flags.clear(x, y)
+        else:
+            self.flags.set(x, y)
+
+    """
+    Открываем область нулей, в которую входит клетка (x, y), вместе с ее границей.
+    Заливка без рекурсии: стек отрезков строк из нулей, zeros - битовая маска уже пройденных нулей.
+    Найденные отрезки открываются разом в прямоугольнике, который их содержит. Флаги с открытых клеток снимаются.
+    Возвращаем множество новых открытых клеток в виде массива индексов x * width + y
+    """
+
+    @SapperProfile.phase("flood_fill")
+    def flood_fill(self, x, y, zeros):
+        height, width = self.height, self.width
+        spans = []
+        seen = set()
+        stack = [(x, y)]
+
+        while stack:
+            r, c = stack.pop()
+            if zeros[r, c]:
+                continue
+
+            # Расширяем отрезок нулей строки r влево и вправо от клетки c
+            row = self.counts[r]
+            left = np.flatnonzero(row[:c])
+            left = int(left[-1]) + 1 if left.size else 0
+            if (r, left) in seen:
+                continue
+            right = np.flatnonzero(row[c:])
+            right = c + int(right[0]) if right.size else width
+            seen.add((r, left))
+            spans.append((r, left, right))
+
+            # В соседних строках запоминаем начала отрезков из нулей, касающихся этого
+            a = left - 1 if left != 0 else 0
+            b = right + 1 if right != width else width
+            for cur in (r - 1, r + 1):
+                if 0 <= cur < height:
+                    segment = self.counts[cur, a:b] == 0
+                    for start in np.flatnonzero(segment[1:] & ~segment[:-1]).tolist():
+                        stack.append((cur, a + start + 1))
+                    if segment[0]:
+                        stack.append((cur, a))
+
+        if len(spans) == 0:
+            return np.array([], dtype=np.int64)
+
+        # Прямоугольник с отрезками и их соседями, левый край выровнен по байту масок
+        rows, lefts, rights = np.array(spans).T
+        top = max(int(rows.min()) - 1, 0)
+        bottom = min(int(rows.max()) + 2, height)
+        first = max(int(lefts.min()) - 1, 0) & ~7
+        last = min(int(rights.max()) + 1, width)
+
+        # Закрашиваем отрезки через разностный массив
+        marks = np.zeros((bottom - top, last - first + 1), dtype=np.int8)
+        marks[rows - top, lefts - first] = 1
+        marks[rows - top, rights - first] = -1
+        region = np.cumsum(marks, axis=1, dtype=np.int8)[:, :-1].view(bool)
+        zeros.update_window(top, first, region)
+
+        # Добавляем соседние клетки по горизонтали и вертикали
+        area = region.copy()
+        area[:, 1:] |= region[:, :-1]
+        area[:, :-1] |= region[:, 1:]
+        square = area.copy()
+        square[1:] |= area[:-1]
+        square[:-1] |= area[1:]
+
+        opened = square & ~self.revealed.window(top, bottom, first, last)
+        self.revealed.update_window(top, first, opened)
+        self.flags.update_window(top, first, opened, False)
+
+        opened_x, opened_y = np.nonzero(opened)
+        return (opened_x + top) * width + opened_y + first
+
+    # Поле, которое видит игрок, в виде int8 кодов: CLOSED, FLAG или число
+    # Можно взять только прямоугольник строк [top; bottom) и столбцов [left; right)
+    def visible_codes(self, top=0, bottom=None, left=0, right=None):
+        bottom = self.height if bottom is None else bottom
+        right = self.width if right is None else right
+
+        # Маски читаем окном, левый край которого выровнен по байту
+        first = left & ~7
+        revealed = self.revealed.window(top, bottom, first, right)[:, left - first:]
+        flags = self.flags.window(top, bottom, first, right)[:, left - first:]
+        codes = np.where(revealed, self.counts[top:bottom, left:right], np.int8(SapperBoard.CLOSED))
+        codes[flags] = SapperBoard.FLAG
+        return codes
+
+    # Поле с ответами в виде строк
+    def answer(self):
+        return SapperBoard.CELLS[self.counts]
+
+    # Восстанавливаем состояние из строковых полей (текущее поле игрока и поле с ответами)
+    @staticmethod
+    def from_strings(current_field, field):
+        board = SapperBoard(*field.shape)
+        board.set_bombs(field == "B")
+        board.revealed = BitMask.from_array((current_field != "X") & (current_field != "F"))
+        board.flags = BitMask.from_array(current_field == "F")
+        return board
+
+    """
+    Записываем поле в двоичном формате в открытый файл
+    bombs, count_move и маска нулей zeros - параметры игры, sequence - кол-во учтенных записей журнала
+    """
+
+    def write(self, file, bombs, count_move, zeros, sequence=0):
+        file.write(SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, 0, self.height, self.width, bombs, count_move,
+                                    sequence))
+        file.write(self._counts)
+        for mask in (self.bombs, self.revealed, self.flags, zeros):
+            file.write(mask.bits)
+
+    """
+    Читаем поле из файла path в двоичном формате без разбора по символам: файл читается одним вызовом (np.fromfile),
+    плоскости копируются срезами. Файл не остается открытым или отображенным в память после чтения.
+    Возвращаем (board, bombs, count_move, zeros)
+    """
+
+    @staticmethod
+    def read(path):
+        return SapperBoard.from_buffer(np.fromfile(path, dtype=np.uint8))
+
+    # То же из буфера с содержимым файла (bytes, np.ndarray)
+    @staticmethod
+    def from_buffer(data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        height, width, bombs, count_move, _ = SapperBoard.read_header(data)
+        if data[4:6].view("<u2")[0] == CHUNKED_VERSION:
+            return SapperChunkedBoard.from_buffer(data)
+
+        cells = height * width
+        plane = height * ((width + 7) // 8)
+        if data.size != SAVE_HEADER.size + cells + 4 * plane:
+            raise ValueError(f"Not correct save size: {data.size}. "
+                             f"Size should be {SAVE_HEADER.size + cells + 4 * plane}!")
+
+        board = SapperBoard(height, width)
+        start = SAVE_HEADER.size
+        board.counts[:] = data[start:start + cells].view(np.int8).reshape(height, width)
+        start += cells
+
+        masks = []
+        for _ in range(4):
+            masks.append(BitMask(height, width, data[start:start + plane]))
+            start += plane
+        board.bombs, board.revealed, board.flags, zeros = masks
+
+        return board, bombs, count_move, zeros
+
+    # Читаем заголовок сохранения из буфера: (height, width, bombs, count_move, sequence)
+    @staticmethod
+    def read_header(data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        if data.size < SAVE_HEADER.size:
+            raise ValueError(f"Not correct save size: {data.size}. Size should be >= {SAVE_HEADER.size}!")
+
+        magic, version, _, height, width, bombs, count_move, sequence = \
+            SAVE_HEADER.unpack(data[:SAVE_HEADER.size].tobytes())
+        if magic != SAVE_MAGIC:
+            raise ValueError(f"Not correct save magic: {magic}. Magic should be {SAVE_MAGIC}!")
+        if version != SAVE_VERSION and version != CHUNKED_VERSION:
+            raise ValueError(f"Not correct save version: {version}. "
+                             f"Version should be {SAVE_VERSION} or {CHUNKED_VERSION}!")
+
+        return height, width, bombs, count_move, sequence
+
+    # Копия поля: сетка и бомбы после генерации не меняются и остаются общими, маски копируются
+    def copy(self):
+        board = copy.copy(self)
+        board.revealed = self.revealed.copy()
+        board.flags = self.flags.copy()
+        return board
+
+    # Объем памяти состояния в байтах
+    @property
+    def nbytes(self):
+        return len(self._counts) + self.bombs.nbytes + self.revealed.nbytes + self.flags.nbytes
+
+
+class TiledMask:
+    """
+    Разреженная битовая маска height x width из квадратных плиток tile x tile (tile кратно 8).
+    Плитка - BitMask, создается при первой установке бита в ней, отсутствующая плитка - все биты сброшены,
+    поэтому память зависит от кол-ва затронутых плиток, а не от размера поля
+    """
+
+    def __init__(self, height, width, tile):
+        self._height = height
+        self._width = width
+        self._tile = tile
+        # (номер строки плитки, номер столбца плитки) -> BitMask(tile, tile)
+        self.tiles = {}
+
+    def __getitem__(self, coord):
+        x, y = coord
+        mask = self.tiles.get((x // self._tile, y // self._tile))
+        return mask is not None and mask[x % self._tile, y % self._tile]
+
+    def __contains__(self, coord):
+        return self[coord]
+
+    def set(self, x, y):
+        self.__tile(x // self._tile, y // self._tile).set(x % self._tile, y % self._tile)
+
+    def clear(self, x, y):
+        mask = self.tiles.get((x // self._tile, y // self._tile))
+        if mask is not None:
+            mask.clear(x % self._tile, y % self._tile)
+
+    # Клетки строк [top; bottom) и столбцов [first; last) в виде массива bool
+    def window(self, top, bottom, first, last):
+        result = np.zeros((bottom - top, last - first), dtype=bool)
+        for (ti, tj), (rows, cols, inner) in self.__overlaps(top, bottom, first, last):
+            result[rows, cols] = self.tiles[ti, tj].to_array()[inner]
+        return result
+
+    # Устанавливаем (value=True) или сбрасываем биты клеток, отмеченных в array, левый верхний угол - (top, first)
+    def update_window(self, top, first, array, value=True):
+        x, y = np.nonzero(array)
+        self.put((x + top) * self._width + y + first, value)
+
+    # Биты клеток с индексами x * width + y из массива cells в виде массива bool
+    def take(self, cells):
+        cells = np.asarray(cells, dtype=np.int64)
+        result = np.zeros(cells.size, dtype=bool)
+        for key, chosen, local in self.__group(cells):
+            mask = self.tiles.get(key)
+            if mask is not None:
+                result[chosen] = mask.take(local)
+        return result
+
+    # Устанавливаем (value=True) или сбрасываем биты клеток с индексами x * width + y из массива cells
+    def put(self, cells, value=True):
+        for key, _, local in self.__group(np.asarray(cells, dtype=np.int64)):
+            mask = self.__tile(*key) if value else self.tiles.get(key)
+            if mask is not None:
+                mask.put(local, value)
+
+    # Индексы x * width + y установленных битов
+    def cells(self):
+        parts = [np.zeros(0, dtype=np.int64)]
+        for (ti, tj), mask in self.tiles.items():
+            x, y = np.nonzero(mask.to_array())
+            parts.append((x + ti * self._tile) * self._width + y + tj * self._tile)
+        return np.concatenate(parts)
+
+    # Распакованная маска height x width (только для полей, которые помещаются в память)
+    def to_array(self):
+        return self.window(0, self._height, 0, self._width)
+
+    def count(self):
+        return sum(mask.count() for mask in self.tiles.values())
+
+    def copy(self):
+        mask = TiledMask(self._height, self._width, self._tile)
+        mask.tiles = {key: tile.copy() for key, tile in self.tiles.items()}
+        return mask
+
+    @property
+    def nbytes(self):
+        return sum(mask.nbytes for mask in self.tiles.values())
+
+    def __tile(self, ti, tj):
+        mask = self.tiles.get((ti, tj))
+        if mask is None:
+            mask = self.tiles[ti, tj] = BitMask(self._tile, self._tile)
+        return mask
+
+    # Делим клетки cells по плиткам: (плитка, номера клеток в cells, индексы клеток внутри плитки)
+    def __group(self, cells):
+        tile = self._tile
+        x, y = np.divmod(cells, self._width)
+        keys = (x // tile) * ((self._width + tile - 1) // tile) + y // tile
+        local = (x % tile) * tile + y % tile
+        if keys.size and (keys == keys[0]).all():
+            yield (int(x[0]) // tile, int(y[0]) // tile), slice(None), local
+            return
+
+        for key in np.unique(keys).tolist():
+            chosen = np.flatnonzero(keys == key)
+            yield (int(x[chosen[0]]) // tile, int(y[chosen[0]]) // tile), chosen, local[chosen]
+
+    # Плитки маски, пересекающие прямоугольник: плитка -> (срезы прямоугольника, срезы плитки)
+    def __overlaps(self, top, bottom, first, last):
+        tile = self._tile
+        # Перебираем плитки прямоугольника или плитки маски - что меньше
+        tile_rows = range(top // tile, (bottom + tile - 1) // tile)
+        tile_cols = range(first // tile, (last + tile - 1) // tile)
+        if len(tile_rows) * len(tile_cols) <= len(self.tiles):
+            keys = [(ti, tj) for ti in tile_rows for tj in tile_cols if (ti, tj) in self.tiles]
+        else:
+            keys = list(self.tiles)
+
+        for (ti, tj) in keys:
+            rows = slice(max(ti * tile, top), min((ti + 1) * tile, bottom))
+            cols = slice(max(tj * tile, first), min((tj + 1) * tile, last))
+            if rows.start < rows.stop and cols.start < cols.stop:
+                yield (ti, tj), (slice(rows.start - top, rows.stop - top), slice(cols.start - first, cols.stop - first),
+                                 (slice(rows.start - ti * tile, rows.stop - ti * tile),
+                                  slice(cols.start - tj * tile, cols.stop - tj * tile)))
+
+
+class SapperChunkedBoard:
+    """
+    Поле height x width, которое делится на плитки tile x tile и строится по частям при первом обращении к ним,
+    поэтому память и время запуска зависят от открытой части поля, а не от его размера (поле 10^6 x 10^6 создается сразу).
+    Кол-во бомб в плитке определяется делением бомб пополам по дереву диапазонов плиток
+    (гипергеометрическое распределение, зерно - (seed, вершина дерева)), а их места - зерном (seed, плитка),
+    поэтому плитка не зависит от порядка обращений, а всего на поле ровно bombs бомб.
+    Числа плитки считаются по ее бомбам и краям соседних плиток. Открытые клетки, флаги и нули хранятся
+    разреженно (TiledMask). Интерфейс тот же, что у SapperBoard
+    """
+
+    BOMB = SapperBoard.BOMB
+    CLOSED = SapperBoard.CLOSED
+    FLAG = SapperBoard.FLAG
+    # Размер плитки по умолчанию
+    TILE = 64
+    # Больше клеток numpy не делит гипергеометрически, дальше - биномиальное приближение
+    __HYPERGEOMETRIC_CELLS = 10 ** 9 - 1
+
+    """
+    height, width, bombs - размер поля и кол-во бомб
+    tile - сторона плитки, кратная 8
+    seed - зерно поля и safe - безопасная клетка (x, y) первого хода, задаются generate
+    """
+
+    def __init__(self, height, width, bombs, tile=TILE, seed=None, safe=None):
+        if tile < 8 or tile % 8 != 0:
+            raise ValueError(f"Not correct tile: {tile}. Tile should be >= 8 and divisible by 8!")
+
+        self.height = height
+        self.width = width
+        self.bombs_count = bombs
+        self.tile = tile
+        self.seed = seed
+        self.safe = safe
+        self._tiles_height = (height + tile - 1) // tile
+        self._tiles_width = (width + tile - 1) // tile
+        self.revealed = TiledMask(height, width, tile)
+        self.flags = TiledMask(height, width, tile)
+        self.neighbours = NeighbourTable.of(height, width)
+        # Построенные плитки: бомбы (bool) и числа (int8), кол-ва бомб в вершинах дерева деления
+        self._bomb_tiles = {}
+        self._count_tiles = {}
+        self._splits = {}
+        SapperProfile.count("boards_allocated")
+
+    # Задаем зерно поля и безопасную клетку первого хода (x, y); построенные плитки сбрасываются
+    def generate(self, seed, x, y):
+        self.seed = seed
+        self.safe = (x, y)
+        self._bomb_tiles = {}
+        self._count_tiles = {}
+        self._splits = {}
+
+    def count(self, x, y):
+        return int(self.__counts(x // self.tile, y // self.tile)[x % self.tile, y % self.tile])
+
+    def values(self, cells):
+        x, y = np.divmod(np.asarray(cells, dtype=np.int64), self.width)
+        return np.array([self.__counts(i // self.tile, j // self.tile)[i % self.tile, j % self.tile]
+                         for i, j in zip(x.tolist(), y.tolist())], dtype=np.int8)
+
+    def new_mask(self):
+        return TiledMask(self.height, self.width, self.tile)
+
+    # Прямоугольник плиток, в которых есть открытые клетки и флаги; (0, 0, 0, 0) - если их нет
+    def explored(self):
+        keys = list(self.revealed.tiles) + list(self.flags.tiles)
+        if len(keys) == 0:
+            return 0, 0, 0, 0
+
+        rows = [ti for ti, _ in keys]
+        cols = [tj for _, tj in keys]
+        return (min(rows) * self.tile, min((max(rows) + 1) * self.tile, self.height),
+                min(cols) * self.tile, min((max(cols) + 1) * self.tile, self.width))
+
+    """
+    Индексы x * width + y закрытых клеток без флагов только в плитках, где есть открытые клетки и флаги:
+    все закрытые клетки огромного поля не помещаются в память
+    """
+
+    def closed_cells(self):
+        tile = self.tile
+        parts = [np.zeros(0, dtype=np.int64)]
+        for ti, tj in sorted(set(self.revealed.tiles) | set(self.flags.tiles)):
+            top, left = ti * tile, tj * tile
+            bottom, right = min(top + tile, self.height), min(left + tile, self.width)
+            closed = ~self.revealed.window(top, bottom, left, right) & ~self.flags.window(top, bottom, left, right)
+            x, y = np.nonzero(closed)
+            parts.append((x + top) * self.width + y + left)
+        return np.concatenate(parts)
+
+    def is_bomb(self, x, y):
+        return bool(self.__bombs(x // self.tile, y // self.tile)[x % self.tile, y % self.tile])
+
+    def is_revealed(self, x, y):
+        return self.revealed[x, y]
+
+    def is_flagged(self, x, y):
+        return self.flags[x, y]
+
+    def is_closed(self, x, y):
+        return not self.revealed[x, y] and not self.flags[x, y]
+
+    def reveal(self, x, y):
+        self.flags.clear(x, y)
+        self.revealed.set(x, y)
+        return self.count(x, y)
+
+    def toggle_flag(self, x, y):
+        if self.flags[x, y]:
+            self.flags.clear(x, y)
+        else:
+            self.flags.set(x, y)
+
+    """
+    Открываем область нулей, в которую входит клетка (x, y), вместе с ее границей - по плиткам:
+    в плитке область растет от начальных нулей по нулям плитки, ее граница открывается,
+    а нули границы в соседних плитках становятся начальными для них.
+    zeros - маска уже пройденных нулей (TiledMask). Возвращаем массив индексов x * width + y новых открытых клеток
+    """
+
+    @SapperProfile.phase("flood_fill")
+    def flood_fill(self, x, y, zeros):
+        tile = self.tile
+        opened = []
+        # Плитки с начальными нулями: (ti, tj) -> список клеток внутри плитки
+        pending = {(x // tile, y // tile): [(x % tile, y % tile)]}
+
+        while pending:
+            (ti, tj), seeds = pending.popitem()
+            counts = self.__counts(ti, tj)
+            rows, cols = counts.shape
+            top, left = ti * tile, tj * tile
+
+            allowed = (counts == 0) & ~zeros.window(top, top + rows, left, left + cols)
+            region = np.zeros((rows, cols), dtype=bool)
+            region[tuple(np.array(seeds).T)] = True
+            region &= allowed
+            if not region.any():
+                continue
+
+            while True:
+                grown = SapperChunkedBoard.__dilate(region) & allowed
+                if (grown == region).all():
+                    break
+                region = grown
+            zeros.update_window(top, left, region)
+
+            # Граница области вместе с клетками соседних плиток
+            padded = np.zeros((rows + 2, cols + 2), dtype=bool)
+            padded[1:-1, 1:-1] = region
+            border = SapperChunkedBoard.__dilate(padded)
+            border_x, border_y = np.nonzero(border)
+            border_x += top - 1
+            border_y += left - 1
+            inside = (border_x >= 0) & (border_x < self.height) & (border_y >= 0) & (border_y < self.width)
+            cells = border_x[inside] * self.width + border_y[inside]
+
+            cells = cells[~self.revealed.take(cells)]
+            self.revealed.put(cells)
+            self.flags.put(cells, False)
+            opened.append(cells)
+
+            # Нули в соседних плитках продолжают заливку там
+            for cell in cells.tolist():
+                i, j = divmod(cell, self.width)
+                if not (top <= i < top + rows and left <= j < left + cols) and self.count(i, j) == 0:
+                    pending.setdefault((i // tile, j // tile), []).append((i % tile, j % tile))
+
+        if len(opened) == 0:
+            return np.array([], dtype=np.int64)
+        return np.concatenate(opened)
+
+    def visible_codes(self, top=0, bottom=None, left=0, right=None):
+        bottom = self.height if bottom is None else bottom
+        right = self.width if right is None else right
+
+        codes = np.full((bottom - top, right - left), SapperBoard.CLOSED, dtype=np.int8)
+        revealed = self.revealed.window(top, bottom, left, right)
+        for i, j in self.__tiles_of(revealed, top, left):
+            rows = slice(max(i * self.tile, top), min((i + 1) * self.tile, bottom))
+            cols = slice(max(j * self.tile, left), min((j + 1) * self.tile, right))
+            counts = self.__counts(i, j)[rows.start - i * self.tile:rows.stop - i * self.tile,
+                                         cols.start - j * self.tile:cols.stop - j * self.tile]
+            part = codes[rows.start - top:rows.stop - top, cols.start - left:cols.stop - left]
+            shown = revealed[rows.start - top:rows.stop - top, cols.start - left:cols.stop - left]
+            part[shown] = counts[shown]
+
+        codes[self.flags.window(top, bottom, left, right)] = SapperBoard.FLAG
+        return codes
+
+    # Ответы в видимой части поля (explored) в виде строк
+    def answer(self):
+        top, bottom, left, right = self.explored()
+        tile = self.tile
+        counts = np.zeros((bottom - top, right - left), dtype=np.int8)
+        for i in range(top // tile, (bottom + tile - 1) // tile):
+            for j in range(left // tile, (right + tile - 1) // tile):
+                part = self.__counts(i, j)
+                counts[i * tile - top:i * tile - top + part.shape[0], j * tile - left:j * tile - left + part.shape[1]] \
+                    = part
+        return SapperBoard.CELLS[counts]
+
+    # Записываем поле в двоичном формате версии 2: параметры генерации и затронутые плитки масок
+    def write(self, file, bombs, count_move, zeros, sequence=0):
+        file.write(SAVE_HEADER.pack(SAVE_MAGIC, CHUNKED_VERSION, 0, self.height, self.width,
+                                    min(bombs, 0xFFFFFFFF), count_move, sequence))
+        keys = sorted(set(self.revealed.tiles) | set(self.flags.tiles) | set(zeros.tiles))
+        safe = (-1, -1) if self.safe is None else self.safe
+        file.write(CHUNKED_HEADER.pack(bombs, self.seed or 0, safe[0], safe[1], self.tile, len(keys)))
+
+        empty = bytes(self.tile * self.tile // 8)
+        for key in keys:
+            file.write(TILE_HEADER.pack(*key))
+            for mask in (self.revealed, self.flags, zeros):
+                tile = mask.tiles.get(key)
+                file.write(empty if tile is None else tile.bits)
+
+    # Читаем поле версии 2 из буфера, возвращаем (board, bombs, count_move, zeros)
+    @staticmethod
+    def from_buffer(data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        height, width, _, count_move, _ = SapperBoard.read_header(data)
+        start = SAVE_HEADER.size
+        bombs, seed, safe_x, safe_y, tile, count = \
+            CHUNKED_HEADER.unpack(data[start:start + CHUNKED_HEADER.size].tobytes())
+        start += CHUNKED_HEADER.size
+
+        plane = tile * tile // 8
+        size = start + count * (TILE_HEADER.size + 3 * plane)
+        if data.size != size:
+            raise ValueError(f"Not correct save size: {data.size}. Size should be {size}!")
+
+        safe = None if safe_x < 0 else (safe_x, safe_y)
+        board = SapperChunkedBoard(height, width, bombs, tile, seed if safe is not None else None, safe)
+        zeros = board.new_mask()
+        for _ in range(count):
+            key = TILE_HEADER.unpack(data[start:start + TILE_HEADER.size].tobytes())
+            start += TILE_HEADER.size
+            for mask in (board.revealed, board.flags, zeros):
+                bits = data[start:start + plane]
+                if bits.any():
+                    mask.tiles[key] = BitMask(tile, tile, bits)
+                start += plane
+
+        return board, bombs, count_move, zeros
+
+    # Копия поля: построенные плитки зависят только от зерна и остаются общими, маски копируются
+    def copy(self):
+        board = copy.copy(self)
+        board.revealed = self.revealed.copy()
+        board.flags = self.flags.copy()
+        return board
+
+    @property
+    def nbytes(self):
+        tiles = sum(part.nbytes for part in self._bomb_tiles.values()) + \
+            sum(part.nbytes for part in self._count_tiles.values())
+        return tiles + self.revealed.nbytes + self.flags.nbytes
+
+    # Плитки, в которых есть отмеченные клетки массива mask с левым верхним углом (top, left)
+    def __tiles_of(self, mask, top, left):
+        x, y = np.nonzero(mask)
+        keys = np.unique(((x + top) // self.tile) * self._tiles_width + (y + left) // self.tile)
+        return [divmod(int(key), self._tiles_width) for key in keys]
+
+    # Числа плитки (ti, tj): бомбы плитки вместе с краями соседних плиток, BOMB на месте бомбы
+    def __counts(self, ti, tj):
+        counts = self._count_tiles.get((ti, tj))
+        if counts is not None:
+            return counts
+
+        bombs = self.__bombs(ti, tj)
+        rows, cols = bombs.shape
+        padded = np.zeros((rows + 2, cols + 2), dtype=bool)
+        padded[1:-1, 1:-1] = bombs
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                if (di, dj) == (0, 0) or not (0 <= ti + di < self._tiles_height and 0 <= tj + dj < self._tiles_width):
+                    continue
+                near = self.__bombs(ti + di, tj + dj)
+                source_rows = slice(-1, None) if di < 0 else slice(0, 1) if di > 0 else slice(None)
+                source_cols = slice(-1, None) if dj < 0 else slice(0, 1) if dj > 0 else slice(None)
+                target_rows = slice(0, 1) if di < 0 else slice(-1, None) if di > 0 else slice(1, -1)
+                target_cols = slice(0, 1) if dj < 0 else slice(-1, None) if dj > 0 else slice(1, -1)
+                padded[target_rows, target_cols] = near[source_rows, source_cols]
+
+        counts = SapperBoard.count_bombs(padded)[1:-1, 1:-1]
+        counts[bombs] = SapperBoard.BOMB
+        self._count_tiles[ti, tj] = counts
+        return counts
+
+    # Бомбы плитки (ti, tj): ее кол-во бомб расставляется без повторений, безопасная клетка пропускается
+    def __bombs(self, ti, tj):
+        bombs = self._bomb_tiles.get((ti, tj))
+        if bombs is not None:
+            return bombs
+        if self.seed is None:
+            raise ValueError("Not correct board: bombs are not generated. Call generate first!")
+
+        rows = min(self.tile, self.height - ti * self.tile)
+        cols = min(self.tile, self.width - tj * self.tile)
+        safe = -1
+        if self.safe is not None and (self.safe[0] // self.tile, self.safe[1] // self.tile) == (ti, tj):
+            safe = (self.safe[0] - ti * self.tile) * cols + self.safe[1] - tj * self.tile
+
+        rng = np.random.default_rng([self.seed, 1, ti, tj])
+        positions = rng.choice(rows * cols - (safe >= 0), self.__tile_bombs(ti * self._tiles_width + tj),
+                               replace=False)
+        if safe >= 0:
+            positions[positions >= safe] += 1
+
+        bombs = np.zeros(rows * cols, dtype=bool)
+        bombs[positions] = True
+        bombs = self._bomb_tiles[ti, tj] = bombs.reshape(rows, cols)
+        SapperProfile.count("tiles_generated")
+        return bombs
+
+    # Кол-во бомб в плитке с номером index: спускаемся по дереву деления диапазона плиток [0; кол-во плиток)
+    def __tile_bombs(self, index):
+        low, high = 0, self._tiles_height * self._tiles_width
+        bombs = self.bombs_count
+        node = 1
+        while high - low > 1:
+            middle = (low + high) // 2
+            left = self._splits.get(node)
+            if left is None:
+                left = self._splits[node] = self.__split(node, bombs, self.__cells(low, middle),
+                                                         self.__cells(middle, high))
+            if index < middle:
+                high, bombs, node = middle, left, 2 * node
+            else:
+                low, bombs, node = middle, bombs - left, 2 * node + 1
+        return bombs
+
+    # Сколько из bombs бомб попадает в left клеток из left + right (гипергеометрическое распределение)
+    def __split(self, node, bombs, left, right):
+        rng = np.random.default_rng([self.seed, 0, node])
+        if left <= SapperChunkedBoard.__HYPERGEOMETRIC_CELLS and right <= SapperChunkedBoard.__HYPERGEOMETRIC_CELLS:
+            return int(rng.hypergeometric(left, right, bombs))
+
+        # Для огромных диапазонов - биномиальное приближение, ограниченное вместимостью половин
+        return min(max(int(rng.binomial(bombs, left / (left + right))), bombs - right), left)
+
+    # Кол-во клеток, в которых могут быть бомбы, в плитках с номерами [first; last)
+    def __cells(self, first, last):
+        cells = self.__cells_before(last) - self.__cells_before(first)
+        if self.safe is not None:
+            safe = (self.safe[0] // self.tile) * self._tiles_width + self.safe[1] // self.tile
+            cells -= first <= safe < last
+        return cells
+
+    # Кол-во клеток в плитках с номерами меньше index
+    def __cells_before(self, index):
+        row, col = divmod(index, self._tiles_width)
+        rows = max(min(self.tile, self.height - row * self.tile), 0)
+        return min(row * self.tile, self.height) * self.width + rows * min(col * self.tile, self.width)
+
+    # Клетки массива a и их соседи (квадрат 3x3)
+    @staticmethod
+    def __dilate(a):
+        rows = a.copy()
+        rows[1:] |= a[:-1]
+        rows[:-1] |= a[1:]
+        result = rows.copy()
+        result[:, 1:] |= rows[:, :-1]
+        result[:, :-1] |= rows[:, 1:]
+        return result
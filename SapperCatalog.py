@@ -0,0 +1,234 @@
+import argparse
+import os
+import sqlite3
+import time
+import zlib
+
+from tabulate import tabulate
+
+import SapperProfile
+from Sapper import SapperEngine
+from SapperBoard import SapperBoard
+
+"""
+Модуль SapperCatalog хранит много сохраненных игр в одном файле SQLite.
+Таблица games - индекс метаданных (размер поля, бомбы, открытые клетки, флаги, статус, время сохранения,
+размер сохранения), таблица payloads - сжатые zlib сохранения в двоичном формате (.sap).
+Список и фильтры читают только games, сохранение распаковывается лишь при загрузке игры.
+Отдельные файлы .sap (и старые .txt) импортируются в каталог и экспортируются из него пачкой.
+"""
+
+
+class SapperCatalog:
+    # Поля метаданных игры в порядке столбцов таблицы games
+    FIELDS = ("name", "height", "width", "bombs", "opened", "flags", "status", "saved", "size", "stored")
+    # Столбцы, по которым можно сортировать список
+    ORDERS = ("name", "saved", "opened", "size")
+
+    __SCHEMA = """
+        CREATE TABLE IF NOT EXISTS games (
+            name TEXT PRIMARY KEY, height INTEGER NOT NULL, width INTEGER NOT NULL, bombs INTEGER NOT NULL,
+            opened INTEGER NOT NULL, flags INTEGER NOT NULL, status TEXT NOT NULL, saved REAL NOT NULL,
+            size INTEGER NOT NULL, stored INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS payloads (name TEXT PRIMARY KEY, data BLOB NOT NULL);
+        CREATE INDEX IF NOT EXISTS games_shape ON games (height, width, bombs);
+        CREATE INDEX IF NOT EXISTS games_saved ON games (saved);
+    """
+
+    """
+    path - файл каталога (создается, если его нет)
+    level - степень сжатия zlib (1 - быстрее, 9 - меньше)
+    """
+
+    def __init__(self, path="saves.db", level=6):
+        if not 0 <= level <= 9:
+            raise ValueError(f"Not correct level: {level}. Level should be >= 0 and <= 9!")
+
+        self._level = level
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(SapperCatalog.__SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def __contains__(self, name):
+        return self._connection.execute("SELECT 1 FROM games WHERE name = ?", (name,)).fetchone() is not None
+
+    # Сохраняем игру engine (SapperEngine) под именем name, старая игра с этим именем заменяется
+    @SapperProfile.phase("save")
+    def save(self, engine, name):
+        return self.put(name, engine.dump())
+
+    """
+    Записываем сохранение data (bytes в двоичном формате .sap) под именем name
+    saved - время сохранения (по умолчанию - текущее). Возвращаем метаданные игры
+    """
+
+    def put(self, name, data, saved=None):
+        with self._connection:
+            return self.__put(name, data, saved)
+
+    # Загружаем игру name в engine (по умолчанию - новый SapperEngine), возвращаем engine
+    @SapperProfile.phase("load")
+    def load(self, name, engine=None):
+        engine = SapperEngine() if engine is None else engine
+        engine.restore(self.payload(name))
+        return engine
+
+    # Сохранение name в двоичном формате .sap (bytes)
+    def payload(self, name):
+        row = self._connection.execute("SELECT data FROM payloads WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"Not correct name: {name}. Name should be saved in the catalog!")
+        return zlib.decompress(row[0])
+
+    # Метаданные игры name (словарь по FIELDS)
+    def info(self, name):
+        row = self._connection.execute(f"SELECT {', '.join(SapperCatalog.FIELDS)} FROM games WHERE name = ?",
+                                       (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"Not correct name: {name}. Name should be saved in the catalog!")
+        return dict(zip(SapperCatalog.FIELDS, row))
+
+    """
+    Список метаданных игр без чтения сохранений
+    height, width, bombs, status - фильтры по равенству (None - без фильтра), prefix - начало имени,
+    since - сохраненные не раньше этого времени, order - столбец сортировки из ORDERS (по убыванию, если
+    descending), limit и offset - страница списка
+    """
+
+    def list(self, height=None, width=None, bombs=None, status=None, prefix=None, since=None, order="saved",
+             descending=True, limit=None, offset=0):
+        if order not in SapperCatalog.ORDERS:
+            raise ValueError(f"Not correct order: {order}. Order should be one of {SapperCatalog.ORDERS}!")
+
+        where, params = SapperCatalog.__where(height, width, bombs, status, prefix, since)
+        query = f"SELECT {', '.join(SapperCatalog.FIELDS)} FROM games{where} " \
+                f"ORDER BY {order} {'DESC' if descending else 'ASC'} LIMIT ? OFFSET ?"
+        rows = self._connection.execute(query, params + [-1 if limit is None else limit, offset])
+        return [dict(zip(SapperCatalog.FIELDS, row)) for row in rows]
+
+    # Кол-во игр с такими же фильтрами, как у list
+    def count(self, height=None, width=None, bombs=None, status=None, prefix=None, since=None):
+        where, params = SapperCatalog.__where(height, width, bombs, status, prefix, since)
+        return self._connection.execute(f"SELECT COUNT(*) FROM games{where}", params).fetchone()[0]
+
+    # Удаляем игры с именами names, возвращаем кол-во удаленных
+    def delete(self, names):
+        names = [(name,) for name in names]
+        with self._connection:
+            self._connection.executemany("DELETE FROM payloads WHERE name = ?", names)
+            return self._connection.executemany("DELETE FROM games WHERE name = ?", names).rowcount
+
+    """
+    Импортируем файлы paths (НАЗВАНИЕ.sap или старые НАЗВАНИЕ.txt) одной транзакцией, имя игры - НАЗВАНИЕ
+    Время сохранения - время изменения файла. Возвращаем кол-во импортированных игр
+    """
+
+    def import_files(self, paths):
+        count = 0
+        with self._connection:
+            for path in paths:
+                name, extension = os.path.splitext(os.path.basename(path))
+                if extension == ".sap":
+                    with open(path, "rb") as file:
+                        data = file.read()
+                else:
+                    engine = SapperEngine()
+                    engine.load_file(path)
+                    data = engine.dump()
+                self.__put(name, data, os.path.getmtime(path))
+                count += 1
+        return count
+
+    """
+    Экспортируем игры names (None - все, подходящие под фильтры filters как у list) в папку folder
+    файлами НАЗВАНИЕ.sap. Возвращаем кол-во экспортированных игр
+    """
+
+    def export(self, folder, names=None, **filters):
+        os.makedirs(folder, exist_ok=True)
+        if names is None:
+            names = [game["name"] for game in self.list(**filters)]
+
+        for name in names:
+            with open(os.path.join(folder, name + ".sap"), "wb") as file:
+                file.write(self.payload(name))
+        return len(names)
+
+    def __put(self, name, data, saved):
+        board, bombs, count_move, _ = SapperBoard.from_buffer(data)
+        status = SapperEngine.WON if count_move == board.height * board.width - bombs else SapperEngine.PLAYING
+        packed = zlib.compress(data, self._level)
+        game = (name, board.height, board.width, bombs, count_move, board.flags.count(), status,
+                time.time() if saved is None else saved, len(data), len(packed))
+
+        self._connection.execute(f"INSERT OR REPLACE INTO games VALUES ({', '.join('?' * len(game))})", game)
+        self._connection.execute("INSERT OR REPLACE INTO payloads VALUES (?, ?)", (name, packed))
+        return dict(zip(SapperCatalog.FIELDS, game))
+
+    # Условие WHERE и его параметры по фильтрам list
+    @staticmethod
+    def __where(height, width, bombs, status, prefix, since):
+        conditions = []
+        params = []
+        for column, value in (("height", height), ("width", width), ("bombs", bombs), ("status", status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if prefix is not None:
+            conditions.append("substr(name, 1, ?) = ?")
+            params += [len(prefix), prefix]
+        if since is not None:
+            conditions.append("saved >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Каталог сохраненных игр сапера")
+    parser.add_argument("catalog", help="файл каталога")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    listing = commands.add_parser("list", help="список игр")
+    for option in ("height", "width", "bombs", "limit"):
+        listing.add_argument(f"--{option}", type=int, default=None)
+    listing.add_argument("--status", choices=(SapperEngine.PLAYING, SapperEngine.WON), default=None)
+    listing.add_argument("--prefix", default=None, help="начало имени")
+    listing.add_argument("--order", choices=SapperCatalog.ORDERS, default="saved")
+
+    importing = commands.add_parser("import", help="импорт файлов .sap и .txt")
+    importing.add_argument("paths", nargs="+")
+
+    exporting = commands.add_parser("export", help="экспорт игр в файлы .sap")
+    exporting.add_argument("folder")
+    exporting.add_argument("names", nargs="*", help="имена игр (по умолчанию все)")
+
+    deleting = commands.add_parser("delete", help="удаление игр")
+    deleting.add_argument("names", nargs="+")
+    args = parser.parse_args()
+
+    with SapperCatalog(args.catalog) as catalog:
+        if args.command == "list":
+            games = catalog.list(args.height, args.width, args.bombs, args.status, args.prefix,
+                                 order=args.order, limit=args.limit)
+            print(tabulate([[game["name"], f"{game['height']}x{game['width']}", game["bombs"], game["opened"],
+                             game["flags"], game["status"],
+                             time.strftime("%Y-%m-%d %H:%M", time.localtime(game["saved"])), game["stored"]]
+                            for game in games],
+                           headers=["name", "size", "bombs", "opened", "flags", "status", "saved", "bytes"]))
+        elif args.command == "import":
+            print(f"Импортировано: {catalog.import_files(args.paths)}")
+        elif args.command == "export":
+            print(f"Экспортировано: {catalog.export(args.folder, args.names or None)}")
+        else:
+            print(f"Удалено: {catalog.delete(args.names)}")
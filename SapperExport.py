@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from Sapper import Sapper, SapperSolver
+from SapperBatch import map_tasks
+from SapperBoard import SapperBoard
+from SapperStrategy import ProbabilityStrategy
+
+"""
+Модуль SapperExport выгружает позиции решателя для обучения моделей: решатель играет игры по зернам без вывода,
+и перед каждым ходом после первого (первый делается до генерации поля) записываются
+три выровненные плоскости height x width: видимое поле (коды SapperBoard.visible_codes), настоящие бомбы
+и вероятность бомбы по решателю, а также чем выбран ход (SapperSolver.SOURCES: простые выводы, кэш участков
+или стратегия по вероятностям). В плоскости вероятностей открытые клетки - 0, флаги - 1. Для хода стратегии
+клетки границы - их вероятности, остальные закрытые - вероятность свободной клетки (берется тот же расчет,
+по которому ходит стратегия). Для простых выводов и кэша участков расчет не делается: клетки, определенные
+ходом, - 0 или 1, остальные закрытые - NaN. Поэтому записанные игры - те же игры, что у решателя без записи.
+Позиции копятся в буфере фиксированного размера и пишутся шардами .npz по shard позиций, поэтому память
+ограничена одним шардом на процесс. Игры раздаются пачками по процессам, каждый пишет свои шарды.
+"""
+
+
+class _ShardWriter:
+    """
+    Буфер позиций на shard штук: при заполнении записывается файл
+    ПАПКА/ПРЕФИКС-НОМЕР.npz с массивами visible, bombs, probability (shard, height, width), game, step и source
+    """
+
+    def __init__(self, folder, prefix, height, width, shard, compress=False):
+        self._folder = folder
+        self._prefix = prefix
+        self._compress = compress
+        self._visible = np.zeros((shard, height, width), dtype=np.int8)
+        self._bombs = np.zeros((shard, height, width), dtype=bool)
+        self._probability = np.zeros((shard, height, width), dtype=np.float32)
+        self._game = np.zeros(shard, dtype=np.int64)
+        self._step = np.zeros(shard, dtype=np.int32)
+        self._source = np.zeros(shard, dtype=np.int8)
+        self._size = 0
+        self.shards = 0
+        self.positions = 0
+        self.bytes = 0
+
+    def add(self, visible, bombs, probability, game, step, source):
+        index = self._size
+        self._visible[index] = visible
+        self._bombs[index] = bombs
+        self._probability[index] = probability
+        self._game[index] = game
+        self._step[index] = step
+        self._source[index] = source
+        self._size += 1
+        if self._size == self._game.size:
+            self.flush()
+
+    def flush(self):
+        if self._size == 0:
+            return
+
+        size = self._size
+        path = os.path.join(self._folder, f"{self._prefix}-{self.shards:04d}.npz")
+        save = np.savez_compressed if self._compress else np.savez
+        save(path, visible=self._visible[:size], bombs=self._bombs[:size], probability=self._probability[:size],
+             game=self._game[:size], step=self._step[:size], source=self._source[:size])
+        self.shards += 1
+        self.positions += size
+        self.bytes += os.path.getsize(path)
+        self._size = 0
+
+
+# Стратегия по вероятностям, которая записывает позицию перед каждым ходом и то, чем ход выбран
+class _RecordingStrategy(ProbabilityStrategy):
+    def __init__(self, writer, game):
+        self._writer = writer
+        self._game = game
+        self._step = 0
+        self._visible = None
+        self._bombs = None
+        self._probability = None
+
+    # Запоминаем позицию без расчета вероятностей: до стратегии ход может не дойти
+    def before_step(self, solver):
+        self._visible = solver._board.visible_codes()
+        self._bombs = solver._board.bombs.to_array()
+        self._probability = None
+
+    # Вероятности для записи - те же, по которым стратегия выбирает ход
+    def next_action(self, solver):
+        solved = solver._probabilities()
+        cells, probabilities, _, free_probability, _ = solved
+        probability = np.where(self._visible == SapperBoard.CLOSED, np.float32(free_probability), np.float32(0))
+        probability[self._visible == SapperBoard.FLAG] = 1
+        probability.reshape(-1)[cells] = probabilities
+        self._probability = probability
+        return self._decide(solver, *solved)
+
+    def after_decision(self, solver, source):
+        probability = self._probability
+        if probability is None:
+            # Ход простых выводов или кэша участков уже сделан: открытые им клетки - 0, флаги - 1
+            visible = solver._board.visible_codes()
+            probability = np.where(self._visible == SapperBoard.CLOSED, np.float32(np.nan), np.float32(0))
+            probability[(self._visible == SapperBoard.FLAG) | (visible == SapperBoard.FLAG)] = 1
+            probability[(self._visible == SapperBoard.CLOSED) & (visible >= 0)] = 0
+
+        self._writer.add(self._visible, self._bombs, probability, self._game, self._step, source)
+        self._step += 1
+
+
+"""
+Играем игры с зернами seeds и пишем позиции в шарды ПАПКА/shard-ПЕРВОЕ_ЗЕРНО-НОМЕР.npz
+Возвращаем (кол-во игр, позиций, шардов, байт)
+"""
+
+
+def export_games(folder, height, width, bombs, seeds, shard=4096, compress=False):
+    seeds = list(seeds)
+    if not seeds:
+        return 0, 0, 0, 0
+
+    writer = _ShardWriter(folder, f"shard-{seeds[0]:08d}", height, width, shard, compress)
+    for seed in seeds:
+        SapperSolver(seed, verbose=False, strategy=_RecordingStrategy(writer, seed)).play(height, width, bombs)
+    writer.flush()
+    return len(seeds), writer.positions, writer.shards, writer.bytes
+
+
+"""
+Выгружаем позиции игр на поле height x width с bombs бомбами, по игре на каждое зерно из seeds, в папку folder
+shard - позиций в одном файле, compress - сжимать ли шарды (np.savez_compressed)
+workers - кол-во процессов (None - по числу ядер, 1 - в текущем процессе), chunk - игр на задачу процесса
+Возвращаем словарь со статистикой: игры, позиции, шарды, байты, позиций в секунду
+"""
+
+
+def run_export(folder, height, width, bombs, seeds=range(1000), shard=4096, compress=False, workers=None,
+               chunk=100):
+    Sapper._check_params(height, width, bombs)
+    if height * width > Sapper.CHUNKED_CELLS:
+        raise ValueError(f"Not correct field: {height}x{width}. Field should have <= {Sapper.CHUNKED_CELLS} cells!")
+    if shard < 1:
+        raise ValueError(f"Not correct shard: {shard}. Shard should be >= 1!")
+    if chunk < 1:
+        raise ValueError(f"Not correct chunk: {chunk}. Chunk should be >= 1!")
+
+    seeds = list(seeds)
+    tasks = [(folder, height, width, bombs, seeds[i:i + chunk], shard, compress)
+             for i in range(0, len(seeds), chunk)]
+    results = map_tasks(export_games, tasks, workers)
+    os.makedirs(folder, exist_ok=True)
+    start = time.perf_counter()
+    results = list(results)
+
+    seconds = time.perf_counter() - start
+    games, positions, shards, size = (sum(column) for column in zip(*results)) if results else (0, 0, 0, 0)
+    return {"height": height, "width": width, "bombs": bombs, "games": games, "positions": positions,
+            "shards": shards, "bytes": size, "seconds": seconds,
+            "positions_per_second": positions / seconds if seconds else 0.0}
+
+
+# Читаем шард path: словарь массивов visible, bombs, probability, game, step, source
+def read_shard(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выгрузка позиций решателя сапера для обучения")
+    parser.add_argument("folder")
+    parser.add_argument("height", type=int)
+    parser.add_argument("width", type=int)
+    parser.add_argument("bombs", type=int)
+    parser.add_argument("--games", type=int, default=1000, help="кол-во игр")
+    parser.add_argument("--first-seed", type=int, default=0, help="зерно первой игры")
+    parser.add_argument("--shard", type=int, default=4096, help="позиций в одном шарде")
+    parser.add_argument("--compress", action="store_true", help="сжимать шарды")
+    parser.add_argument("--workers", type=int, default=None, help="кол-во процессов")
+    parser.add_argument("--chunk", type=int, default=100, help="игр на одну задачу процесса")
+    args = parser.parse_args()
+
+    print(json.dumps(run_export(args.folder, args.height, args.width, args.bombs,
+                                range(args.first_seed, args.first_seed + args.games), args.shard, args.compress,
+                                args.workers, args.chunk), indent=2))
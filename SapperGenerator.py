@@ -0,0 +1,73 @@
+import numpy as np
+from Sapper import Sapper
+from SapperBoard import SapperBoard
+import SapperProfile
+
+"""
+Модуль SapperGenerator генерирует сразу много полей одного размера height x width с bombs бомбами
+одной операцией numpy над пачкой (K, height, width) - для статистики методом Монте-Карло.
+Бомбы каждого поля - bombs клеток с наименьшими случайными ключами (выбор без повторений),
+безопасной клетке первого хода дается ключ больше любого случайного, поэтому бомбы на нее не попадают.
+"""
+
+
+"""
+Генерируем count полей
+safe - безопасные клетки первого хода: None - нет, (x, y) - одна для всех полей,
+массив (count, 2) - своя клетка для каждого поля
+rng - np.random.Generator или зерно для него
+Возвращаем (counts, bombs): int8 (count, height, width) - числа как в SapperBoard.counts (BOMB на месте бомбы),
+bool (count, height, width) - маски бомб
+"""
+
+
+@SapperProfile.phase("generate_batch")
+def generate_boards(height, width, bombs, count, safe=None, rng=None):
+    Sapper._check_params(height, width, bombs)
+    if count < 0:
+        raise ValueError(f"Not correct count: {count}. Count should be >= 0!")
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+    cells = height * width
+    keys = rng.random((count, cells), dtype=np.float32)
+    if safe is not None:
+        safe = np.asarray(safe, dtype=np.int64)
+        if safe.shape != (2,) and safe.shape != (count, 2):
+            raise ValueError(f"Not correct safe shape: {safe.shape}. Shape should be (2,) or ({count}, 2)!")
+        if (safe < 0).any() or (safe[..., 0] >= height).any() or (safe[..., 1] >= width).any():
+            raise ValueError(f"Not correct safe cells. Cells should be inside {height}x{width} field!")
+        keys[np.arange(count), safe[..., 0] * width + safe[..., 1]] = 2
+
+    # Бомбы - ключи не больше bombs-го по величине; при совпадающих ключах выбираем по индексам
+    mask = keys <= np.partition(keys, bombs - 1, axis=1)[:, bombs - 1:bombs]
+    ties = np.flatnonzero(np.count_nonzero(mask, axis=1) != bombs)
+    if ties.size:
+        positions = np.argpartition(keys[ties], bombs - 1, axis=1)[:, :bombs]
+        mask[ties] = False
+        mask[ties[:, None], positions] = True
+    mask = mask.reshape(count, height, width)
+
+    # Чисел больше 8 не бывает, поэтому BOMB ставится максимумом без выборки по маске
+    counts = SapperBoard.count_bombs(mask)
+    np.maximum(counts, mask.view(np.int8) * np.int8(SapperBoard.BOMB), out=counts)
+    SapperProfile.count("boards_generated", count)
+    return counts, mask
+
+
+"""
+Генерируем total полей пачками по chunk полей: генератор пар (counts, bombs) как у generate_boards
+safe - как у generate_boards, массив (total, 2) делится на пачки
+seed - зерно: одинаковые seed и chunk дают одинаковые поля
+"""
+
+
+def iterate_boards(height, width, bombs, total, chunk=2048, safe=None, seed=None):
+    if chunk < 1:
+        raise ValueError(f"Not correct chunk: {chunk}. Chunk should be >= 1!")
+
+    rng = np.random.default_rng(seed)
+    per_board = safe is not None and np.ndim(safe) == 2
+    for start in range(0, total, chunk):
+        count = min(chunk, total - start)
+        part = safe[start:start + count] if per_board else safe
+        yield generate_boards(height, width, bombs, count, part, rng)
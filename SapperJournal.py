@@ -0,0 +1,199 @@
+import os
+import re
+import struct
+import threading
+import numpy as np
+from SapperBoard import SapperBoard
+import SapperProfile
+
+"""
+Модуль SapperJournal ведет журнал ходов игры для восстановления после сбоя.
+Каждый ход (открытие, флаг, открытие квадрата вокруг числа) дописывается в конец журнала
+вместе с индексами x * width + y открытых им клеток, поэтому при восстановлении ходы не пересчитываются.
+Раз в snapshot_every ходов в фоне пишется снимок игры в формате сохранения НАЗВАНИЕ.sap (SapperBoard.write),
+а журнал начинается заново с новой части НАЗВАНИЕ.НОМЕР.journal, где НОМЕР - номер первой записи части.
+В заголовке снимка записано кол-во учтенных им записей, старые части удаляются только после записи снимка.
+Восстановление: читаем последний снимок и повторяем только записи журнала после него.
+
+Запись журнала - RECORD (операция, x, y, кол-во открытых клеток n), затем n индексов uint32.
+Недописанная при сбое последняя запись пропускается.
+"""
+
+
+class SapperJournal:
+    OPEN = 1
+    FLAG = 2
+    CHORD = 3
+
+    RECORD = struct.Struct("<BIII")
+
+    """
+    name - путь к файлам журнала без расширения
+    snapshot_every - через сколько ходов писать новый снимок
+    durable - сбрасывать ли каждую запись на диск (os.fsync), а не только в ОС
+    """
+
+    def __init__(self, name, snapshot_every=1000, durable=False):
+        if snapshot_every < 1:
+            raise ValueError(f"Not correct snapshot_every: {snapshot_every}. Snapshot_every should be >= 1!")
+
+        self._name = name
+        self._snapshot_every = snapshot_every
+        self._durable = durable
+        # state() возвращает текущее состояние игры (board, bombs, count_move, zeros)
+        self._state = None
+        self._file = None
+        self._thread = None
+        self._sequence = 0
+        self._snapshot_sequence = 0
+
+    # Ведется ли журнал
+    def is_started(self):
+        return self._file is not None
+
+    """
+    Начинаем журнал игры: сразу пишется снимок текущего состояния, затем удаляются части прошлых игр
+    state - функция без параметров, возвращающая (board, bombs, count_move, zeros),
+    sequence - кол-во записей, уже учтенных в состоянии (после восстановления)
+    """
+
+    def start(self, state, sequence=0):
+        board = state()[0]
+        if board.height * board.width > 1 << 32:
+            raise ValueError(f"Not correct board: {board.height}x{board.width}. "
+                             f"Journal records cells as uint32, board should have <= 2^32 cells!")
+
+        self.close()
+        self._state = state
+        self._sequence = sequence
+        self.__snapshot(wait=True)
+
+        for base, path in self.__parts():
+            if base > sequence:
+                os.remove(path)
+
+    # Дописываем ход op в клетку (x, y), cells - индексы открытых им клеток
+    @SapperProfile.phase("journal")
+    def append(self, op, x, y, cells=()):
+        if self._file is None:
+            return
+
+        cells = np.asarray(cells, dtype=np.uint32)
+        self._file.write(SapperJournal.RECORD.pack(op, x, y, cells.size))
+        self._file.write(cells.tobytes())
+        self._file.flush()
+        if self._durable:
+            os.fsync(self._file.fileno())
+
+        self._sequence += 1
+        if self._sequence - self._snapshot_sequence >= self._snapshot_every:
+            self.__snapshot()
+
+    # Завершаем журнал: дожидаемся записи снимка и закрываем часть журнала
+    def close(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    """
+    Снимок: маски открытых клеток, флагов и нулей копируются сразу,
+    сетка и бомбы после генерации не меняются, поэтому файл пишется в фоновом потоке
+    """
+
+    def __snapshot(self, wait=False):
+        # Предыдущий снимок еще пишется - дожидаемся его
+        if self._thread is not None:
+            self._thread.join()
+
+        board, bombs, count_move, zeros = self._state()
+        board = board.copy()
+        zeros = zeros.copy()
+        sequence = self._sequence
+
+        if self._file is not None:
+            self._file.close()
+        self._file = open(f"{self._name}.{sequence}.journal", "wb")
+        self._snapshot_sequence = sequence
+
+        self._thread = threading.Thread(target=self.__write_snapshot,
+                                        args=(board, bombs, count_move, zeros, sequence))
+        self._thread.start()
+        if wait:
+            self._thread.join()
+            self._thread = None
+
+    # Пишем снимок во временный файл, заменяем им прошлый снимок и удаляем учтенные части журнала
+    def __write_snapshot(self, board, bombs, count_move, zeros, sequence):
+        path = self._name + ".sap"
+        with open(path + ".tmp", "wb") as file:
+            board.write(file, bombs, count_move, zeros, sequence)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+
+        for base, part in self.__parts():
+            if base < sequence:
+                os.remove(part)
+
+    # Части журнала (номер первой записи, путь), по возрастанию номера
+    def __parts(self):
+        return SapperJournal._parts(self._name)
+
+    @staticmethod
+    def _parts(name):
+        folder, prefix = os.path.split(name)
+        pattern = re.compile(re.escape(prefix) + r"\.(\d+)\.journal")
+        parts = []
+        for file in os.listdir(folder or "."):
+            match = pattern.fullmatch(file)
+            if match:
+                parts.append((int(match.group(1)), os.path.join(folder, file)))
+        return sorted(parts)
+
+    """
+    Восстанавливаем игру name: читаем снимок НАЗВАНИЕ.sap и повторяем записи журнала после него
+    Возвращаем (board, bombs, count_move, zeros, sequence), sequence - кол-во учтенных записей
+    """
+
+    @staticmethod
+    def resume(name):
+        with open(name + ".sap", "rb") as file:
+            data = file.read()
+        board, bombs, count_move, zeros = SapperBoard.from_buffer(data)
+        sequence = SapperBoard.read_header(data)[4]
+        record = SapperJournal.RECORD
+
+        for base, path in SapperJournal._parts(name):
+            with open(path, "rb") as file:
+                data = file.read()
+
+            index = base
+            offset = 0
+            while offset + record.size <= len(data):
+                op, x, y, n = record.unpack_from(data, offset)
+                end = offset + record.size + 4 * n
+                if end > len(data):
+                    break
+
+                # Записи до снимка уже учтены в нем, после пропуска повторять нельзя
+                if index > sequence:
+                    break
+                if index == sequence:
+                    if op == SapperJournal.FLAG:
+                        board.toggle_flag(x, y)
+                    else:
+                        cells = np.frombuffer(data, dtype=np.uint32, count=n, offset=offset + record.size)
+                        cells = cells.astype(np.int64)
+                        board.revealed.put(cells)
+                        board.flags.put(cells, False)
+                        zeros.put(cells[board.values(cells) == 0])
+                        count_move += n
+                    sequence += 1
+
+                index += 1
+                offset = end
+
+        return board, bombs, count_move, zeros, sequence
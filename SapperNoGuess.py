@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import SapperProfile
+from Sapper import Sapper, SapperSolver
+from SapperBatch import map_tasks
+from SapperBoard import SapperBoard, BitMask
+from SapperStrategy import ProbabilityStrategy
+
+"""
+Модуль SapperNoGuess строит поля, которые решаются от первого хода без угадывания.
+Кандидат - случайное поле без бомб в квадрате 3x3 вокруг первого хода. Его решает SapperSolver
+только точными выводами (простые выводы, кэш участков, вероятности 0 и 1 по всей границе, без оценки выборкой).
+Если решатель застрял, бомба с неопределенной клетки границы переносится в закрытую клетку вдали
+от открытых, и поле проверяется заново; после repairs переносов кандидат отбрасывается.
+Принятые поля хранятся в корпусе на диске (SapperCorpus) по ключу (height, width, bombs, первый ход),
+поэтому выдача поля без угадывания - чтение одной записи файла. Корпус наполняется по процессам (fill_corpus).
+"""
+
+
+# Решатель застрял: cells - неопределенные клетки границы
+class _Stuck(Exception):
+    def __init__(self, cells):
+        super().__init__()
+        self.cells = cells
+
+
+# Стратегия проверки: первый ход задан, вместо угадывания - _Stuck
+class _NoGuessStrategy(ProbabilityStrategy):
+    def __init__(self, x, y):
+        self._x = x
+        self._y = y
+
+    def first_move(self, solver):
+        return self._x, self._y
+
+    def guess(self, solver, cells, probabilities, free, free_probability):
+        raise _Stuck(cells)
+
+
+# Решатель на заданной расстановке бомб layout
+class _Checker(SapperSolver):
+    def __init__(self, layout, x, y):
+        super().__init__(0, verbose=False, strategy=_NoGuessStrategy(x, y))
+        self._sampler = None
+        self.__layout = layout
+
+    def _generate_field(self, i, j):
+        self._board.set_bombs(self.__layout)
+
+
+"""
+Проверяем, решается ли поле layout (массив bool height x width) от хода (x, y) без угадывания
+Возвращаем (решено или нет, None или (неопределенные клетки границы, маска открытых клеток), где решатель застрял)
+"""
+
+
+@SapperProfile.phase("no_guess_check")
+def check(layout, x, y):
+    height, width = layout.shape
+    checker = _Checker(layout, x, y)
+    try:
+        return checker.play(height, width, int(layout.sum()))[0], None
+    except _Stuck as stuck:
+        return False, (stuck.cells, checker._board.revealed.to_array())
+
+
+"""
+Строим поле height x width с bombs бомбами, которое решается от хода (x, y) без угадывания
+seed - зерно, attempts - сколько кандидатов пробовать, repairs - переносов бомб на кандидата
+Возвращаем (поле - массив bool или None, если не получилось, кол-во опробованных кандидатов)
+"""
+
+
+def generate_no_guess(height, width, bombs, x, y, seed=None, attempts=100, repairs=8):
+    _check_params(height, width, bombs, x, y)
+    rng = np.random.default_rng(seed)
+    zone = _zone(height, width, x, y)
+
+    for attempt in range(1, attempts + 1):
+        allowed = np.ones(height * width, dtype=bool)
+        allowed[zone] = False
+        layout = np.zeros(height * width, dtype=bool)
+        layout[rng.choice(np.flatnonzero(allowed), bombs, replace=False)] = True
+        layout = layout.reshape(height, width)
+
+        for _ in range(repairs + 1):
+            solved, stuck = check(layout, x, y)
+            if solved:
+                return layout, attempt
+            if stuck is None or not _repair(layout, *stuck, zone, rng):
+                break
+
+    return None, attempts
+
+
+"""
+Переносим бомбу с одной из неопределенных клеток границы cells в закрытую клетку не рядом с открытыми (revealed)
+и не в квадрате первого хода zone. Возвращаем False, если переносить нечего или некуда
+"""
+
+
+def _repair(layout, cells, revealed, zone, rng):
+    flat = layout.reshape(-1)
+    loaded = cells[flat[cells]]
+    near = (SapperBoard.count_bombs(revealed) > 0).reshape(-1)
+    targets = ~near & ~flat
+    targets[zone] = False
+    targets = np.flatnonzero(targets)
+    if loaded.size == 0 or targets.size == 0:
+        return False
+
+    flat[rng.choice(loaded)] = False
+    flat[rng.choice(targets)] = True
+    return True
+
+
+# Индексы клеток квадрата 3x3 вокруг (x, y) внутри поля
+def _zone(height, width, x, y):
+    rows = np.arange(max(x - 1, 0), min(x + 2, height))
+    cols = np.arange(max(y - 1, 0), min(y + 2, width))
+    return (rows[:, None] * width + cols).reshape(-1)
+
+
+def _check_params(height, width, bombs, x, y):
+    Sapper._check_params(height, width, bombs)
+    if height * width > Sapper.CHUNKED_CELLS:
+        raise ValueError(f"Not correct field: {height}x{width}. Field should have <= {Sapper.CHUNKED_CELLS} cells!")
+    if not (0 <= x < height and 0 <= y < width):
+        raise ValueError(f"Not correct cell: ({x}, {y}). Cell should be inside {height}x{width} field!")
+    if bombs > height * width - _zone(height, width, x, y).size:
+        raise ValueError(f"Not correct bombs: {bombs}. Bombs should leave the 3x3 square around ({x}, {y}) free!")
+
+
+class SapperCorpus:
+    """
+    Корпус полей без угадывания в папке folder: на каждый ключ (height, width, bombs, x, y) - файл
+    HxWxB_X_Y.bin из подряд записанных масок бомб (BitMask) одного размера, поэтому поле с номером k
+    читается одним seek и read
+    """
+
+    def __init__(self, folder):
+        self._folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    # Кол-во полей по ключу
+    def count(self, height, width, bombs, x, y):
+        path = self.__path(height, width, bombs, x, y)
+        return os.path.getsize(path) // SapperCorpus.__size(height, width) if os.path.exists(path) else 0
+
+    # Дописываем поля layouts (массивы bool height x width) по ключу
+    def add(self, height, width, bombs, x, y, layouts):
+        with open(self.__path(height, width, bombs, x, y), "ab") as file:
+            for layout in layouts:
+                file.write(BitMask.from_array(np.asarray(layout, dtype=bool)).tobytes())
+
+    # Поле с номером index по ключу (массив bool height x width)
+    def get(self, height, width, bombs, x, y, index):
+        count = self.count(height, width, bombs, x, y)
+        if not 0 <= index < count:
+            raise ValueError(f"Not correct index: {index}. Index should be >= 0 and < {count}!")
+
+        size = SapperCorpus.__size(height, width)
+        with open(self.__path(height, width, bombs, x, y), "rb") as file:
+            file.seek(index * size)
+            return BitMask(height, width, file.read(size)).to_array()
+
+    """
+    Случайное поле по ключу (rng - np.random.Generator). Если полей по ключу нет,
+    строим одно в этом процессе (generate_no_guess) и добавляем в корпус
+    """
+
+    @SapperProfile.phase("no_guess")
+    def board(self, height, width, bombs, x, y, rng):
+        count = self.count(height, width, bombs, x, y)
+        if count:
+            return self.get(height, width, bombs, x, y, int(rng.integers(count)))
+
+        layout, _ = generate_no_guess(height, width, bombs, x, y, int(rng.integers(1 << 63)))
+        if layout is None:
+            raise ValueError(f"Not correct bombs: {bombs}. No field without guessing was found "
+                             f"for {height}x{width} field and first move ({x}, {y})!")
+        self.add(height, width, bombs, x, y, [layout])
+        return layout
+
+    def __path(self, height, width, bombs, x, y):
+        return os.path.join(self._folder, f"{height}x{width}x{bombs}_{x}_{y}.bin")
+
+    @staticmethod
+    def __size(height, width):
+        return height * ((width + 7) // 8)
+
+
+# Строим поля с зернами seeds, возвращаем список (упакованное поле или None, кол-во кандидатов)
+def _generate_chunk(height, width, bombs, x, y, seeds, attempts, repairs):
+    results = []
+    for seed in seeds:
+        layout, candidates = generate_no_guess(height, width, bombs, x, y, seed, attempts, repairs)
+        results.append((None if layout is None else np.packbits(layout, axis=1), candidates))
+    return results
+
+
+"""
+Наполняем корпус в папке folder полями height x width с bombs бомбами для первого хода (x, y):
+по одному полю на каждое зерно из seeds, поля строятся по процессам
+workers - кол-во процессов (None - по числу ядер, 1 - в текущем процессе), chunk - зерен на задачу процесса
+Возвращаем словарь со статистикой: принято и отброшено полей, кандидатов, полей в секунду, размер корпуса
+"""
+
+
+def fill_corpus(folder, height, width, bombs, x, y, seeds=range(100), workers=None, chunk=4, attempts=100,
+                repairs=8):
+    _check_params(height, width, bombs, x, y)
+    if chunk < 1:
+        raise ValueError(f"Not correct chunk: {chunk}. Chunk should be >= 1!")
+
+    seeds = list(seeds)
+    tasks = [(height, width, bombs, x, y, seeds[i:i + chunk], attempts, repairs) for i in range(0, len(seeds), chunk)]
+    results = map_tasks(_generate_chunk, tasks, workers)
+    corpus = SapperCorpus(folder)
+    start = time.perf_counter()
+    accepted, rejected, candidates = 0, 0, 0
+
+    # Поля записываются по мере готовности задач
+    for result in results:
+        layouts = [np.unpackbits(packed, axis=1, count=width).view(bool) for packed, _ in result
+                   if packed is not None]
+        corpus.add(height, width, bombs, x, y, layouts)
+        accepted += len(layouts)
+        rejected += len(result) - len(layouts)
+        candidates += sum(count for _, count in result)
+
+    seconds = time.perf_counter() - start
+    return {"height": height, "width": width, "bombs": bombs, "x": x, "y": y, "accepted": accepted,
+            "rejected": rejected, "candidates": candidates, "seconds": seconds,
+            "boards_per_second": accepted / seconds if seconds else 0.0,
+            "corpus_size": corpus.count(height, width, bombs, x, y)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Корпус полей сапера без угадывания")
+    parser.add_argument("height", type=int)
+    parser.add_argument("width", type=int)
+    parser.add_argument("bombs", type=int)
+    parser.add_argument("--x", type=int, default=None, help="строка первого хода (по умолчанию - середина)")
+    parser.add_argument("--y", type=int, default=None, help="столбец первого хода (по умолчанию - середина)")
+    parser.add_argument("--count", type=int, default=100, help="кол-во зерен (полей)")
+    parser.add_argument("--first-seed", type=int, default=0, help="зерно первого поля")
+    parser.add_argument("--folder", default="corpus", help="папка корпуса")
+    parser.add_argument("--workers", type=int, default=None, help="кол-во процессов")
+    parser.add_argument("--chunk", type=int, default=4, help="полей на одну задачу процесса")
+    parser.add_argument("--attempts", type=int, default=100, help="кандидатов на одно поле")
+    parser.add_argument("--repairs", type=int, default=8, help="переносов бомб на кандидата")
+    args = parser.parse_args()
+
+    first_x = args.height // 2 if args.x is None else args.x
+    first_y = args.width // 2 if args.y is None else args.y
+    print(json.dumps(fill_corpus(args.folder, args.height, args.width, args.bombs, first_x, first_y,
+                                 range(args.first_seed, args.first_seed + args.count), args.workers, args.chunk,
+                                 args.attempts, args.repairs), indent=2))
@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import SapperProfile
+from Sapper import Sapper
+from SapperBoard import SapperBoard
+from SapperGenerator import iterate_boards
+
+"""
+Модуль SapperOpenings считает статистику первого хода для поля height x width с bombs бомбами.
+Много полей генерируется пачками (SapperGenerator), и для каждой клетки считаются вероятность нуля
+при ее открытии и среднее кол-во открытых клеток (размер каскада нулей вместе с их соседями).
+Первый ход всегда безопасен, поэтому статистика клетки считается только по полям, где в ней нет бомбы:
+такие поля распределены так же, как поля, сгенерированные с безопасной первой клеткой.
+Области нулей всех полей пачки размечаются сразу операциями numpy (распространение наименьшей метки
+по соседям со скачками по меткам), без обхода каждого поля.
+Статистика хранится на диске в кэше SapperOpenings (файл на каждую конфигурацию, вытесняется давно
+не использованная), лучшая клетка конфигурации после загрузки берется из памяти за O(1) без обращений к диску.
+"""
+
+# Метка клеток, которые не являются нулями
+_NONE = np.iinfo(np.int32).max
+
+
+"""
+Размер каскада при открытии каждой клетки полей пачки counts (int8 (K, height, width) как у generate_boards)
+Возвращаем int32 (K, height, width): для нуля - кол-во клеток, открытых вместе с его областью,
+для числа - 1, для бомбы - 0
+"""
+
+
+def cascade_sizes(counts):
+    zero = counts == 0
+    size = zero.size
+    labels = np.where(zero, np.arange(size, dtype=np.int32).reshape(zero.shape), _NONE)
+
+    # Каждый нуль получает наименьший номер клетки своей области
+    while True:
+        spread = np.where(zero, _spread(labels), _NONE)
+        jumped = np.where(zero, spread.reshape(-1)[np.minimum(spread, size - 1)], _NONE)
+        if np.array_equal(jumped, labels):
+            break
+        labels = jumped
+
+    zeros = np.bincount(labels[zero], minlength=size)
+    # Число рядом с областью считаем по разу, даже если рядом несколько нулей этой области
+    # (своя метка у числа - _NONE)
+    border = ~zero & (counts != SapperBoard.BOMB)
+    near = np.sort(_neighbours(labels)[border], axis=-1)
+    first = near != _NONE
+    first[:, 1:] &= near[:, 1:] != near[:, :-1]
+    totals = zeros + np.bincount(near[first], minlength=size)
+
+    sizes = border.astype(np.int32)
+    sizes[zero] = totals[labels[zero]]
+    return sizes
+
+
+# Наименьшая метка в квадрате 3x3 вокруг каждой клетки (минимум по строкам, затем по столбцам)
+def _spread(labels):
+    rows = labels.copy()
+    np.minimum(rows[:, 1:], labels[:, :-1], out=rows[:, 1:])
+    np.minimum(rows[:, :-1], labels[:, 1:], out=rows[:, :-1])
+    square = rows.copy()
+    np.minimum(square[:, :, 1:], rows[:, :, :-1], out=square[:, :, 1:])
+    np.minimum(square[:, :, :-1], rows[:, :, 1:], out=square[:, :, :-1])
+    return square
+
+
+# Метки квадрата 3x3 вокруг каждой клетки: (K, height, width, 9), за краем поля - _NONE
+def _neighbours(labels):
+    count, height, width = labels.shape
+    padded = np.full((count, height + 2, width + 2), _NONE, dtype=np.int32)
+    padded[:, 1:-1, 1:-1] = labels
+    return np.stack([padded[:, dx:dx + height, dy:dy + width]
+                     for dx in range(3) for dy in range(3)], axis=-1)
+
+
+"""
+Статистика первого хода по samples полям height x width с bombs бомбами
+seed - зерно генератора полей, chunk - полей в пачке (на больших полях пачка уменьшается)
+Возвращаем (вероятность нуля, среднее кол-во открытых клеток) - массивы float32 height x width
+"""
+
+
+@SapperProfile.phase("openings")
+def opening_stats(height, width, bombs, samples=10000, seed=None, chunk=512):
+    Sapper._check_params(height, width, bombs)
+    if samples < 1:
+        raise ValueError(f"Not correct samples: {samples}. Samples should be >= 1!")
+    if chunk < 1:
+        raise ValueError(f"Not correct chunk: {chunk}. Chunk should be >= 1!")
+
+    chunk = max(1, min(chunk, SapperOpenings.CHUNK_CELLS // (height * width)))
+    safe = np.zeros((height, width), dtype=np.int64)
+    zeros = np.zeros((height, width), dtype=np.int64)
+    revealed = np.zeros((height, width), dtype=np.int64)
+
+    for counts, mask in iterate_boards(height, width, bombs, samples, chunk, seed=seed):
+        safe += mask.shape[0] - mask.sum(axis=0)
+        zeros += (counts == 0).sum(axis=0)
+        revealed += cascade_sizes(counts).sum(axis=0)
+
+    safe = np.maximum(safe, 1)
+    return (zeros / safe).astype(np.float32), (revealed / safe).astype(np.float32)
+
+
+class SapperOpenings:
+    # Критерии выбора первого хода: вероятность нуля или среднее кол-во открытых клеток
+    CRITERIA = ("zero", "revealed")
+    # Клеток во всех полях одной пачки opening_stats
+    CHUNK_CELLS = 1 << 20
+
+    """
+    Кэш статистики первого хода в папке folder: на каждую конфигурацию (height, width, bombs) -
+    файл HxWxB.npz с массивами zero, revealed (height x width) и кол-вом полей samples
+    capacity - сколько конфигураций хранить; при переполнении удаляется та, к которой дольше всего
+    не обращались: обращения этого процесса запоминаются в памяти, остальные конфигурации
+    упорядочиваются по времени записи файла (чтение файлы не меняет)
+    """
+
+    def __init__(self, folder="openings", capacity=64):
+        if capacity < 1:
+            raise ValueError(f"Not correct capacity: {capacity}. Capacity should be >= 1!")
+
+        self._folder = folder
+        self._capacity = capacity
+        # Загруженные конфигурации в порядке обращения: ключ -> (zero, revealed, samples, лучшие клетки)
+        self.__loaded = OrderedDict()
+        # Время последнего обращения этого процесса к конфигурации (time.time, как время записи файла)
+        self.__used = {}
+        os.makedirs(folder, exist_ok=True)
+
+    def __len__(self):
+        return len(self.__files())
+
+    def __contains__(self, key):
+        return os.path.exists(self.__path(*key))
+
+    """
+    Лучший первый ход (x, y) для конфигурации по критерию criterion из CRITERIA
+    Возвращаем None, если статистики для конфигурации нет
+    """
+
+    def best(self, height, width, bombs, criterion="zero"):
+        if criterion not in SapperOpenings.CRITERIA:
+            raise ValueError(f"Not correct criterion: {criterion}. "
+                             f"Criterion should be one of {SapperOpenings.CRITERIA}!")
+
+        entry = self.__entry(height, width, bombs)
+        return None if entry is None else entry[3][criterion]
+
+    """
+    Статистика конфигурации: словарь zero, revealed (массивы float32 height x width) и samples
+    Возвращаем None, если статистики нет
+    """
+
+    def get(self, height, width, bombs):
+        entry = self.__entry(height, width, bombs)
+        if entry is None:
+            return None
+        zero, revealed, samples, _ = entry
+        return {"zero": zero, "revealed": revealed, "samples": samples}
+
+    # Записываем статистику конфигурации (массивы height x width) по samples полям
+    def put(self, height, width, bombs, zero, revealed, samples):
+        zero = np.asarray(zero, dtype=np.float32)
+        revealed = np.asarray(revealed, dtype=np.float32)
+        if zero.shape != (height, width) or revealed.shape != (height, width):
+            raise ValueError(f"Not correct statistics: {zero.shape}, {revealed.shape}. "
+                             f"Statistics should have shape ({height}, {width})!")
+
+        path = self.__path(height, width, bombs)
+        # Пишем во временный файл и переименовываем, чтобы не оставить недописанный файл
+        temp = path + ".tmp.npz"
+        np.savez(temp, zero=zero, revealed=revealed, samples=np.int64(samples))
+        os.replace(temp, path)
+        self.__remember((height, width, bombs), zero, revealed, samples)
+        self.__evict()
+
+    """
+    Считаем статистику конфигурации по samples полям (opening_stats) и записываем ее в кэш
+    Возвращаем словарь как у get
+    """
+
+    def compute(self, height, width, bombs, samples=10000, seed=None, chunk=512):
+        zero, revealed = opening_stats(height, width, bombs, samples, seed, chunk)
+        self.put(height, width, bombs, zero, revealed, samples)
+        return self.get(height, width, bombs)
+
+    # Конфигурации в кэше (height, width, bombs) от давно использованной к недавней
+    def keys(self):
+        return [key for key, _ in self.__files()]
+
+    def __entry(self, height, width, bombs):
+        key = (height, width, bombs)
+        path = self.__path(*key)
+        if key in self.__loaded:
+            self.__loaded.move_to_end(key)
+        elif os.path.exists(path):
+            with np.load(path) as data:
+                self.__remember(key, data["zero"], data["revealed"], int(data["samples"]))
+        else:
+            return None
+
+        self.__used[key] = time.time()
+        return self.__loaded[key]
+
+    def __remember(self, key, zero, revealed, samples):
+        width = key[1]
+        best = {"zero": divmod(int(np.argmax(zero)), width), "revealed": divmod(int(np.argmax(revealed)), width)}
+        self.__loaded[key] = (zero, revealed, samples, best)
+        self.__loaded.move_to_end(key)
+        self.__used[key] = time.time()
+        while len(self.__loaded) > self._capacity:
+            self.__loaded.popitem(last=False)
+
+    def __evict(self):
+        files = self.__files()
+        for key, path in files[:max(len(files) - self._capacity, 0)]:
+            os.remove(path)
+            self.__loaded.pop(key, None)
+            self.__used.pop(key, None)
+
+    # Файлы кэша [(ключ, путь)] по возрастанию времени последнего обращения (записи файла или обращения в памяти)
+    def __files(self):
+        files = []
+        for name in os.listdir(self._folder):
+            stem, extension = os.path.splitext(name)
+            parts = stem.split("x")
+            if extension != ".npz" or len(parts) != 3 or not all(part.isdigit() for part in parts):
+                continue
+            path = os.path.join(self._folder, name)
+            key = tuple(map(int, parts))
+            files.append((max(os.path.getmtime(path), self.__used.get(key, 0.0)), key, path))
+        return [(key, path) for _, key, path in sorted(files)]
+
+    def __path(self, height, width, bombs):
+        return os.path.join(self._folder, f"{height}x{width}x{bombs}.npz")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Статистика первого хода сапера")
+    parser.add_argument("height", type=int)
+    parser.add_argument("width", type=int)
+    parser.add_argument("bombs", type=int)
+    parser.add_argument("--samples", type=int, default=10000, help="кол-во полей")
+    parser.add_argument("--seed", type=int, default=None, help="зерно генератора полей")
+    parser.add_argument("--chunk", type=int, default=512, help="полей в одной пачке")
+    parser.add_argument("--folder", default="openings", help="папка кэша")
+    parser.add_argument("--capacity", type=int, default=64, help="сколько конфигураций хранить")
+    args = parser.parse_args()
+
+    cache = SapperOpenings(args.folder, args.capacity)
+    start = time.perf_counter()
+    stats = cache.compute(args.height, args.width, args.bombs, args.samples, args.seed, args.chunk)
+    seconds = time.perf_counter() - start
+    report = {"height": args.height, "width": args.width, "bombs": args.bombs, "samples": args.samples,
+              "seconds": seconds, "boards_per_second": args.samples / seconds if seconds else 0.0}
+    for criterion in SapperOpenings.CRITERIA:
+        x, y = cache.best(args.height, args.width, args.bombs, criterion)
+        report[f"best_{criterion}"] = {"x": x, "y": y, "zero": float(stats["zero"][x, y]),
+                                       "revealed": float(stats["revealed"][x, y])}
+    print(json.dumps(report, indent=2))
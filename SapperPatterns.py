@@ -0,0 +1,213 @@
+import os
+import pickle
+from collections import OrderedDict
+import numpy as np
+from SapperBoard import SapperBoard
+import SapperProfile
+
+"""
+Модуль SapperPatterns запоминает выводы по небольшим повторяющимся участкам поля (1-2-1, стенки из 1, углы).
+Участок - окно 5x5 вокруг открытого числа. В нем учитываются только числа внутреннего квадрата 3x3,
+все соседи которых видны в окне (флаги вычитаются из чисел), поэтому вывод (какие клетки точно без бомб, а какие точно с бомбами)
+верен при любом остальном поле. Окно приводится к каноническому виду по 8 поворотам и отражениям,
+так что один вывод подходит ко всем симметричным участкам.
+Кэш ограничен по размеру (вытесняются давно не использованные окна) и может сохраняться на диск.
+"""
+
+
+class SapperPatterns:
+    # Размер окна, максимум перебираемых закрытых клеток окна
+    # и коды клеток окна: вне поля, открытая клетка без учитываемого числа
+    SIZE = 5
+    MAX_CELLS = 16
+    OUTSIDE = -3
+    OPEN = 9
+
+    # Перестановки клеток окна для 8 поворотов и отражений: вариант s - window.flat[__PERMUTATIONS[s]]
+    __BASE = np.arange(SIZE * SIZE).reshape(SIZE, SIZE)
+    __PERMUTATIONS = np.array([np.rot90(base, k).ravel() for base in (__BASE, __BASE.T) for k in range(4)])
+    # Клетки внутреннего квадрата 3x3 окна
+    __INNER = np.zeros((SIZE, SIZE), dtype=bool)
+    __INNER[1:-1, 1:-1] = True
+
+    __shared = None
+
+    """
+    capacity - максимум окон в кэше
+    path - файл кэша: если он есть, кэш загружается из него
+    """
+
+    def __init__(self, capacity=1 << 16, path=None):
+        if capacity < 1:
+            raise ValueError(f"Not correct capacity: {capacity}. Capacity should be >= 1!")
+
+        self._capacity = capacity
+        # Каноническое окно (bytes) -> (индексы клеток без бомб, индексы клеток с бомбами) в каноническом окне
+        self._cache = OrderedDict()
+        # Выводы, которых еще не было в файле или у вызывающего (take_new)
+        self._new = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    # Общий кэш процесса: решатели одного процесса (например, в SapperBatch) разогревают его вместе
+    @staticmethod
+    def shared():
+        if SapperPatterns.__shared is None:
+            SapperPatterns.__shared = SapperPatterns()
+        return SapperPatterns.__shared
+
+    """
+    Выводы по окнам вокруг открытых чисел numbers (индексы x * width + y) поля board
+    Возвращаем (клетки без бомб, клетки с бомбами) - множества индексов x * width + y
+    """
+
+    @SapperProfile.phase("patterns")
+    def deduce(self, board, numbers):
+        numbers = np.fromiter(numbers, dtype=np.int64)
+        safe = set()
+        mines = set()
+        if numbers.size == 0:
+            return safe, mines
+
+        xs, ys = np.divmod(numbers, board.width)
+        windows = SapperPatterns.__windows(board, xs, ys)
+        variants = windows.reshape(numbers.size, -1)[:, SapperPatterns.__PERMUTATIONS]
+
+        size = SapperPatterns.SIZE
+        for x, y, variant in zip(xs.tolist(), ys.tolist(), variants):
+            keys = [row.tobytes() for row in variant]
+            key = min(keys)
+            symmetry = keys.index(key)
+
+            result = self._cache.get(key)
+            if result is None:
+                self._misses += 1
+                result = SapperPatterns.__solve(variant[symmetry].reshape(size, size))
+                self.__put(key, result)
+                self._new[key] = result
+            else:
+                self._hits += 1
+                self._cache.move_to_end(key)
+
+            # Клетки канонического окна переводим обратно в клетки поля
+            if result[0] or result[1]:
+                permutation = SapperPatterns.__PERMUTATIONS[symmetry]
+                for found, cells in zip((safe, mines), result):
+                    for cell in cells:
+                        dx, dy = divmod(int(permutation[cell]), size)
+                        found.add((x + dx - 2) * board.width + y + dy - 2)
+
+        return safe, mines
+
+    # Статистика кэша
+    def stats(self):
+        total = self._hits + self._misses
+        return {"size": len(self._cache), "capacity": self._capacity, "hits": self._hits, "misses": self._misses,
+                "evictions": self._evictions, "hit_rate": self._hits / total if total else 0.0}
+
+    # Сохраняем кэш в файл path (pickle: список пар окно - вывод от старых к новым)
+    def save(self, path):
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(list(self._cache.items()), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        self._new.clear()
+
+    # Добавляем в кэш окна из файла path
+    def load(self, path):
+        with open(path, "rb") as file:
+            self.update(pickle.load(file))
+
+    # Добавляем в кэш пары (окно, вывод), например полученные из take_new другого процесса
+    def update(self, items):
+        for key, result in items:
+            self.__put(key, result)
+
+    # Выводы, найденные с прошлого вызова take_new или save
+    def take_new(self):
+        new = list(self._new.items())
+        self._new.clear()
+        return new
+
+    def __put(self, key, result):
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        if len(self._cache) > self._capacity:
+            self._cache.popitem(last=False)
+            self._evictions += 1
+
+    """
+    Окна 5x5 вокруг клеток (xs[k], ys[k]) - массив (k, 5, 5) в виде, от которого зависит вывод:
+    CLOSED у закрытых клеток без флага рядом с учитываемыми числами, у чисел внутреннего квадрата
+    с закрытыми соседями - сколько бомб рядом еще не отмечено флагами, у остальных клеток
+    (открытые, флаги, за краем поля) - OPEN
+    """
+
+    @staticmethod
+    def __windows(board, xs, ys):
+        size = SapperPatterns.SIZE
+        # Видимое поле берем только в прямоугольнике вокруг чисел, за краем поля - OUTSIDE
+        top, bottom = max(int(xs.min()) - 2, 0), min(int(xs.max()) + 3, board.height)
+        left, right = max(int(ys.min()) - 2, 0), min(int(ys.max()) + 3, board.width)
+        codes = np.full((bottom - top + 4, right - left + 4), SapperPatterns.OUTSIDE, dtype=np.int8)
+        codes[2:-2, 2:-2] = board.visible_codes(top, bottom, left, right)
+
+        offsets = np.arange(size)
+        codes = codes[(xs - top)[:, None, None] + offsets[:, None], (ys - left)[:, None, None] + offsets]
+        closed = codes == SapperBoard.CLOSED
+        flags = codes == SapperBoard.FLAG
+
+        # Закрытые клетки и флаги рядом с каждой клеткой внутреннего квадрата
+        near_closed = np.zeros((xs.size, 3, 3), dtype=np.int8)
+        near_flags = np.zeros((xs.size, 3, 3), dtype=np.int8)
+        for di in range(3):
+            for dj in range(3):
+                near_closed += closed[:, di:di + 3, dj:dj + 3]
+                near_flags += flags[:, di:di + 3, dj:dj + 3]
+        inner = codes[:, 1:-1, 1:-1]
+        active = (inner >= 0) & (near_closed > 0)
+
+        # Клетки окна рядом с учитываемыми числами
+        near_active = np.zeros(closed.shape, dtype=bool)
+        for di in range(3):
+            for dj in range(3):
+                near_active[:, di:di + 3, dj:dj + 3] |= active
+
+        windows = np.full(closed.shape, SapperPatterns.OPEN, dtype=np.int8)
+        windows[closed & near_active] = SapperBoard.CLOSED
+        windows[:, 1:-1, 1:-1] = np.where(active, inner - near_flags, windows[:, 1:-1, 1:-1])
+        return windows
+
+    """
+    Вывод по окну: перебираем все расстановки бомб в закрытых клетках окна, подходящие к числам
+    внутреннего квадрата; клетки без бомбы во всех расстановках - безопасные, с бомбой во всех - бомбы
+    Окна, где закрытых клеток больше MAX_CELLS, не перебираются и считаются неопределенными
+    Возвращаем (индексы безопасных клеток окна, индексы бомб окна)
+    """
+
+    @staticmethod
+    def __solve(window):
+        cells = np.flatnonzero(window == SapperBoard.CLOSED)
+        if cells.size > SapperPatterns.MAX_CELLS:
+            return (), ()
+
+        # Ограничения: матрица "закрытая клетка рядом с числом" и сколько у числа бомб
+        rows, columns = np.divmod(cells, SapperPatterns.SIZE)
+        numbers = []
+        needed = []
+        for i, j in zip(*np.nonzero(SapperPatterns.__INNER & (window >= 0) & (window != SapperPatterns.OPEN))):
+            numbers.append((np.abs(rows - i) <= 1) & (np.abs(columns - j) <= 1))
+            needed.append(window[i, j])
+        matrix = np.array(numbers, dtype=np.int8).T
+
+        layouts = (np.arange(1 << cells.size)[:, None] >> np.arange(cells.size)) & 1
+        layouts = layouts[((layouts.astype(np.int8) @ matrix) == np.array(needed)).all(axis=1)]
+        if layouts.shape[0] == 0:
+            return (), ()
+
+        bombs = layouts.sum(axis=0)
+        safe = cells[bombs == 0]
+        mines = cells[bombs == layouts.shape[0]]
+        return tuple(safe.tolist()), tuple(mines.tolist())
@@ -0,0 +1,423 @@
+import atexit
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from SapperBoard import SapperBoard
+import SapperProfile
+from SapperSampler import SapperSampler
+
+"""
+Модуль SapperProbability вычисляет точные вероятности бомб в закрытых клетках поля.
+Открытые числа рядом с закрытыми клетками (граница) задают ограничения: сколько бомб среди их закрытых соседей.
+Ограничения делятся на независимые компоненты, каждая компонента перебирается отдельно,
+а затем компоненты объединяются с учетом общего кол-ва оставшихся бомб.
+Компоненты, которые слишком велики для перебора, оцениваются выборкой (SapperSampler), если она задана.
+Несколько крупных компонент перебираются параллельно в пуле процессов, если он задан.
+Флажки считаются известными бомбами.
+"""
+
+
+class SapperProbability:
+    # Компоненты от стольких клеток перебираются в пуле, если таких компонент хотя бы две,
+    # меньшие компоненты дешевле перебрать в текущем процессе, чем передать в пул
+    PARALLEL_CELLS = 16
+
+    # Общие пулы процессов по кол-ву процессов (pool)
+    __pools = {}
+
+    """
+    board - SapperBoard с открытыми клетками и флажками
+    bombs - всего бомб на поле
+    max_states - максимум состояний перебора на одну клетку компоненты,
+    компоненты больше этого не перебираются: их оценивает sampler (SapperSampler),
+    а без него их клетки получают среднюю вероятность
+    pool - пул процессов (concurrent.futures.Executor) для перебора крупных компонент, None - все в текущем процессе
+    """
+
+    def __init__(self, board, bombs, max_states=1 << 14, cache=None, sampler=None, pool=None):
+        self._board = board
+        self._bombs = bombs
+        self._max_states = max_states
+        self._sampler = sampler
+        self._pool = pool
+        # Перебранные компоненты между вызовами solve: ключ - ограничения компоненты
+        self._cache = {} if cache is None else cache
+        # После solve: половины 95% доверительных интервалов вероятностей cells (0 - точная вероятность)
+        self.intervals = np.zeros(0)
+        # После solve: True у клеток cells из перебранных компонент. Вероятности остальных клеток оценены выборкой
+        # или заменены средней, поэтому 0 и 1 у них не означают, что клетка определена
+        self.exact = np.zeros(0, dtype=bool)
+
+    """
+    Вычисляем вероятности
+    numbers - индексы x * width + y открытых чисел рядом с закрытыми клетками, если вызывающий их отслеживает,
+    closed и flagged - кол-во закрытых клеток без флагов и кол-во флагов.
+    None - ищем их по всему полю.
+    Компоненты, ограничения которых не изменились, берутся из кэша без перебора.
+    Возвращаем (cells, probabilities, free, free_probability):
+    cells - индексы закрытых клеток рядом с открытыми числами и вероятности бомб в них,
+    free - кол-во остальных закрытых клеток и общая для них вероятность бомбы
+    (точная, только если все клетки cells точные - см. exact)
+    """
+
+    @SapperProfile.phase("probability")
+    def solve(self, numbers=None, closed=None, flagged=None):
+        board = self._board
+        if numbers is None:
+            numbers = self._numbers()
+        if flagged is None:
+            flagged = board.flags.count()
+        if closed is None:
+            closed = board.height * board.width - board.revealed.count() - flagged
+
+        cells, constraints = self._constraints(numbers)
+        remaining = self._bombs - flagged
+        exact = []
+        skipped = []
+        used = {}
+        cell_array = np.array(cells, dtype=np.int64)
+
+        components = []
+        for order, component_constraints in SapperProbability._components(len(cells), constraints):
+            # Номера клеток в ограничениях компоненты - позиции в order, ключ строим по индексам клеток поля
+            key = tuple(sorted((tuple(sorted(cells[order[cell]] for cell in members)), needed)
+                               for members, needed in component_constraints))
+            components.append((key, order, component_constraints))
+        enumerated = self.__enumerate_all([component for component in components if component[0] not in self._cache])
+
+        for key, order, component_constraints in components:
+            if key in self._cache:
+                counts = self._cache[key]
+            else:
+                counts = enumerated[key]
+                ess = None
+                if counts is None and self._sampler is not None:
+                    counts = self._sampler.sample(order.size, component_constraints)
+                    ess = None if counts is None else counts[2]
+                counts = (cell_array[order], None, None, None) if counts is None \
+                    else (cell_array[order], counts[0], counts[1], ess)
+            used[key] = counts
+
+            if counts[1] is None:
+                skipped.append(counts[0])
+            else:
+                exact.append(counts)
+
+        # Храним только компоненты текущей границы
+        self._cache.clear()
+        self._cache.update(used)
+
+        # Клетки компонент, которые не удалось ни перебрать, ни оценить, считаем свободными
+        free = closed - sum(counts[0].size for counts in exact)
+
+        # Для каждой компоненты: веса по ее кол-ву бомб при всех расстановках остальных компонент
+        # Свертки нормируем на максимум, логарифм множителя храним отдельно, чтобы не было переполнения
+        prefix = [np.ones(1)]
+        prefix_scales = [0.0]
+        for counts in exact:
+            product, scale = SapperProbability.__scaled_convolve(prefix[-1], counts[1])
+            prefix.append(product)
+            prefix_scales.append(prefix_scales[-1] + scale)
+        # Веса нормируем по кол-вам бомб границы, которые дают расстановки, иначе они уходят в 0
+        support = np.flatnonzero(prefix[-1] > 0)
+        if support.size == 0:
+            raise ValueError("No bomb layout matches the opened numbers!")
+        weights = SapperProbability._weights([counts[1] for counts in exact], free, remaining,
+                                             int(support[0]), int(support[-1]))
+        suffix = np.ones(1)
+        suffix_scale = 0.0
+        norm = float(np.dot(prefix[-1], weights[:prefix[-1].size]))
+        if norm == 0:
+            raise ValueError("No bomb layout matches the opened numbers!")
+
+        probabilities = [None] * len(exact)
+        for index in range(len(exact) - 1, -1, -1):
+            _, totals, marginals, _ = exact[index]
+            others = np.convolve(prefix[index], suffix)
+            # Вес k бомб в компоненте: сумма по K' остальных бомб others[K'] * weights[k + K']
+            window = np.array([np.dot(others, weights[k:k + others.size]) for k in range(totals.size)])
+            scale = math.exp(prefix_scales[index] + suffix_scale - prefix_scales[-1])
+            probabilities[index] = marginals @ window * scale / norm
+            suffix, step = SapperProbability.__scaled_convolve(suffix, totals)
+            suffix_scale += step
+
+        free_probability = 0.0
+        if free:
+            frontier_bombs = np.arange(prefix[-1].size)
+            expected = np.dot(prefix[-1] * weights[:prefix[-1].size], remaining - frontier_bombs) / norm
+            free_probability = float(expected) / free
+
+        # Точность есть только у оцененных выборкой компонент
+        intervals = [np.zeros(counts[0].size) if counts[3] is None
+                     else SapperSampler.interval(np.clip(probability, 0.0, 1.0), counts[3])
+                     for counts, probability in zip(exact, probabilities)]
+        known = [np.full(counts[0].size, counts[3] is None) for counts in exact]
+        for order in skipped:
+            probabilities.append(np.full(order.size, free_probability))
+            intervals.append(np.zeros(order.size))
+            known.append(np.zeros(order.size, dtype=bool))
+
+        orders = [counts[0] for counts in exact] + skipped
+        if len(orders) == 0:
+            self.intervals = np.zeros(0)
+            self.exact = np.zeros(0, dtype=bool)
+            return np.array([], dtype=np.int64), np.zeros(0), free, free_probability
+
+        self.intervals = np.concatenate(intervals)
+        self.exact = np.concatenate(known)
+        return np.concatenate(orders), np.clip(np.concatenate(probabilities), 0.0, 1.0), free, free_probability
+
+    # Индексы открытых чисел, рядом с которыми есть закрытые клетки
+    def _numbers(self):
+        closed = ~self._board.revealed.to_array() & ~self._board.flags.to_array()
+        return np.flatnonzero(self._board.revealed.to_array() & (SapperBoard.count_bombs(closed) > 0)).tolist()
+
+    """
+    Строим ограничения по открытым числам numbers
+    Возвращаем (cells, constraints): cells - список индексов закрытых клеток рядом с числами,
+    constraints - список (номера клеток в cells, сколько среди них бомб)
+    """
+
+    def _constraints(self, numbers):
+        board = self._board
+        width = board.width
+        cells = []
+        index = {}
+        constraints = []
+
+        for number in numbers:
+            x, y = divmod(number, width)
+            members = []
+            needed = board.count(x, y)
+            for di, dj in board.neighbours.shifts(x, y):
+                if board.flags[x + di, y + dj]:
+                    needed -= 1
+                elif not board.revealed[x + di, y + dj]:
+                    cell = number + di * width + dj
+                    if cell not in index:
+                        index[cell] = len(cells)
+                        cells.append(cell)
+                    members.append(index[cell])
+            if members:
+                constraints.append((members, needed))
+
+        return cells, constraints
+
+    # Делим клетки на независимые компоненты: клетки связаны, если входят в одно ограничение
+    @staticmethod
+    def _components(size, constraints):
+        parent = list(range(size))
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for members, _ in constraints:
+            root = find(members[0])
+            for cell in members[1:]:
+                other = find(cell)
+                if other != root:
+                    parent[other] = root
+
+        groups = {}
+        for members, needed in constraints:
+            groups.setdefault(find(members[0]), []).append((members, needed))
+
+        # Клетки компоненты упорядочиваем обходом в ширину, чтобы у перебора было мало незавершенных чисел
+        for group in groups.values():
+            near = {}
+            for number, (members, _) in enumerate(group):
+                for cell in members:
+                    near.setdefault(cell, []).append(number)
+
+            order = []
+            seen = set()
+            used = set()
+            for start in sorted(near):
+                if start in seen:
+                    continue
+                seen.add(start)
+                queue = [start]
+                for cell in queue:
+                    order.append(cell)
+                    for number in near[cell]:
+                        if number in used:
+                            continue
+                        used.add(number)
+                        for other in group[number][0]:
+                            if other not in seen:
+                                seen.add(other)
+                                queue.append(other)
+
+            local = {cell: position for position, cell in enumerate(order)}
+            yield np.array(order, dtype=np.int64), [([local[cell] for cell in members], needed)
+                                                    for members, needed in group]
+
+    """
+    Перебираем компоненты components - список (ключ, order, ограничения): крупные - в пуле, если их хотя бы две,
+    остальные - в текущем процессе, пока пул занят. Возвращаем словарь ключ -> результат _enumerate
+    """
+
+    def __enumerate_all(self, components):
+        large = [component for component in components if component[1].size >= SapperProbability.PARALLEL_CELLS]
+        futures = {}
+        if self._pool is not None and len(large) >= 2:
+            futures = {key: self._pool.submit(SapperProbability._enumerate_states, self._max_states, order.size,
+                                              component_constraints)
+                       for key, order, component_constraints in large}
+            SapperProfile.count("components_parallel", len(futures))
+
+        results = {}
+        for key, order, component_constraints in components:
+            if key not in futures:
+                results[key] = self._enumerate(order, component_constraints)
+        for key, future in futures.items():
+            results[key] = future.result()
+        return results
+
+    # Общий пул из workers процессов, создается при первом обращении и закрывается при выходе
+    @staticmethod
+    def pool(workers):
+        if workers < 1:
+            raise ValueError(f"Not correct workers: {workers}. Workers should be >= 1!")
+
+        pool = SapperProbability.__pools.get(workers)
+        if pool is None:
+            pool = SapperProbability.__pools[workers] = ProcessPoolExecutor(max_workers=workers)
+            atexit.register(pool.shutdown)
+        return pool
+
+    # Перебор компоненты order (см. _enumerate_states)
+    def _enumerate(self, order, constraints):
+        return SapperProbability._enumerate_states(self._max_states, order.size, constraints)
+
+    """
+    Перебираем расстановки бомб в компоненте из n клеток
+    Перебор с возвратом по клеткам в порядке order с запоминанием: состояние после i клеток - остатки бомб
+    у чисел, часть клеток которых уже расставлена. Одинаковые состояния объединяются, поэтому перебор
+    идет по слоям: сначала с конца считаем кол-во продолжений из каждого состояния, затем с начала - вероятности.
+    Возвращаем (totals, marginals): totals[k] - кол-во расстановок с k бомбами,
+    marginals[i][k] - сколько из них с бомбой в клетке i. None, если состояний больше max_states.
+    Не зависит от поля, поэтому выполняется и в пуле процессов
+    """
+
+    @staticmethod
+    def _enumerate_states(max_states, n, constraints):
+        first = [min(members) for members, _ in constraints]
+        last = [max(members) for members, _ in constraints]
+
+        # Незавершенные числа на границе перед клеткой i
+        active = [[] for _ in range(n + 1)]
+        for number in range(len(constraints)):
+            for i in range(first[number] + 1, last[number] + 1):
+                active[i].append(number)
+
+        # Числа, в которые входит клетка i, и сколько их клеток идет после i
+        containing = [[] for _ in range(n)]
+        for number, (cells, _) in enumerate(constraints):
+            for rest, cell in enumerate(sorted(cells, reverse=True)):
+                containing[cell].append((number, rest))
+
+        # Переходы слоя i: откуда берется остаток каждого числа и какие проверки нужны для клетки i
+        steps = []
+        for i in range(n):
+            position = {number: place for place, number in enumerate(active[i])}
+            members = {number for number, _ in containing[i]}
+            checks = [(position.get(number, -1), constraints[number][1], rest) for number, rest in containing[i]]
+            sources = [(position.get(number, -1), constraints[number][1], number in members)
+                       for number in active[i + 1]]
+            steps.append((checks, sources))
+
+        def transitions(i, state):
+            checks, sources = steps[i]
+            for bomb in (0, 1):
+                if all(0 <= (state[place] if place >= 0 else needed) - bomb <= rest
+                       for place, needed, rest in checks):
+                    yield bomb, tuple((state[place] if place >= 0 else needed) - (bomb if member else 0)
+                                      for place, needed, member in sources)
+
+        # С конца: backward[i][state][k] - кол-во расстановок клеток i..n-1 с k бомбами
+        backward = [dict() for _ in range(n + 1)]
+        backward[n][()] = np.ones(1)
+        reachable = [set() for _ in range(n + 1)]
+        reachable[0].add(())
+        for i in range(n):
+            for state in reachable[i]:
+                for _, new_state in transitions(i, state):
+                    reachable[i + 1].add(new_state)
+            if len(reachable[i + 1]) > max_states:
+                return None
+
+        for i in range(n - 1, -1, -1):
+            for state in reachable[i]:
+                total = np.zeros(n - i + 1)
+                for bomb, new_state in transitions(i, state):
+                    tail = backward[i + 1].get(new_state)
+                    if tail is not None:
+                        total[bomb:bomb + tail.size] += tail
+                if total.any():
+                    backward[i][state] = total
+
+        totals = backward[0].get(())
+        if totals is None:
+            raise ValueError("No bomb layout matches the opened numbers!")
+
+        # С начала: forward[state][k] - кол-во расстановок клеток 0..i-1 с k бомбами
+        marginals = np.zeros((n, n + 1))
+        forward = {(): np.ones(1)}
+        for i in range(n):
+            new_forward = {}
+            for state, head in forward.items():
+                for bomb, new_state in transitions(i, state):
+                    tail = backward[i + 1].get(new_state)
+                    if tail is None:
+                        continue
+                    if bomb:
+                        marginals[i, 1:] += np.convolve(head, tail)
+                    if new_state in new_forward:
+                        new_forward[new_state][bomb:bomb + head.size] += head
+                    else:
+                        shifted = np.zeros(i + 2)
+                        shifted[bomb:bomb + head.size] = head
+                        new_forward[new_state] = shifted
+            forward = new_forward
+            backward[i] = None
+
+        # Масштабируем, чтобы большие компоненты не переполняли float
+        scale = totals.max()
+        return totals / scale, marginals / scale
+
+    """
+    Вес расстановки с K бомбами на границе - кол-во способов разложить остальные remaining - K бомб
+    по free свободным клеткам, т.е. C(free, remaining - K). Веса нормируются по максимуму через логарифмы
+    среди K от low до high (кол-ва бомб, которые дают расстановки границы), остальные веса - 0
+    """
+
+    @staticmethod
+    def _weights(totals, free, remaining, low=None, high=None):
+        size = sum(part.size - 1 for part in totals) + 1
+        logs = np.full(size, -np.inf)
+        for bombs in range(size):
+            rest = remaining - bombs
+            if 0 <= rest <= free:
+                logs[bombs] = math.lgamma(free + 1) - math.lgamma(rest + 1) - math.lgamma(free - rest + 1)
+
+        # Вне кол-в бомб low..high расстановок границы нет, их веса не нужны
+        low = 0 if low is None else low
+        high = size - 1 if high is None else high
+        logs[:low] = -np.inf
+        logs[high + 1:] = -np.inf
+        if np.isinf(logs).all():
+            raise ValueError("No bomb layout matches the opened numbers!")
+        return np.exp(logs - logs.max())
+
+    # Свертка, нормированная на свой максимум. Возвращаем (свертка, логарифм множителя)
+    @staticmethod
+    def __scaled_convolve(first, second):
+        product = np.convolve(first, second)
+        top = product.max()
+        if top <= 0:
+            return product, 0.0
+        return product / top, math.log(top)
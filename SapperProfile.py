@@ -0,0 +1,169 @@
+import atexit
+import functools
+import json
+import marshal
+import os
+import threading
+import time
+
+"""
+Модуль SapperProfile - встроенные замеры горячих мест: генерация поля, подсчет чисел, заливка нулей,
+выбор хода решателем, флаги, сохранение, загрузка и вывод поля.
+Для каждой фазы считаются вызовы, полное время и время без вложенных фаз, и гистограмма времени вызова
+по степеням двойки наносекунд. Счетчики (открытые клетки, выделения памяти) увеличиваются через count.
+
+Замеры включаются enable() или переменной окружения SAPPER_PROFILE:
+SAPPER_PROFILE=1 - просто включить, SAPPER_PROFILE=ПУТЬ - еще и записать при выходе ПУТЬ.json и ПУТЬ.prof.
+Выключенные замеры стоят одну проверку флага на вызов.
+Файл .prof читается pstats.Stats (фазы в нем - функции файла "sapper"), а также snakeviz и аналогами.
+"""
+
+_enabled = False
+_phases = {}
+_counters = {}
+_local = threading.local()
+_lock = threading.Lock()
+
+
+# Включаем замеры
+def enable():
+    global _enabled
+    _enabled = True
+
+
+# Выключаем замеры, собранное сохраняется
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+# Сбрасываем все собранные замеры и счетчики
+def reset():
+    with _lock:
+        _phases.clear()
+        _counters.clear()
+
+
+# Увеличиваем счетчик name на value
+def count(name, value=1):
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+"""
+Декоратор: замеряем время каждого вызова функции как фазы name
+Фазы могут быть вложенными: время вложенной фазы не входит в собственное время внешней
+"""
+
+
+def phase(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            return _measure(name, function, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _measure(name, function, args, kwargs):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    # Элемент стека: [фаза, время вложенных фаз]
+    stack.append([name, 0])
+    start = time.perf_counter_ns()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter_ns() - start
+        _, nested = stack.pop()
+        parent = stack[-1][0] if stack else None
+        if stack:
+            stack[-1][1] += elapsed
+        _record(name, parent, elapsed, elapsed - nested)
+
+
+# Запоминаем вызов фазы name из фазы parent: полное время total и собственное own в наносекундах
+def _record(name, parent, total, own):
+    with _lock:
+        stats = _phases.get(name)
+        if stats is None:
+            stats = _phases[name] = {"calls": 0, "total": 0, "own": 0, "histogram": {}, "callers": {}}
+        stats["calls"] += 1
+        stats["total"] += total
+        stats["own"] += own
+        bucket = total.bit_length()
+        stats["histogram"][bucket] = stats["histogram"].get(bucket, 0) + 1
+
+        caller = stats["callers"].get(parent)
+        if caller is None:
+            caller = stats["callers"][parent] = [0, 0, 0]
+        caller[0] += 1
+        caller[1] += total
+        caller[2] += own
+
+
+"""
+Отчет в виде словаря: для каждой фазы кол-во вызовов, полное и собственное время в секундах,
+среднее в микросекундах и гистограмма "до 2^k нс": кол-во вызовов; затем счетчики
+"""
+
+
+def report():
+    with _lock:
+        phases = {}
+        for name, stats in _phases.items():
+            phases[name] = {
+                "calls": stats["calls"],
+                "total_seconds": stats["total"] / 1e9,
+                "own_seconds": stats["own"] / 1e9,
+                "mean_us": stats["total"] / stats["calls"] / 1e3,
+                "histogram_ns": {f"<{1 << bucket}": calls for bucket, calls in sorted(stats["histogram"].items())},
+            }
+        return {"phases": phases, "counters": dict(_counters)}
+
+
+def dump_json(path):
+    with open(path, "w") as file:
+        json.dump(report(), file, indent=2)
+
+
+# Записываем фазы в формате cProfile/pstats: {функция: (вызовы, вызовы, собственное время, полное, вызывающие)}
+def dump_stats(path):
+    def key(name):
+        return "sapper", 0, name
+
+    with _lock:
+        stats = {}
+        for name, phase_stats in _phases.items():
+            callers = {key(parent): (calls, calls, own / 1e9, total / 1e9)
+                       for parent, (calls, total, own) in phase_stats["callers"].items() if parent is not None}
+            stats[key(name)] = (phase_stats["calls"], phase_stats["calls"], phase_stats["own"] / 1e9,
+                                phase_stats["total"] / 1e9, callers)
+
+    with open(path, "wb") as file:
+        marshal.dump(stats, file)
+
+
+# Включение переменной окружения
+def _from_environment():
+    value = os.environ.get("SAPPER_PROFILE", "")
+    if value in ("", "0"):
+        return
+
+    enable()
+    if value != "1":
+        atexit.register(lambda: (dump_json(value + ".json"), dump_stats(value + ".prof")))
+
+
+_from_environment()
@@ -0,0 +1,173 @@
+import shutil
+import sys
+import numpy as np
+from tabulate import tabulate
+import SapperProfile
+
+"""
+Модуль SapperRender выводит поле, которое видит игрок, в терминал.
+Рендер помнит последний выведенный кадр и печатает только изменившиеся клетки,
+переставляя курсор ANSI-последовательностями, поэтому вывод после хода не зависит от размера поля.
+Большое поле показывается окном (viewport) размером с терминал, окно сдвигается к клетке последнего хода.
+Режимы: "ansi" - обновление на месте, "plain" - окно целиком через tabulate (вывод не в терминал),
+"silent" - без вывода.
+Сообщения игры (message) в режиме "ansi" выводятся в строках под полем и переживают перерисовку:
+сообщение стирается первой перерисовкой, которая изменила поле, после той, что вывела его.
+Строки заголовка (кол-во бомб и т.п.) выводятся над полем при каждой полной перерисовке.
+"""
+
+
+class SapperRender:
+    MODES = ("ansi", "plain", "silent")
+
+    # Текст клетки по коду + 2: CLOSED, FLAG, числа 0..8, BOMB
+    __CELLS = np.array([" X", " F"] + [f" {n}" for n in range(9)] + [" B"])
+    # Строки терминала под заголовок, сообщения и ввод после поля
+    __RESERVED = 12
+    # Сколько последних строк сообщений показывать под полем
+    __MESSAGE_LINES = 5
+
+    """
+    stream - куда печатать (по умолчанию sys.stdout)
+    mode - режим вывода, по умолчанию "ansi" для терминала и "plain" для остального
+    rows, cols - размер окна в клетках (по умолчанию - по размеру терминала)
+    """
+
+    def __init__(self, stream=None, mode=None, rows=None, cols=None):
+        self._stream = sys.stdout if stream is None else stream
+        if mode is None:
+            mode = "ansi" if self._stream.isatty() else "plain"
+        if mode not in SapperRender.MODES:
+            raise ValueError(f"Not correct mode: {mode}. Mode should be one of {SapperRender.MODES}!")
+
+        size = shutil.get_terminal_size()
+        self._rows = rows if rows is not None else max(size.lines - SapperRender.__RESERVED, 1)
+        self._cols = cols if cols is not None else max((size.columns - 8) // 2, 1)
+        self._mode = mode
+        self._top = 0
+        self._left = 0
+        # Последний выведенный кадр (коды клеток окна), его левый верхний угол и размеры поля
+        self._frame = None
+        self._origin = None
+        self._shape = None
+        # Строки заголовка над полем и нужно ли вывести заголовок в режиме "plain"
+        self._header = []
+        self._header_pending = False
+        # Строки сообщений под полем; fresh - сообщения еще не пережили ни одной перерисовки
+        self._message = []
+        self._fresh = False
+
+    """
+    Забываем последний кадр: следующий draw выведет окно целиком
+    header - строки над полем (None - без заголовка), выводятся при каждой полной перерисовке
+    """
+
+    def reset(self, header=None):
+        self._frame = None
+        self._header = [] if header is None else header.split("\n")
+        self._header_pending = True
+
+    # Выводим сообщение text под полем (до первого кадра и не в режиме "ansi" - просто строкой)
+    def message(self, text):
+        if self._mode == "silent":
+            return
+        if self._mode == "plain" or self._frame is None:
+            self.__write(text + "\n")
+            return
+
+        # Сообщения между двумя кадрами копятся, старые стираются
+        lines = (self._message if self._fresh else []) + text.split("\n")
+        self._message = lines[-SapperRender.__MESSAGE_LINES:]
+        self._fresh = True
+        self.__write_message()
+        self._stream.flush()
+
+    # Сдвигаем окно так, чтобы клетка (x, y) была внутри него
+    def focus(self, x, y):
+        if not self._top <= x < self._top + self._rows:
+            self._top = max(x - self._rows // 2, 0)
+        if not self._left <= y < self._left + self._cols:
+            self._left = max(y - self._cols // 2, 0)
+
+    """
+    Выводим поле board
+    focus - клетка (x, y) последнего хода, к которой сдвигается окно, если она не видна
+    """
+
+    @SapperProfile.phase("render")
+    def draw(self, board, focus=None):
+        if self._mode == "silent":
+            return
+
+        if focus is not None:
+            self.focus(*focus)
+        if self._shape != (board.height, board.width):
+            self._shape = (board.height, board.width)
+            self._frame = None
+
+        self._top = top = min(self._top, max(board.height - self._rows, 0))
+        self._left = left = min(self._left, max(board.width - self._cols, 0))
+        bottom = min(top + self._rows, board.height)
+        right = min(left + self._cols, board.width)
+        frame = board.visible_codes(top, bottom, left, right)
+
+        if self._mode == "plain":
+            if self._header_pending:
+                self.__write("".join(line + "\n" for line in [f"Поле {board.height}x{board.width}"] + self._header))
+                self._header_pending = False
+            self.__write(tabulate(SapperRender.__CELLS[frame + 2]) + "\n")
+            return
+
+        full = self._frame is None or self._frame.shape != frame.shape or self._origin != (top, left)
+        # Сообщение, которое уже пережило перерисовку, стираем, когда поле изменилось
+        if not self._fresh and (full or (frame != self._frame).any()):
+            self._message = []
+        self._fresh = False
+
+        if full:
+            self._origin = (top, left)
+            self.__draw_full(board, frame)
+        else:
+            self.__draw_diff(frame)
+        self._frame = frame
+
+        # Сообщения под полем и курсор под ними, старый ввод стираем
+        self.__write_message()
+        self._stream.flush()
+
+    # Окно целиком: строка состояния, заголовок, затем строки поля с номерами
+    def __draw_full(self, board, frame):
+        top, left = self._origin
+        lines = [f"\x1b[H\x1b[2JПоле {board.height}x{board.width}, "
+                 f"строки {top + 1}-{top + frame.shape[0]}, столбцы {left + 1}-{left + frame.shape[1]}\n"]
+        lines.extend(line + "\n" for line in self._header)
+        label = len(str(board.height))
+        for row in range(frame.shape[0]):
+            lines.append(f"{top + row + 1:>{label}}" + "".join(SapperRender.__CELLS[frame[row] + 2]) + "\n")
+        self.__write("".join(lines))
+
+    # Только изменившиеся клетки: в каждой строке - отрезок от первой до последней изменившейся клетки
+    def __draw_diff(self, frame):
+        rows, cols = np.nonzero(frame != self._frame)
+        if rows.size == 0:
+            return
+
+        label = len(str(self._shape[0]))
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        ends = np.r_[starts[1:], rows.size] - 1
+        parts = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            row = rows[start]
+            first, last = cols[start], cols[end]
+            parts.append(f"\x1b[{row + len(self._header) + 2};{label + 2 * first + 1}H")
+            parts.append("".join(SapperRender.__CELLS[frame[row, first:last + 1] + 2]))
+        self.__write("".join(parts))
+
+    # Сообщения со строки под полем (через одну пустую), курсор остается под ними, ниже все стирается
+    def __write_message(self):
+        line = len(self._header) + self._frame.shape[0] + 3
+        self.__write(f"\x1b[{line};1H\x1b[J" + "".join(text + "\n" for text in self._message))
+
+    def __write(self, text):
+        self._stream.write(text)
+
@@ -0,0 +1,120 @@
+import time
+import numpy as np
+import SapperProfile
+
+"""
+Модуль SapperSampler оценивает расстановки бомб в компоненте границы, которую нельзя перебрать точно.
+Последовательная выборка по значимости: много расстановок строятся сразу (пачка numpy),
+клетки компоненты проходятся в том же порядке, что и при переборе, и в каждой клетке бомба ставится случайно,
+если ее можно поставить и не ставить, или вынужденно, если подходит только одно значение.
+Вес расстановки - 1 / вероятность ее построить, поэтому сумма весов расстановок с k бомбами
+оценивает их кол-во, как totals[k] у точного перебора, и оценки объединяются с другими компонентами так же.
+"""
+
+
+class SapperSampler:
+    """
+    samples - максимум расстановок на компоненту
+    seconds - максимум времени на компоненту (None - без ограничения: кол-во расстановок и результат
+    зависят только от rng, а не от скорости машины)
+    batch - расстановок в одной пачке
+    rng - np.random.Generator или зерно для него
+    """
+
+    def __init__(self, samples=4096, seconds=None, batch=512, rng=None):
+        if samples < 1:
+            raise ValueError(f"Not correct samples: {samples}. Samples should be >= 1!")
+        if batch < 1:
+            raise ValueError(f"Not correct batch: {batch}. Batch should be >= 1!")
+
+        self._samples = samples
+        self._seconds = seconds
+        self._batch = batch
+        self._rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+    """
+    Оцениваем компоненту из n клеток с ограничениями constraints - список (номера клеток, сколько среди них бомб),
+    клетки в порядке обхода (как у SapperProbability._components)
+    Возвращаем (totals, marginals, ess): оценки totals[k] и marginals[i][k] в масштабе наибольшего веса
+    и эффективное кол-во расстановок ess (по нему считается точность). None, если ни одна расстановка не построилась
+    """
+
+    @SapperProfile.phase("sample")
+    def sample(self, n, constraints):
+        steps = SapperSampler.__steps(n, constraints)
+        needed = np.array([needed for _, needed in constraints], dtype=np.int16)
+        deadline = None if self._seconds is None else time.perf_counter() + self._seconds
+
+        layouts = []
+        weights = []
+        drawn = 0
+        while drawn < self._samples and (deadline is None or time.perf_counter() < deadline or drawn == 0):
+            size = min(self._batch, self._samples - drawn)
+            layout, log_weight = self.__draw(size, n, needed, steps)
+            alive = np.isfinite(log_weight)
+            layouts.append(layout[alive])
+            weights.append(log_weight[alive])
+            drawn += size
+
+        layouts = np.concatenate(layouts)
+        log_weights = np.concatenate(weights)
+        if log_weights.size == 0:
+            return None
+
+        weights = np.exp(log_weights - log_weights.max())
+        bombs = layouts.sum(axis=1)
+        totals = np.bincount(bombs, weights=weights, minlength=n + 1)
+        marginals = np.zeros((n, n + 1))
+        for k in np.unique(bombs):
+            chosen = bombs == k
+            marginals[:, k] = weights[chosen] @ layouts[chosen]
+
+        ess = weights.sum() ** 2 / np.dot(weights, weights)
+        SapperProfile.count("samples_drawn", drawn)
+        return totals, marginals, float(ess)
+
+    # Половина ширины доверительного интервала для вероятности probability по ess расстановкам (z = 1.96 - 95%)
+    @staticmethod
+    def interval(probability, ess, z=1.96):
+        probability = np.asarray(probability, dtype=float)
+        return z * np.sqrt(probability * (1 - probability) / max(ess, 1.0))
+
+    """
+    Строим size расстановок сразу. В клетке i для каждого числа, в которое она входит, известен остаток бомб
+    и сколько его клеток идет после i: бомбу можно поставить, если остаток >= 1 и остаток - 1 <= клеток после,
+    пустую клетку - если остаток <= клеток после. Вероятность бомбы при выборе - средняя доля остатка.
+    Возвращаем (расстановки bool size x n, логарифмы весов, -inf у тупиковых)
+    """
+
+    def __draw(self, size, n, needed, steps):
+        residual = np.repeat(needed[None, :], size, axis=0)
+        layout = np.zeros((size, n), dtype=bool)
+        log_weight = np.zeros(size)
+
+        for i, (numbers, rest) in enumerate(steps):
+            left = residual[:, numbers]
+            can_empty = (left <= rest).all(axis=1)
+            can_bomb = ((left >= 1) & (left - 1 <= rest)).all(axis=1)
+
+            probability = np.clip((left / (rest + 1)).mean(axis=1), 0.05, 0.95)
+            both = can_empty & can_bomb
+            bomb = np.where(both, self._rng.random(size) < probability, can_bomb)
+
+            log_weight[~(can_empty | can_bomb)] = -np.inf
+            log_weight[both] -= np.where(bomb[both], np.log(probability[both]), np.log1p(-probability[both]))
+            layout[:, i] = bomb
+            residual[:, numbers] -= bomb[:, None]
+
+        return layout, log_weight
+
+    # Для каждой клетки: номера чисел, в которые она входит, и сколько клеток каждого из них идет после нее
+    @staticmethod
+    def __steps(n, constraints):
+        containing = [[] for _ in range(n)]
+        for number, (cells, _) in enumerate(constraints):
+            for rest, cell in enumerate(sorted(cells, reverse=True)):
+                containing[cell].append((number, rest))
+
+        return [(np.array([number for number, _ in near], dtype=np.int64),
+                 np.array([rest for _, rest in near], dtype=np.int16)) for near in containing]
+
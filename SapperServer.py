@@ -0,0 +1,346 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+import numpy as np
+
+from Sapper import SapperEngine
+
+"""
+Модуль SapperServer держит в одном процессе много независимых игр (сессий SapperEngine)
+и принимает команды по TCP в виде JSON, по одному объекту на строку. Ответ - тоже одна строка JSON.
+
+Команды ({"cmd": ..., "session": ..., параметры}):
+new (height, width, bombs, seed) - новая сессия, в ответе ее id
+open, chord (x, y) - в ответе status и cells - только открытые ходом клетки [x, y, число]
+flag (x, y) - в ответе status и cells - [x, y, -1 (флаг) или -2 (закрытая клетка)]
+moves (moves - список [ход, x, y], ход - open, flag, unflag, chord или его код) - пачка ходов за одну команду,
+в ответе status, applied - кол-во сделанных ходов и cells - изменившиеся клетки [x, y, значение]
+state - состояние игры целиком, save/load (name) - сохранение в папку сервера и загрузка в новую сессию,
+close - завершить сессию, stats - статистика сервера
+Ошибки возвращаются как {"ok": false, "error": текст}.
+
+Сессии без ходов дольше idle секунд выгружаются на диск в формате сохранения (.sap)
+и загружаются обратно при следующей команде. Статус игры и состояние генератора поля, которых нет
+в сохранении, пишутся рядом в JSON, поэтому проигранная игра остается проигранной,
+а игра с зерном без ходов получает то же поле.
+"""
+
+
+class SapperServer:
+    # Имя сохранения: только буквы, цифры, _ и -
+    __NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+    """
+    folder - папка для выгруженных сессий и сохранений
+    idle - через сколько секунд без команд сессия выгружается на диск
+    """
+
+    def __init__(self, folder="sessions", idle=300.0):
+        if idle <= 0:
+            raise ValueError(f"Not correct idle: {idle}. Idle should be > 0!")
+
+        self._folder = folder
+        self._idle = idle
+        # id сессии -> [SapperEngine, ширина поля, время последней команды]
+        self._sessions = {}
+        self._evicted = 0
+        self._restored = 0
+        self._commands = 0
+        self._server = None
+        self._evict_task = None
+        # Задачи открытых соединений
+        self._handlers = set()
+        os.makedirs(folder, exist_ok=True)
+
+    # Запускаем сервер на host:port (port=0 - любой свободный), возвращаем фактический порт
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self.__handle, host, port)
+        self._evict_task = asyncio.get_running_loop().create_task(self.__evict_loop())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    # Останавливаем сервер, даем соединениям секунду на завершение и выгружаем все сессии на диск
+    async def stop(self):
+        self._server.close()
+        self._evict_task.cancel()
+        if self._handlers:
+            _, pending = await asyncio.wait(self._handlers, timeout=1.0)
+            for task in pending:
+                task.cancel()
+        await self._server.wait_closed()
+        for session in list(self._sessions):
+            self.__evict(session)
+
+    # Выполняем одну команду request (dict), возвращаем ответ (dict)
+    def execute(self, request):
+        self._commands += 1
+        # OverflowError - числа в запросе не помещаются в int64 (ходы moves) или бесконечны
+        try:
+            return self.__execute(request)
+        except (ValueError, KeyError, TypeError, OverflowError, OSError) as error:
+            return {"ok": False, "error": f"{type(error).__name__}: {error}"}
+
+    def __execute(self, request):
+        cmd = request["cmd"]
+        if cmd == "new":
+            engine = SapperEngine(seed=request.get("seed"))
+            engine.new_game(int(request["height"]), int(request["width"]), int(request["bombs"]))
+            session = uuid.uuid4().hex
+            self._sessions[session] = [engine, int(request["width"]), time.monotonic()]
+            return {"ok": True, "session": session, "status": SapperEngine.PLAYING}
+        if cmd == "load":
+            engine = SapperEngine()
+            state = engine.load(self.__path(request["name"]))
+            session = uuid.uuid4().hex
+            self._sessions[session] = [engine, state["width"], time.monotonic()]
+            return {"ok": True, "session": session, "status": state["status"]}
+        if cmd == "stats":
+            return {"ok": True, "sessions": len(self._sessions), "evicted": self._evicted,
+                    "restored": self._restored, "commands": self._commands, "cpu": time.process_time()}
+
+        session = request["session"]
+        engine, width = self.__session(session)
+        if cmd == "open" or cmd == "chord":
+            x, y = int(request["x"]), int(request["y"])
+            result = engine.open(x, y) if cmd == "open" else engine.chord(x, y)
+            rows, cols = np.divmod(result["revealed"], width)
+            cells = np.stack([rows, cols, result["values"]], axis=1)
+            return {"ok": True, "status": result["status"], "cells": cells.tolist()}
+        if cmd == "flag":
+            x, y = int(request["x"]), int(request["y"])
+            result = engine.flag(x, y)
+            # На открытую клетку флаг не ставится, и видимое поле не меняется
+            cells = [] if engine._board.is_revealed(x, y) else [[x, y, -1 if result["flagged"] else -2]]
+            return {"ok": True, "status": result["status"], "cells": cells}
+        if cmd == "moves":
+            moves = [(SapperServer.__move(op), int(x), int(y)) for op, x, y in request["moves"]]
+            result = engine.apply(moves)
+            cells = np.stack([result["rows"], result["cols"], result["values"]], axis=1)
+            return {"ok": True, "status": result["status"], "applied": result["applied"], "cells": cells.tolist()}
+        if cmd == "state":
+            state = engine.state()
+            state["field"] = state["field"].tolist()
+            return {"ok": True, **state}
+        if cmd == "save":
+            engine.save(self.__path(request["name"]))
+            return {"ok": True}
+        if cmd == "close":
+            del self._sessions[session]
+            return {"ok": True}
+
+        raise ValueError(f"Not correct cmd: {cmd}. Cmd should be one of new, open, flag, chord, moves, state, "
+                         f"save, load, close, stats!")
+
+    # Сессия по id: из памяти или с диска, если она была выгружена
+    def __session(self, session):
+        if session not in self._sessions:
+            path = os.path.join(self._folder, f"session-{session}")
+            if not re.fullmatch(r"[0-9a-f]{32}", str(session)) or not os.path.exists(path + ".sap"):
+                raise KeyError(f"Not correct session: {session}. Session should be created by new or load!")
+
+            engine = SapperEngine()
+            state = engine.load(path)
+            with open(path + ".json") as file:
+                extra = json.load(file)
+            engine._rng.bit_generator.state = extra["rng"]
+            if extra["status"] == SapperEngine.LOST:
+                engine._status = SapperEngine.LOST
+            os.remove(path + ".sap")
+            os.remove(path + ".json")
+            self._sessions[session] = [engine, state["width"], 0.0]
+            self._restored += 1
+
+        entry = self._sessions[session]
+        entry[2] = time.monotonic()
+        return entry[0], entry[1]
+
+    # Код хода по имени (open, flag, unflag, chord) или коду
+    @staticmethod
+    def __move(op):
+        if not isinstance(op, str):
+            return int(op)
+        if op not in SapperEngine.MOVES:
+            raise ValueError(f"Not correct move: {op}. Move should be one of {SapperEngine.MOVES}!")
+        return SapperEngine.MOVES.index(op)
+
+    # Путь к сохранению name в папке сервера без расширения
+    def __path(self, name):
+        if not SapperServer.__NAME.fullmatch(str(name)):
+            raise ValueError(f"Not correct name: {name}. Name should contain only letters, digits, _ and -!")
+        return os.path.join(self._folder, name)
+
+    # Выгружаем сессию на диск: сохранение и JSON со статусом и состоянием генератора поля
+    def __evict(self, session):
+        engine = self._sessions.pop(session)[0]
+        path = os.path.join(self._folder, f"session-{session}")
+        with open(path + ".json", "w") as file:
+            json.dump({"status": engine._status, "rng": engine._rng.bit_generator.state}, file)
+        engine.save(path)
+        self._evicted += 1
+
+    # Раз в четверть idle выгружаем сессии без команд дольше idle секунд
+    async def __evict_loop(self):
+        while True:
+            await asyncio.sleep(self._idle / 4)
+            deadline = time.monotonic() - self._idle
+            for session in [session for session, entry in self._sessions.items() if entry[2] < deadline]:
+                self.__evict(session)
+
+    # Соединение клиента: читаем строки с командами и отвечаем на каждую
+    async def __handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    response = self.execute(request) if isinstance(request, dict) \
+                        else {"ok": False, "error": "Request should be a JSON object!"}
+                except json.JSONDecodeError as error:
+                    response = {"ok": False, "error": f"JSONDecodeError: {error}"}
+
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+
+"""
+Генератор нагрузки: sessions игр height x width с bombs бомбами по connections соединениям.
+Каждая игра делает moves ходов (открывает случайные закрытые клетки, после конца игры - новая игра).
+Возвращаем словарь: p50/p99 задержки хода в мс, ходов в секунду
+и sessions_per_core - сколько таких сессий выдержит одно ядро сервера (по его процессорному времени)
+"""
+
+
+async def run_load(host, port, sessions=1000, moves=20, connections=50, height=16, width=16, bombs=40, seed=0):
+    rng = np.random.default_rng(seed)
+    latencies = []
+
+    # Отправляем команду и ждем ответ, задержку запоминаем только для ходов
+    async def call(reader, writer, request):
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        if request["cmd"] == "open":
+            latencies.append(time.perf_counter() - start)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response
+
+    # Одно соединение по очереди ходит в своих сессиях
+    async def client(count):
+        reader, writer = await asyncio.open_connection(host, port)
+        games = []
+        for _ in range(count):
+            response = await call(reader, writer, {"cmd": "new", "height": height, "width": width, "bombs": bombs,
+                                                   "seed": int(rng.integers(1 << 31))})
+            games.append([response["session"], np.zeros(height * width, dtype=bool)])
+
+        for _ in range(moves):
+            for game in games:
+                closed = np.flatnonzero(~game[1])
+                x, y = divmod(int(closed[rng.integers(closed.size)]), width)
+                response = await call(reader, writer, {"cmd": "open", "session": game[0], "x": x, "y": y})
+                for row, col, _ in response["cells"]:
+                    game[1][row * width + col] = True
+                if response["status"] != SapperEngine.PLAYING:
+                    await call(reader, writer, {"cmd": "close", "session": game[0]})
+                    response = await call(reader, writer, {"cmd": "new", "height": height, "width": width,
+                                                           "bombs": bombs, "seed": int(rng.integers(1 << 31))})
+                    game[0], game[1] = response["session"], np.zeros(height * width, dtype=bool)
+
+        for game in games:
+            await call(reader, writer, {"cmd": "close", "session": game[0]})
+        writer.close()
+        await writer.wait_closed()
+
+    async def stats():
+        reader, writer = await asyncio.open_connection(host, port)
+        response = await call(reader, writer, {"cmd": "stats"})
+        writer.close()
+        await writer.wait_closed()
+        return response
+
+    before = await stats()
+    start = time.perf_counter()
+    connections = max(min(connections, sessions), 1)
+    await asyncio.gather(*[client(sessions // connections + (index < sessions % connections))
+                           for index in range(connections)])
+    seconds = time.perf_counter() - start
+    after = await stats()
+
+    latencies = np.array(latencies) * 1000
+    cpu = after["cpu"] - before["cpu"]
+    return {
+        "sessions": sessions,
+        "connections": connections,
+        "moves": int(latencies.size),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "moves_per_second": latencies.size / seconds if seconds else 0.0,
+        "server_cpu_seconds": cpu,
+        "sessions_per_core": sessions * seconds / cpu if cpu else 0.0,
+        "seconds": seconds,
+    }
+
+
+# Генератор нагрузки против сервера, запущенного в этом же процессе (процессорное время сервера включает клиента)
+async def run_local_load(folder="sessions", idle=300.0, **params):
+    server = SapperServer(folder, idle)
+    port = await server.start()
+    try:
+        return await run_load("127.0.0.1", port, **params)
+    finally:
+        await server.stop()
+
+
+async def serve(host, port, folder, idle):
+    server = SapperServer(folder, idle)
+    port = await server.start(host, port)
+    print(f"Сервер сапера слушает {host}:{port}")
+    await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сервер сапера с JSON-протоколом и генератор нагрузки")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="запустить сервер")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--folder", default="sessions", help="папка для выгруженных сессий")
+    serve_parser.add_argument("--idle", type=float, default=300.0, help="секунд до выгрузки сессии")
+
+    load_parser = commands.add_parser("load", help="генератор нагрузки")
+    load_parser.add_argument("--host", default="127.0.0.1")
+    load_parser.add_argument("--port", type=int, default=None, help="порт сервера (нет - сервер в этом процессе)")
+    load_parser.add_argument("--sessions", type=int, default=1000)
+    load_parser.add_argument("--moves", type=int, default=20, help="ходов в каждой сессии")
+    load_parser.add_argument("--connections", type=int, default=50)
+    load_parser.add_argument("--size", type=int, nargs=3, default=(16, 16, 40), metavar=("HEIGHT", "WIDTH", "BOMBS"))
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, args.folder, args.idle))
+    else:
+        params = dict(sessions=args.sessions, moves=args.moves, connections=args.connections,
+                      height=args.size[0], width=args.size[1], bombs=args.size[2])
+        if args.port is None:
+            result = asyncio.run(run_local_load(**params))
+        else:
+            result = asyncio.run(run_load(args.host, args.port, **params))
+        print(json.dumps(result, indent=2))
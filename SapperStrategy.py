@@ -0,0 +1,158 @@
+from collections import defaultdict
+import numpy as np
+
+"""
+Модуль SapperStrategy - стратегии решателя SapperSolver: первый ход, ход, когда простые выводы
+по числам и кэш участков ничего не дали, и выбор клетки для угадывания.
+Стратегии регистрируются по имени (SapperStrategy.register) и создаются по нему (SapperStrategy.create),
+поэтому решатель и турнир (SapperTournament) принимают имя стратегии.
+Стратегия читает состояние решателя через его методы _probabilities, _frontier, _flags_near,
+_random_free_cell, _free_cells и best_opening и возвращает клетки (x, y); сами ходы делает решатель.
+До и после каждого хода решатель вызывает before_step и after_decision, чтобы стратегия могла наблюдать ходы.
+"""
+
+
+class SapperStrategy:
+    # Вероятности ближе к 0 или 1, чем EPS, считаем точными
+    EPS = 1e-9
+    # Имя стратегии в реестре
+    name = None
+
+    __registry = {}
+
+    # Декоратор класса стратегии: регистрируем ее под именем name
+    @staticmethod
+    def register(name):
+        def decorator(cls):
+            cls.name = name
+            SapperStrategy.__registry[name] = cls
+            return cls
+
+        return decorator
+
+    # Имена зарегистрированных стратегий
+    @staticmethod
+    def names():
+        return tuple(SapperStrategy.__registry)
+
+    # Стратегия по имени name; экземпляр стратегии возвращается как есть
+    @staticmethod
+    def create(strategy):
+        if isinstance(strategy, SapperStrategy):
+            return strategy
+        if strategy not in SapperStrategy.__registry:
+            raise ValueError(f"Not correct strategy: {strategy}. "
+                             f"Strategy should be one of {SapperStrategy.names()}!")
+        return SapperStrategy.__registry[strategy]()
+
+    """
+    Первый ход: лучшая клетка из кэша статистики первого хода решателя (SapperOpenings), а без нее -
+    случайная клетка (из генератора решателя, поэтому одно зерно - одно поле и один ход)
+    """
+
+    def first_move(self, solver):
+        cell = solver.best_opening()
+        if cell is not None:
+            return cell
+        x = int(solver._rng.integers(solver._height))
+        y = int(solver._rng.integers(solver._width))
+        return x, y
+
+    # Перед каждым ходом решателя после первого, пока ничего не изменилось (по умолчанию - ничего не делаем)
+    def before_step(self, solver):
+        pass
+
+    """
+    Ход выбран и, кроме хода стратегии, уже сделан (по умолчанию - ничего не делаем)
+    source - чем выбран ход: SapperSolver.DEDUCE, PATTERNS или STRATEGY
+    """
+
+    def after_decision(self, solver, source):
+        pass
+
+    """
+    Ход, когда простые выводы не сработали
+    Возвращаем (клетки (x, y), которые открыть, клетки, на которые поставить флаг)
+    """
+
+    def next_action(self, solver):
+        raise NotImplementedError
+
+    """
+    Клетка для угадывания, когда ни одна клетка не определена точно
+    cells, probabilities, free, free_probability - как у SapperProbability.solve
+    Возвращаем индекс клетки x * width + y
+    """
+
+    def guess(self, solver, cells, probabilities, free, free_probability):
+        raise NotImplementedError
+
+
+"""
+Стратегия по точным вероятностям бомб на границе (SapperProbability): открываем клетки без бомб
+и отмечаем бомбы, а если таких нет - открываем клетку с наименьшей вероятностью бомбы
+"""
+
+
+@SapperStrategy.register("probability")
+class ProbabilityStrategy(SapperStrategy):
+    def next_action(self, solver):
+        return self._decide(solver, *solver._probabilities())
+
+    """
+    Ход по уже посчитанным вероятностям (как у SapperSolver._probabilities)
+    Открываем и отмечаем только клетки с точными вероятностями (exact), оценки выборки идут только в guess
+    """
+
+    def _decide(self, solver, cells, probabilities, free, free_probability, exact):
+        width = solver._width
+        safe = cells[exact & (probabilities <= SapperStrategy.EPS)]
+        bombs = cells[exact & (probabilities >= 1 - SapperStrategy.EPS)]
+        if free and exact.all() and free_probability <= SapperStrategy.EPS:
+            safe = np.concatenate([safe, solver._free_cells(cells)])
+
+        if safe.size or bombs.size:
+            return [divmod(int(cell), width) for cell in safe], [divmod(int(cell), width) for cell in bombs]
+
+        cell = self.guess(solver, cells, probabilities, free, free_probability)
+        return [divmod(int(cell), width)], []
+
+    # Клетка рядом с числами с наименьшей вероятностью или любая из остальных клеток
+    def guess(self, solver, cells, probabilities, free, free_probability):
+        if cells.size and (free == 0 or probabilities.min() <= free_probability):
+            return cells[np.argmin(probabilities)]
+        return solver._random_free_cell(cells)
+
+
+"""
+Прежняя эвристика решателя без перебора: у каждой закрытой клетки рядом с числами оценка -
+сумма неотмеченных бомб соседних чисел, деленная на кол-во этих чисел. Открываем клетку с наименьшей оценкой
+Быстрее точных вероятностей, но чаще ошибается
+"""
+
+
+@SapperStrategy.register("local")
+class LocalStrategy(SapperStrategy):
+    def next_action(self, solver):
+        width = solver._width
+        return [divmod(int(self.guess(solver, np.zeros(0, dtype=np.int64), None, None, None)), width)], []
+
+    # Оценки считаем по числам границы, cells и вероятности не нужны
+    def guess(self, solver, cells, probabilities, free, free_probability):
+        board = solver._board
+        width = solver._width
+        sums = defaultdict(int)
+        counts = defaultdict(int)
+
+        for number in solver._frontier():
+            x, y = divmod(number, width)
+            needed = board.count(x, y) - solver._flags_near(number)
+            for shift in board.neighbours.flat_shifts(x, y):
+                near = number + shift
+                if shift != 0 and board.is_closed(*divmod(near, width)):
+                    sums[near] += needed
+                    counts[near] += 1
+
+        if not sums:
+            return solver._random_free_cell(cells)
+        return min(sums, key=lambda cell: (sums[cell] / counts[cell], cell))
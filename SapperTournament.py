@@ -0,0 +1,134 @@
+import argparse
+import json
+import math
+import time
+
+from tabulate import tabulate
+
+from Sapper import SapperSolver
+from SapperBatch import map_tasks
+from SapperStrategy import SapperStrategy
+
+"""
+Модуль SapperTournament сравнивает стратегии решателя (SapperStrategy): каждая стратегия играет
+на одних и тех же полях (игра задается зерном seed), игры раздаются пачками по процессам.
+Для стратегии считаются доля побед с 95% доверительным интервалом (Уилсона), среднее время решения
+(время игры, деленное на ходы решателя) и игры в секунду. Если задана целевая доля побед,
+выбирается самая быстрая стратегия, у которой нижняя граница интервала не меньше цели.
+"""
+
+
+"""
+Стратегия strategy играет игры с зернами seeds
+Возвращаем (имя стратегии, кол-во игр, побед, ходов решателя, секунд в играх)
+"""
+
+
+def play_strategy(strategy, height, width, bombs, seeds):
+    games, wins, steps, seconds = 0, 0, 0, 0.0
+
+    for seed in seeds:
+        start = time.perf_counter()
+        is_win, count_steps = SapperSolver(seed, verbose=False, strategy=strategy).play(height, width, bombs)
+        seconds += time.perf_counter() - start
+        games += 1
+        wins += is_win
+        steps += count_steps
+
+    return strategy, games, wins, steps, seconds
+
+
+# Доверительный интервал Уилсона для доли побед wins из games (z = 1.96 - 95%)
+def wilson(wins, games, z=1.96):
+    if games == 0:
+        return 0.0, 1.0
+    rate = wins / games
+    center = (rate + z * z / (2 * games)) / (1 + z * z / games)
+    half = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(center - half, 0.0), min(center + half, 1.0)
+
+
+"""
+Играем каждой стратегией из strategies (None - все зарегистрированные) по игре на каждое зерно из seeds
+на поле height x width с bombs бомбами
+workers - кол-во процессов (None - по числу ядер, 1 - в текущем процессе)
+chunk - кол-во игр, которое процесс получает за раз
+target - целевая доля побед для выбора стратегии (None - не выбираем)
+Возвращаем словарь: статистика по стратегиям и best - выбранная стратегия (None, если цель не достигнута)
+"""
+
+
+def run_tournament(height, width, bombs, strategies=None, seeds=range(200), workers=None, chunk=50, target=None):
+    if chunk < 1:
+        raise ValueError(f"Not correct chunk: {chunk}. Chunk should be >= 1!")
+
+    strategies = SapperStrategy.names() if strategies is None else tuple(strategies)
+    for strategy in strategies:
+        SapperStrategy.create(strategy)
+
+    seeds = list(seeds)
+    tasks = [(strategy, height, width, bombs, seeds[i:i + chunk])
+             for strategy in strategies for i in range(0, len(seeds), chunk)]
+    start = time.perf_counter()
+    results = list(map_tasks(play_strategy, tasks, workers))
+
+    totals = {strategy: [0, 0, 0, 0.0] for strategy in strategies}
+    for strategy, *result in results:
+        for index, value in enumerate(result):
+            totals[strategy][index] += value
+
+    stats = {}
+    for strategy, (games, wins, steps, seconds) in totals.items():
+        low, high = wilson(wins, games)
+        stats[strategy] = {
+            "games": games,
+            "wins": wins,
+            "win_rate": wins / games if games else 0.0,
+            "win_rate_low": low,
+            "win_rate_high": high,
+            "decision_ms": seconds / steps * 1e3 if steps else 0.0,
+            "games_per_second": games / seconds if seconds else 0.0,
+        }
+
+    best = None
+    if target is not None:
+        passed = [strategy for strategy in strategies if stats[strategy]["win_rate_low"] >= target]
+        if passed:
+            best = max(passed, key=lambda strategy: stats[strategy]["games_per_second"])
+
+    return {"height": height, "width": width, "bombs": bombs, "seconds": time.perf_counter() - start,
+            "target": target, "best": best, "strategies": stats}
+
+
+# Таблица результатов турнира
+def table(report):
+    rows = [[strategy, stats["games"], f"{stats['win_rate']:.3f}",
+             f"[{stats['win_rate_low']:.3f}; {stats['win_rate_high']:.3f}]",
+             f"{stats['decision_ms']:.3f}", f"{stats['games_per_second']:.1f}"]
+            for strategy, stats in report["strategies"].items()]
+    return tabulate(rows, headers=["strategy", "games", "win rate", "95% interval", "decision ms", "games/s"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Турнир стратегий решателя сапера")
+    parser.add_argument("height", type=int)
+    parser.add_argument("width", type=int)
+    parser.add_argument("bombs", type=int)
+    parser.add_argument("--strategies", nargs="+", default=None, help="стратегии (по умолчанию все)")
+    parser.add_argument("--games", type=int, default=200, help="кол-во игр каждой стратегии")
+    parser.add_argument("--first-seed", type=int, default=0, help="зерно первой игры")
+    parser.add_argument("--workers", type=int, default=None, help="кол-во процессов")
+    parser.add_argument("--chunk", type=int, default=50, help="игр на одну задачу процесса")
+    parser.add_argument("--target", type=float, default=None, help="целевая доля побед")
+    parser.add_argument("--json", default=None, help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    tournament = run_tournament(args.height, args.width, args.bombs, args.strategies,
+                                range(args.first_seed, args.first_seed + args.games),
+                                args.workers, args.chunk, args.target)
+    print(table(tournament))
+    if args.target is not None:
+        print(f"Лучшая стратегия: {tournament['best']}")
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(tournament, file, indent=2)
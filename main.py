@@ -1,3 +1,15 @@
+import argparse
+
 from Sapper import SapperUserSolver
+from SapperCatalog import SapperCatalog
+
+parser = argparse.ArgumentParser(description="Сапер в консоли")
+parser.add_argument("--catalog", default=None,
+                    help="файл каталога сохранений SQLite (по умолчанию игры сохраняются файлами НАЗВАНИЕ.sap)")
+args = parser.parse_args()
 
-SapperUserSolver().start_play()
+if args.catalog is None:
+    SapperUserSolver().start_play()
+else:
+    with SapperCatalog(args.catalog) as catalog:
+        SapperUserSolver(catalog=catalog).start_play()
@@ -0,0 +1,27 @@
+import pytest
+
+from Sapper import SapperSolver
+from SapperBatch import map_tasks, run_batch
+
+
+# Пачка игр в одном процессе и в пуле процессов дает одинаковый результат
+def test_batch_workers_agree():
+    single = run_batch(9, 9, 10, seeds=range(20), workers=1, chunk=5)
+    pooled = run_batch(9, 9, 10, seeds=range(20), workers=2, chunk=5)
+    for field in ("games", "wins", "win_rate", "moves_per_game"):
+        assert single[field] == pooled[field]
+
+
+# Пачка игр считает те же победы, что и игры по одной
+def test_batch_matches_single_games():
+    wins = sum(SapperSolver(seed, verbose=False).play(9, 9, 10)[0] for seed in range(10))
+    assert run_batch(9, 9, 10, seeds=range(10), workers=1)["wins"] == wins
+
+
+# Результаты пула идут в порядке задач, workers проверяется сразу при вызове
+def test_map_tasks():
+    tasks = [(value, 3) for value in range(10)]
+    assert list(map_tasks(pow, tasks, 1)) == list(map_tasks(pow, tasks, 2)) == [value ** 3 for value in range(10)]
+    assert list(map_tasks(pow, [], 2)) == []
+    with pytest.raises(ValueError):
+        map_tasks(pow, tasks, 0)
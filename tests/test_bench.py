@@ -0,0 +1,23 @@
+import json
+import os
+
+from SapperBench import QUICK_SIZES, compare, key
+
+BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench_baseline.json")
+
+
+# Базовый замер бенчмарка лежит в репозитории, покрывает быстрый набор и не регрессирует сам с собой
+def test_bench_baseline():
+    with open(BASELINE) as file:
+        baseline = json.load(file)["results"]
+    assert set(QUICK_SIZES) <= {(result["height"], result["width"]) for result in baseline.values()}
+    assert all(key(result) == name for name, result in baseline.items())
+    assert compare({name: dict(result) for name, result in baseline.items()}, baseline) == []
+
+
+# Замедление больше порога и min_delta считается регрессией
+def test_bench_compare_flags_slowdown():
+    with open(BASELINE) as file:
+        baseline = json.load(file)["results"]
+    slower = {name: dict(result, median=result["median"] * 2 + 0.001) for name, result in baseline.items()}
+    assert sorted(compare(slower, baseline)) == sorted(baseline)
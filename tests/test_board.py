@@ -0,0 +1,110 @@
+import os
+from collections import deque
+
+import numpy as np
+import pytest
+
+from Sapper import SapperEngine
+from SapperBoard import BitMask, SapperBoard
+
+
+# Открытые клетки после открытия (x, y) обходом в ширину по числам counts
+def reference_open(counts, x, y):
+    height, width = counts.shape
+    opened = np.zeros((height, width), dtype=bool)
+    opened[x, y] = True
+    queue = deque([(x, y)] if counts[x, y] == 0 else [])
+    seen = {(x, y)}
+    while queue:
+        i, j = queue.popleft()
+        for a in range(max(i - 1, 0), min(i + 2, height)):
+            for b in range(max(j - 1, 0), min(j + 2, width)):
+                opened[a, b] = True
+                if counts[a, b] == 0 and (a, b) not in seen:
+                    seen.add((a, b))
+                    queue.append((a, b))
+    return opened
+
+
+# Поле height x width со случайными bombs бомбами
+def random_board(rng, height, width, bombs):
+    board = SapperBoard(height, width)
+    layout = np.zeros(height * width, dtype=bool)
+    layout[rng.choice(height * width, bombs, replace=False)] = True
+    board.set_bombs(layout.reshape(height, width))
+    return board
+
+
+# Заливка нулей совпадает с обходом в ширину, снимает флаги и не открывает клетку дважды
+@pytest.mark.parametrize("seed", range(50))
+def test_flood_fill_matches_bfs(seed):
+    rng = np.random.default_rng(seed)
+    height, width = (int(side) for side in rng.integers(2, 40, 2))
+    board = random_board(rng, height, width, int(rng.integers(0, height * width // 4 + 1)))
+    zero_cells = np.argwhere(board.counts == 0)
+    if not len(zero_cells):
+        pytest.skip("no zeros on the board")
+
+    x, y = (int(side) for side in zero_cells[rng.integers(len(zero_cells))])
+    safe = np.argwhere(board.counts != SapperBoard.BOMB)[0]
+    board.flags.set(*safe)
+    zeros = BitMask(height, width)
+    board.reveal(x, y)
+    opened = board.flood_fill(x, y, zeros)
+
+    expected = reference_open(board.counts, x, y)
+    assert np.array_equal(board.revealed.to_array(), expected)
+    assert not (board.flags.to_array() & expected).any()
+    assert np.unique(opened).size == opened.size
+    # Повторная заливка той же области ничего не открывает
+    assert board.flood_fill(x, y, zeros).size == 0
+
+
+# Открытие на поле из плиток совпадает с обходом в ширину по его числам
+@pytest.mark.parametrize("seed", range(6))
+def test_chunked_open_matches_bfs(seed):
+    rng = np.random.default_rng(seed)
+    height, width = (int(side) for side in rng.integers(20, 60, 2))
+    engine = SapperEngine(height, width, int(height * width * 0.08) + 1, seed=seed, tile=16)
+    x, y = int(rng.integers(height)), int(rng.integers(width))
+    result = engine.open(x, y)
+
+    board = engine._board
+    counts = np.array([[board.count(i, j) for j in range(width)] for i in range(height)])
+    expected = reference_open(counts, x, y)
+    assert np.array_equal(board.revealed.window(0, height, 0, width), expected)
+    assert np.unique(result["revealed"]).size == result["revealed"].size == expected.sum()
+
+    # Закрытые клетки затронутых плиток - все закрытые клетки этих плиток
+    closed = board.closed_cells()
+    tiles = {(cell // width // 16, cell % width // 16) for cell in np.flatnonzero(expected)}
+    rows, cols = np.nonzero(~expected)
+    assert sorted(closed.tolist()) == sorted(int(i * width + j) for i, j in zip(rows, cols)
+                                             if (i // 16, j // 16) in tiles)
+
+
+# Сохранение читается обратно, файл после чтения не остается отображенным в память, обрезанный файл отклоняется
+@pytest.mark.parametrize("tile", [None, 16])
+def test_read_round_trip_releases_file(tmp_path, tile):
+    engine = SapperEngine(40, 40, 150, seed=2, tile=tile)
+    engine.open(20, 20)
+    engine.flag(*next((x, y) for x in range(40) for y in range(40) if engine._board.is_closed(x, y)))
+    path = str(tmp_path / "game")
+    engine.save(path)
+
+    for _ in range(3):
+        board, bombs, count_move, _ = SapperBoard.read(path + ".sap")
+    assert (bombs, count_move) == (150, engine.state()["opened"])
+    assert np.array_equal(board.visible_codes(0, 40, 0, 40), engine._board.visible_codes(0, 40, 0, 40))
+
+    with open(path + ".sap", "rb") as file:
+        data = file.read()
+    with open(path + ".sap", "wb") as file:
+        file.write(data[:-3])
+    with pytest.raises(ValueError) as error:
+        SapperBoard.read(path + ".sap")
+    # Ошибка держит кадры чтения, но не файл
+    if os.path.exists("/proc/self/maps"):
+        with open("/proc/self/maps") as maps:
+            assert path not in maps.read()
+    assert error.value is not None
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from Sapper import SapperEngine
+
+
+# Пачка ходов apply дает то же поле, что и те же ходы по одному
+def test_apply_matches_single_moves():
+    moves = [(SapperEngine.OPEN, 15, 15), (SapperEngine.FLAG, 0, 0), (SapperEngine.FLAG, 0, 0),
+             (SapperEngine.FLAG, 1, 1), (SapperEngine.CHORD, 15, 15), (SapperEngine.UNFLAG, 1, 1),
+             (SapperEngine.OPEN, 3, 3)]
+    batch = SapperEngine(30, 30, 100, seed=5)
+    single = SapperEngine(30, 30, 100, seed=5)
+    result = batch.apply(moves)
+
+    for op, x, y in moves:
+        if single.state()["status"] != SapperEngine.PLAYING:
+            break
+        if op == SapperEngine.OPEN:
+            single.open(x, y)
+        elif op == SapperEngine.CHORD:
+            single.chord(x, y)
+        elif (op == SapperEngine.FLAG) != single._board.is_flagged(x, y):
+            single.flag(x, y)
+
+    field = batch.state()["field"]
+    assert np.array_equal(field, single.state()["field"])
+    assert result["status"] == single.state()["status"]
+    assert all(field[x, y] == value for x, y, value in zip(result["rows"], result["cols"], result["values"]))
+
+
+# Пустая пачка ничего не меняет, неизвестный ход отклоняется целиком
+def test_apply_rejects_bad_moves():
+    engine = SapperEngine(9, 9, 10, seed=1)
+    assert engine.apply(np.zeros((0, 3), dtype=np.int64))["rows"].size == 0
+    with pytest.raises(ValueError):
+        engine.apply([(SapperEngine.OPEN, 4, 4), (7, 0, 0)])
+    assert engine.state()["opened"] == 0
+
+
+# Открываем первую бомбу поля после первого хода
+def lose(engine):
+    engine.open(0, 0)
+    engine.open(*next((x, y) for x in range(engine._height) for y in range(engine._width)
+                      if engine._board.is_bomb(x, y)))
+    assert engine.state()["status"] == SapperEngine.LOST
+
+
+# После загрузки сохранения статус проигранной игры сбрасывается
+def test_load_resets_lost_status(tmp_path):
+    saved = SapperEngine(9, 9, 10, seed=3)
+    saved.open(0, 0)
+    saved.save(str(tmp_path / "game"))
+
+    engine = SapperEngine(9, 9, 10, seed=4)
+    lose(engine)
+    assert engine.load(str(tmp_path / "game"))["status"] == SapperEngine.PLAYING
+    engine.open(*next((x, y) for x in range(9) for y in range(9)
+                      if not engine._board.is_bomb(x, y) and engine._board.is_closed(x, y)))
@@ -0,0 +1,52 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from Sapper import SapperSolver
+from SapperExport import export_games
+from SapperProbability import SapperProbability
+from SapperStrategy import ProbabilityStrategy
+
+
+# Стратегия по вероятностям, которая только запоминает видимое поле перед каждым ходом
+class _Observer(ProbabilityStrategy):
+    def __init__(self):
+        self.fields = []
+
+    def before_step(self, solver):
+        self.fields.append(solver._board.visible_codes())
+
+
+# Записанная игра ход в ход совпадает с игрой решателя без записи, в том числе с выборкой вместо перебора
+@pytest.mark.parametrize("limit", [None, 6])
+def test_exported_games_match_plain_play(tmp_path, monkeypatch, limit):
+    if limit is not None:
+        enumerate_states = SapperProbability._enumerate_states
+        monkeypatch.setattr(SapperProbability, "_enumerate_states", staticmethod(
+            lambda max_states, n, constraints: None if n > limit else enumerate_states(max_states, n, constraints)))
+
+    seeds = range(4)
+    export_games(str(tmp_path), 16, 30, 99, seeds, shard=64)
+    shards = [np.load(path) for path in sorted(glob.glob(os.path.join(str(tmp_path), "*.npz")))]
+    visible = np.concatenate([shard["visible"] for shard in shards])
+    probability = np.concatenate([shard["probability"] for shard in shards])
+    bombs = np.concatenate([shard["bombs"] for shard in shards])
+    source = np.concatenate([shard["source"] for shard in shards])
+    game = np.concatenate([shard["game"] for shard in shards])
+
+    for seed in seeds:
+        observer = _Observer()
+        SapperSolver(seed, verbose=False, strategy=observer).play(16, 30, 99)
+        recorded = visible[game == seed]
+        assert len(recorded) == len(observer.fields)
+        assert all(np.array_equal(a, b) for a, b in zip(recorded, observer.fields))
+
+    # Определенные ходом клетки в плоскости вероятностей совпадают с бомбами
+    closed = visible == -2
+    known = closed & ~np.isnan(probability)
+    certain = known & (source[:, None, None] != SapperSolver.STRATEGY)
+    assert certain.any()
+    assert np.array_equal(probability[certain] == 1, bombs[certain])
+    assert not np.isnan(probability[source == SapperSolver.STRATEGY]).any()
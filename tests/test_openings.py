@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from SapperGenerator import generate_boards
+from SapperOpenings import SapperOpenings, cascade_sizes
+from test_board import reference_open
+
+
+# Размеры каскадов пачки полей совпадают с обходом в ширину
+@pytest.mark.parametrize("height, width, bombs", [(9, 9, 10), (16, 30, 99), (20, 20, 30)])
+def test_cascade_sizes_match_bfs(height, width, bombs):
+    counts, mask = generate_boards(height, width, bombs, 5, None, np.random.default_rng(1))
+    sizes = cascade_sizes(counts)
+    for k in range(counts.shape[0]):
+        for x in range(height):
+            for y in range(width):
+                expected = 0 if mask[k, x, y] else reference_open(counts[k], x, y).sum()
+                assert sizes[k, x, y] == expected
+
+
+# Кэш отдает записанную статистику и лучшую клетку и хранит не больше capacity конфигураций
+def test_openings_cache(tmp_path):
+    cache = SapperOpenings(str(tmp_path), capacity=2)
+    zero = np.zeros((4, 5), dtype=np.float32)
+    zero[2, 3] = 0.5
+    cache.put(4, 5, 3, zero, np.ones((4, 5)), 10)
+    cache.compute(5, 5, 3, samples=50, seed=1)
+    assert cache.best(4, 5, 3) == (2, 3)
+    assert cache.get(4, 5, 3)["samples"] == 10
+
+    cache.compute(6, 6, 4, samples=50, seed=1)
+    assert len(cache) == 2
+    assert (6, 6, 4) in cache
+    # Вытеснена конфигурация, к которой дольше всего не обращались
+    assert cache.keys() == [(4, 5, 3), (6, 6, 4)]
+
+
+def test_openings_lookup_does_not_touch_files(tmp_path):
+    cache = SapperOpenings(str(tmp_path), capacity=2)
+    cache.put(4, 5, 3, np.zeros((4, 5), dtype=np.float32), np.ones((4, 5)), 10)
+    path = next(tmp_path.iterdir())
+    os.utime(path, (1, 1))
+
+    assert cache.best(4, 5, 3) is not None
+    assert cache.get(4, 5, 3)["samples"] == 10
+    assert os.path.getmtime(path) == 1
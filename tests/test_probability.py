@@ -0,0 +1,93 @@
+import itertools
+from math import comb
+
+import numpy as np
+
+from SapperBoard import SapperBoard
+from SapperProbability import SapperProbability
+from SapperSampler import SapperSampler
+
+
+# Вероятности бомб закрытых клеток полным перебором расстановок
+def brute_force(board, bombs):
+    revealed = board.revealed.to_array()
+    flags = board.flags.to_array()
+    closed = np.flatnonzero((~revealed & ~flags).reshape(-1))
+    totals = np.zeros(revealed.size)
+    layouts = 0
+    for combo in itertools.combinations(closed, bombs - int(flags.sum())):
+        layout = flags.copy().reshape(-1)
+        layout[list(combo)] = True
+        counts = SapperBoard.count_bombs(layout.reshape(revealed.shape))
+        if (counts[revealed] == board.counts[revealed]).all():
+            layouts += 1
+            totals[list(combo)] += 1
+    return totals / layouts
+
+
+# Точные вероятности решателя совпадают с полным перебором на маленьких полях
+def test_probabilities_match_brute_force():
+    rng = np.random.default_rng(1)
+    checked = 0
+    for _ in range(300):
+        height, width = (int(side) for side in rng.integers(2, 6, 2))
+        bombs = int(rng.integers(1, max(2, height * width // 3)))
+        if bombs >= height * width:
+            continue
+
+        board = SapperBoard(height, width)
+        layout = np.zeros(height * width, dtype=bool)
+        layout[rng.choice(height * width, bombs, replace=False)] = True
+        board.set_bombs(layout.reshape(height, width))
+        safe = np.argwhere(~layout.reshape(height, width))
+        for x, y in safe[rng.choice(len(safe), int(rng.integers(1, len(safe) + 1)), replace=False)]:
+            board.reveal(x, y)
+        closed = ~board.revealed.to_array() & ~board.flags.to_array()
+        if comb(int(closed.sum()), bombs) > 5000:
+            continue
+
+        expected = brute_force(board, bombs)
+        cells, probabilities, free, free_probability = SapperProbability(board, bombs).solve()
+        got = np.full(height * width, free_probability)
+        got[cells] = probabilities
+        assert free == closed.sum() - len(cells)
+        assert np.allclose(got[closed.reshape(-1)], expected[closed.reshape(-1)])
+        checked += 1
+    assert checked > 100
+
+
+# Поле 3x11 с двумя одинаковыми компонентами границы в разных местах: бомбы в (0, 2) и (0, 8)
+def two_components():
+    board = SapperBoard(3, 11)
+    layout = np.zeros((3, 11), dtype=bool)
+    layout[0, 2] = layout[0, 8] = True
+    board.set_bombs(layout)
+    for x in range(3):
+        for y in range(11):
+            if x > 0 or y in (0, 4, 5, 6, 10):
+                board.reveal(x, y)
+    return board
+
+
+# Две компоненты границы одинаковой формы в разных местах поля не делят запись кэша:
+# второй solve берет обе компоненты из кэша и должен вернуть клетки каждой из них
+def test_equal_components_keep_their_cells():
+    probability = SapperProbability(two_components(), 2)
+    for _ in range(2):
+        cells, probabilities, free, _ = probability.solve()
+        assert sorted(cells.tolist()) == [1, 2, 3, 7, 8, 9]
+        assert free == 0
+        assert {int(cell) for cell in cells[probabilities > 0.5]} == {2, 8}
+
+
+# Оцененные выборкой и пропущенные компоненты не считаются точными, даже если их вероятности 0 или 1
+def test_sampled_components_are_not_exact(monkeypatch):
+    probability = SapperProbability(two_components(), 2)
+    cells, _, _, _ = probability.solve()
+    assert probability.exact.size == cells.size and probability.exact.all()
+
+    monkeypatch.setattr(SapperProbability, "_enumerate_states", staticmethod(lambda max_states, n, constraints: None))
+    for sampler in (SapperSampler(samples=64, rng=1), None):
+        probability = SapperProbability(two_components(), 2, sampler=sampler)
+        cells, _, _, _ = probability.solve()
+        assert cells.size == 6 and not probability.exact.any()
@@ -0,0 +1,72 @@
+import io
+import re
+
+from Sapper import SapperUserSolver
+from SapperRender import SapperRender
+
+
+# Экран терминала после вывода text: поддерживаются перемещение курсора, очистка экрана и очистка до конца экрана
+def screen(text, rows=40):
+    lines = [""] * rows
+    row, col = 0, 0
+    for token in re.findall(r"\x1b\[[0-9;]*[A-Za-z]|\n|[^\x1b\n]+", text):
+        if token == "\n":
+            row, col = row + 1, 0
+        elif token == "\x1b[2J":
+            lines = [""] * rows
+        elif token == "\x1b[J":
+            lines[row] = lines[row][:col]
+            lines[row + 1:] = [""] * (rows - row - 1)
+        elif token.startswith("\x1b["):
+            place = token[2:-1]
+            row, col = (int(part) - 1 for part in place.split(";")) if place else (0, 0)
+        else:
+            line = lines[row].ljust(col)
+            lines[row] = line[:col] + token + line[col + len(token):]
+            col += len(token)
+    return [line.rstrip() for line in lines]
+
+
+# Сообщения игры и кол-во бомб остаются на экране после перерисовки, сообщение стирается следующим ходом
+def test_messages_survive_redraw(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stream = io.StringIO()
+    game = SapperUserSolver(seed=1, render=SapperRender(stream, mode="ansi", rows=20, cols=20))
+    screens = []
+
+    def closed_cell():
+        x, y = next((x, y) for x in range(9) for y in range(9) if game._board.is_closed(x, y))
+        return f"{x + 1} {y + 1} Flag"
+
+    answers = iter(["Start game", "9", "9", "10", "5 5 Open", "oops", closed_cell, "Save game", "Exit"])
+
+    def answer(prompt=""):
+        screens.append(screen(stream.getvalue()))
+        value = next(answers)
+        return value if isinstance(value, str) else value()
+
+    monkeypatch.setattr("builtins.input", answer)
+    game.start_play()
+
+    # screens[4] - перед первым ходом, [5] - после хода, [6] - после ошибки ввода, [7] - после флага
+    assert "Количество бомб: 10" in screens[4]
+    assert "Количество бомб: 10" in screens[5]
+    assert "Некорректный ввод!" in screens[6]
+    assert "Количество бомб: 10" in screens[6]
+    assert "Некорректный ввод!" not in screens[7]
+    assert any(" F" in line for line in screens[7])
+
+
+# Сообщения решателя, выведенные перед ходом, видны после перерисовки поля этим ходом
+def test_message_before_move_is_kept():
+    stream = io.StringIO()
+    render = SapperRender(stream, mode="ansi", rows=10, cols=10)
+    game = SapperUserSolver(seed=1, render=render)
+    game.new_game(9, 9, 10)
+    game.open(0, 0)
+    render.draw(game._board)
+    x, y = next((x, y) for x in range(9) for y in range(9) if game._board.is_closed(x, y))
+    render.message("Решатель открывает клетку")
+    game.flag(x, y)
+    render.draw(game._board)
+    assert "Решатель открывает клетку" in screen(stream.getvalue())
@@ -0,0 +1,43 @@
+import asyncio
+
+from Sapper import SapperEngine
+from SapperServer import SapperServer
+from test_engine import lose
+
+
+# Выгруженная на диск сессия сервера остается проигранной, а неначатая - с тем же полем
+def test_eviction_keeps_status_and_seed(tmp_path):
+    async def run():
+        server = SapperServer(str(tmp_path))
+        await server.start()
+        lost = server.execute({"cmd": "new", "height": 9, "width": 9, "bombs": 10, "seed": 1})["session"]
+        lose(server._sessions[lost][0])
+        fresh = server.execute({"cmd": "new", "height": 9, "width": 9, "bombs": 10, "seed": 2})["session"]
+        await server.stop()
+        return server, lost, fresh
+
+    server, lost, fresh = asyncio.run(run())
+    assert server.execute({"cmd": "state", "session": lost})["status"] == SapperEngine.LOST
+    assert not server.execute({"cmd": "open", "session": lost, "x": 0, "y": 0})["ok"]
+
+    expected = SapperEngine(9, 9, 10, seed=2)
+    expected.open(4, 4)
+    assert server.execute({"cmd": "open", "session": fresh, "x": 4, "y": 4})["ok"]
+    assert server.execute({"cmd": "state", "session": fresh})["field"] == expected.state()["field"].tolist()
+
+
+# Флаг на открытой клетке не меняет поле, слишком большие числа в ходах дают ответ с ошибкой
+def test_bad_moves_get_error_replies(tmp_path):
+    server = SapperServer(str(tmp_path))
+    session = server.execute({"cmd": "new", "height": 9, "width": 9, "bombs": 10, "seed": 1})["session"]
+    opened = server.execute({"cmd": "open", "session": session, "x": 4, "y": 4})
+    x, y, value = opened["cells"][0]
+
+    flagged = server.execute({"cmd": "flag", "session": session, "x": x, "y": y})
+    assert flagged["ok"] and flagged["cells"] == []
+    assert server.execute({"cmd": "state", "session": session})["field"][x][y] == value
+
+    for move in (["open", 2 ** 70, 0], ["flag", 0, -2 ** 70]):
+        response = server.execute({"cmd": "moves", "session": session, "moves": [move]})
+        assert not response["ok"] and response["error"].startswith("OverflowError")
+    assert not server.execute({"cmd": "open", "session": session, "x": float("inf"), "y": 0})["ok"]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from Sapper import SapperSolver
+from SapperProbability import SapperProbability
+from SapperSampler import SapperSampler
+
+
+# Игра решателя зависит только от seed
+def test_play_is_reproducible():
+    first = SapperSolver(seed=7, verbose=False)
+    second = SapperSolver(seed=7, verbose=False)
+    assert first.play(16, 16, 40) == second.play(16, 16, 40)
+    assert np.array_equal(first._board.counts, second._board.counts)
+    assert np.array_equal(first._board.revealed.to_array(), second._board.revealed.to_array())
+
+
+# С выборкой вместо перебора компонент больше 10 клеток игры решателя тоже зависят только от seed
+def test_sampled_play_is_reproducible(monkeypatch):
+    enumerate_states = SapperProbability._enumerate_states
+    monkeypatch.setattr(SapperProbability, "_enumerate_states", staticmethod(
+        lambda max_states, n, constraints: None if n > 10 else enumerate_states(max_states, n, constraints)))
+
+    for seed in range(3):
+        first = SapperSolver(seed=seed, verbose=False)
+        second = SapperSolver(seed=seed, verbose=False)
+        assert first.play(16, 30, 99) == second.play(16, 30, 99)
+        assert np.array_equal(first.state()["field"], second.state()["field"])
+
+
+# Одинаковые rng - одинаковые оценки выборки
+def test_sampler_is_reproducible():
+    constraints = [([0, 1, 2], 1), ([2, 3, 4], 2), ([4, 5, 6], 1)]
+    first = SapperSampler(samples=1000, rng=1).sample(7, constraints)
+    second = SapperSampler(samples=1000, rng=1).sample(7, constraints)
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+
+
+# Оценки выборки не считаются точными: решатель не ставит флаги на клетки без бомб,
+# а неверный ход заканчивает игру без исключения (перебор ограничен компонентами до 6 клеток)
+def test_sampled_probabilities_are_not_certain(monkeypatch):
+    enumerate_states = SapperProbability._enumerate_states
+    monkeypatch.setattr(SapperProbability, "_enumerate_states", staticmethod(
+        lambda max_states, n, constraints: None if n > 6 else enumerate_states(max_states, n, constraints)))
+
+    for seed in (8, 22, 131):
+        solver = SapperSolver(seed=seed, verbose=False)
+        solver._sampler = SapperSampler(samples=64, rng=seed)
+        solver.play(16, 30, 99)
+        board = solver._board
+        assert not (board.flags.to_array() & ~board.bombs.to_array()).any()